@@ -0,0 +1,133 @@
+"""
+Usage Accounting
+What each inspection costs in external AI calls: billed Vision units (one
+per feature per image), bytes uploaded, Gemini tokens, failed calls,
+Gemini answers that had to be redone with Vision, and the calls caches
+avoided. Totals are stored in the inspection's results ("usage") and added
+to per-day totals in the shared state, reported by /api/metrics.
+
+Engines charge calls by image path; the pipeline tracks which inspection
+each path belongs to. Charges for untracked paths (an engine used on its
+own) and for runs without an inspection ID (warm-up) go to this process'
+"unattributed" totals.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, Optional
+
+from shared_state import SharedState
+
+
+USAGE_FIELDS = (
+    "vision_requests", "vision_units", "vision_bytes", "vision_errors",
+    "gemini_requests", "gemini_bytes", "gemini_input_tokens", "gemini_output_tokens", "gemini_errors",
+    "gemini_fallbacks",
+    "cache_hits_vision", "cache_hits_criteria", "cache_hits_duplicates",
+)
+
+# How long an unfinished inspection's totals stay in the shared state
+USAGE_INSPECTION_TTL = int(os.getenv("USAGE_INSPECTION_TTL", "86400"))
+# Days of totals reported by /api/metrics
+USAGE_REPORT_DAYS = int(os.getenv("USAGE_REPORT_DAYS", "7"))
+
+
+class Usage:
+    """
+    Counters of one inspection. With shared state, every charge is also
+    added to the inspection's shared totals, so calls made for it by other
+    worker processes (e.g. prefetch during upload) are counted too.
+    """
+
+    def __init__(self, inspection_id: Optional[str] = None, shared: Optional[SharedState] = None):
+        self.inspection_id = inspection_id
+        self.shared = shared if inspection_id else None
+        self.counts = dict.fromkeys(USAGE_FIELDS, 0)
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+        if self.shared is not None:
+            try:
+                self.shared.counters_add("usage", self.inspection_id, counts, ttl=USAGE_INSPECTION_TTL)
+            except Exception as e:
+                print(f"[WARNING] Could not record usage of {self.inspection_id}: {e}")
+
+    def totals(self) -> Dict[str, Any]:
+        if self.shared is not None:
+            stored = self.shared.cache_get("usage", self.inspection_id)
+            if stored is not None:
+                return dict(dict.fromkeys(USAGE_FIELDS, 0), **stored)
+        with self._lock:
+            return dict(self.counts)
+
+    def finish(self, completed: bool = True) -> Dict[str, Any]:
+        """
+        Final totals, added once (later calls only return them) to today's
+        totals when shared, else to the unattributed totals without an ID.
+        Only completed inspections count in the number of inspections.
+        """
+        totals = self.totals()
+        with self._lock:
+            if self.finished:
+                return totals
+            self.finished = True
+        if self.shared is not None:
+            day = datetime.now().strftime("%Y-%m-%d")
+            self.shared.counters_add("usage_daily", day, dict(totals, inspections=int(completed)))
+            self.shared.cache_delete("usage", [self.inspection_id])
+        elif self.inspection_id is None and self is not _unattributed:
+            _unattributed.add(**{name: value for name, value in totals.items() if value})
+        return totals
+
+
+_tracked: Dict[str, Usage] = {}
+_tracked_lock = threading.Lock()
+_unattributed = Usage()
+
+
+def track(image_path: str, usage: Usage):
+    """Charge calls for this image to an inspection"""
+    with _tracked_lock:
+        _tracked[image_path] = usage
+
+
+def untrack(image_paths: Iterable[str], usage: Usage):
+    with _tracked_lock:
+        for image_path in image_paths:
+            if _tracked.get(image_path) is usage:
+                del _tracked[image_path]
+
+
+def charge(image_path: str, **counts):
+    """Count an external call (or a call avoided) for an image, e.g. charge(path, vision_requests=1)"""
+    with _tracked_lock:
+        usage = _tracked.get(image_path, _unattributed)
+    usage.add(**counts)
+
+
+def daily(shared: SharedState, days: int = USAGE_REPORT_DAYS) -> Dict[str, Dict[str, Any]]:
+    """Totals of the last days, with the average per inspection"""
+    report = {}
+    today = datetime.now().date()
+    for offset in range(days):
+        day = (today - timedelta(days=offset)).isoformat()
+        totals = shared.cache_get("usage_daily", day)
+        if not totals:
+            continue
+        inspections = totals.get("inspections", 0) or 1
+        report[day] = dict(totals, per_inspection={
+            name: round(totals.get(name, 0) / inspections, 2) for name in USAGE_FIELDS
+        })
+    return report
+
+
+def snapshot(shared: Optional[SharedState]) -> Dict[str, Any]:
+    """Usage report for /api/metrics"""
+    return {
+        "days": daily(shared) if shared is not None else {},
+        "unattributed": _unattributed.totals(),
+    }
@@ -7,10 +7,22 @@ import numpy as np
 from PIL import Image
 from typing import Dict, Any
 
+from inspection_image import InspectionImage, as_image
+from criteria import Criterion, criterion_result, SEAMLESS_FLOORING_NAMES
+
 
 class InspectionAIEngine:
     """Main AI Engine for inspection analysis"""
     
+    # Criteria run by the incremental pipeline (the upload form has no facade photo);
+    # every detector reads the grayscale decode
+    CRITERIA = [
+        Criterion(1, "check_exposed_wires", {"ceiling": "ceiling", "wall": "wall", "floor": "floor_general"},
+                  features=("gray",)),
+        Criterion(3, "check_floor_joints", "floor_prep", features=("gray",)),
+        Criterion(4, "check_lighting", "lighting", features=("gray",)),
+    ]
+    
     def __init__(self):
         """Initialize AI models"""
         print(f"AI Engine initialized successfully")
@@ -20,6 +32,19 @@ class InspectionAIEngine:
         # self.cable_detector = torch.hub.load('ultralytics/yolov5', 'yolov5s')
         # self.ac_detector = torch.hub.load('ultralytics/yolov5', 'yolov5s')
     
+    def prefetch(self, image: InspectionImage, features):
+        """Decode the grayscale image as soon as it is uploaded"""
+        if "gray" in features:
+            image.gray
+    
+    def warm_up(self, image: InspectionImage):
+        """Run every detector once (all local) on a warm-up image"""
+        return [
+            self.check_exposed_wires({"ceiling": image, "wall": image, "floor": image}),
+            self.check_floor_joints(image),
+            self.check_lighting(image),
+        ]
+    
     def analyze_inspection(self, image_paths: Dict[str, str]) -> Dict[str, Any]:
         """
         Main analysis function
@@ -31,6 +56,12 @@ class InspectionAIEngine:
             "criteria": []
         }
         
+        # Read each file once; images used by several criteria share the decode
+        images = {}
+        for key, path in image_paths.items():
+            images[key] = next((img for img in images.values() if img.path == path), None) or as_image(path)
+        image_paths = images
+        
         # Criterion 1: Exposed Wires/Cables (3 images: ceiling, wall, floor)
         criterion1 = self.check_exposed_wires({
             "ceiling": image_paths["ceiling"],
@@ -67,16 +98,7 @@ class InspectionAIEngine:
     
     def check_exposed_wires(self, images: Dict[str, str]) -> Dict[str, Any]:
         """Check for exposed wires/cables in ceiling, walls, floor"""
-        results = {
-            "criterion_id": 1,
-            "criterion_name": "الأسلاك والأنابيب الظاهرة",
-            "criterion_name_en": "Exposed Wires and Pipes",
-            "status": "compliant",
-            "score": 0,
-            "confidence": 0,
-            "details": {},
-            "images_analyzed": 3
-        }
+        results = criterion_result(1, images_analyzed=3)
         
         detections = []
         confidences = []
@@ -87,6 +109,7 @@ class InspectionAIEngine:
             confidences.append(detection["confidence"])
             results["details"][location] = {
                 "has_exposed_wires": detection["detected"],
+                "line_count": detection["count"],
                 "confidence": detection["confidence"],
                 "description": detection["description"]
             }
@@ -100,7 +123,7 @@ class InspectionAIEngine:
             results["score"] = 40  # Low score if violations found
         else:
             results["status"] = "compliant"
-            results["score"] = 95 + np.random.randint(-5, 5)  # High score with slight variation
+            results["score"] = 95 + int(np.random.randint(-5, 5))  # High score with slight variation
         
         results["confidence"] = float(avg_confidence)
         
@@ -108,15 +131,7 @@ class InspectionAIEngine:
     
     def check_ac_units(self, image_path: str) -> Dict[str, Any]:
         """Check for visible AC units on facade"""
-        results = {
-            "criterion_id": 2,
-            "criterion_name": "وحدات التكييف على الواجهة",
-            "criterion_name_en": "AC Units on Facade",
-            "status": "compliant",
-            "score": 0,
-            "confidence": 0,
-            "details": {}
-        }
+        results = criterion_result(2)
         
         detection = self._detect_ac_units(image_path)
         
@@ -132,7 +147,7 @@ class InspectionAIEngine:
             results["score"] = 30
         else:
             results["status"] = "compliant"
-            results["score"] = 98 + np.random.randint(-3, 2)
+            results["score"] = 98 + int(np.random.randint(-3, 2))
         
         results["confidence"] = float(detection["confidence"])
         
@@ -140,15 +155,7 @@ class InspectionAIEngine:
     
     def check_floor_joints(self, image_path: str) -> Dict[str, Any]:
         """Check for floor joints/gaps"""
-        results = {
-            "criterion_id": 3,
-            "criterion_name": "الأرضيات بدون فواصل",
-            "criterion_name_en": "Seamless Flooring",
-            "status": "compliant",
-            "score": 0,
-            "confidence": 0,
-            "details": {}
-        }
+        results = criterion_result(3, names=SEAMLESS_FLOORING_NAMES)
         
         detection = self._detect_floor_joints(image_path)
         
@@ -167,7 +174,7 @@ class InspectionAIEngine:
             results["score"] = 75
         else:
             results["status"] = "compliant"
-            results["score"] = 92 + np.random.randint(-5, 5)
+            results["score"] = 92 + int(np.random.randint(-5, 5))
         
         results["confidence"] = float(detection["confidence"])
         
@@ -175,15 +182,7 @@ class InspectionAIEngine:
     
     def check_lighting(self, image_path: str) -> Dict[str, Any]:
         """Check lighting adequacy"""
-        results = {
-            "criterion_id": 4,
-            "criterion_name": "كفاية الإضاءة",
-            "criterion_name_en": "Lighting Adequacy",
-            "status": "compliant",
-            "score": 0,
-            "confidence": 0,
-            "details": {}
-        }
+        results = criterion_result(4)
         
         analysis = self._analyze_lighting(image_path)
         
@@ -199,7 +198,7 @@ class InspectionAIEngine:
             results["score"] = 55
         else:
             results["status"] = "compliant"
-            results["score"] = 90 + np.random.randint(-5, 8)
+            results["score"] = 90 + int(np.random.randint(-5, 8))
         
         results["confidence"] = float(analysis["confidence"])
         
@@ -209,12 +208,9 @@ class InspectionAIEngine:
     
     def _detect_wires(self, image_path: str) -> Dict[str, Any]:
         """Detect exposed wires/cables in image"""
-        img = cv2.imread(image_path)
-        if img is None:
-            return {"detected": False, "confidence": 0, "description": "صورة غير صالحة"}
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = as_image(image_path).gray
+        if gray is None:
+            return {"detected": False, "count": 0, "confidence": 0, "description": "صورة غير صالحة"}
         
         # Edge detection to find lines/wires
         edges = cv2.Canny(gray, 50, 150)
@@ -222,7 +218,7 @@ class InspectionAIEngine:
         
         # Simple heuristic: if many long lines detected, likely has wires
         has_wires = lines is not None and len(lines) > 15
-        confidence = min(0.85 + np.random.random() * 0.10, 0.98) if lines is not None else 0.75
+        confidence = float(min(0.85 + np.random.random() * 0.10, 0.98)) if lines is not None else 0.75
         
         if has_wires:
             description = f"تم اكتشاف {len(lines)} خط محتمل يشير إلى أسلاك ظاهرة"
@@ -238,20 +234,19 @@ class InspectionAIEngine:
     
     def _detect_ac_units(self, image_path: str) -> Dict[str, Any]:
         """Detect AC units on facade"""
-        img = cv2.imread(image_path)
-        if img is None:
+        gray = as_image(image_path).gray
+        if gray is None:
             return {"detected": False, "count": 0, "confidence": 0, "description": "صورة غير صالحة"}
         
         # For POC: simple detection based on image filename or random simulation
         # In production, use YOLO model trained on AC units
         
         # Simple heuristic: check for metallic/circular shapes
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1, 50, param1=100, param2=30, minRadius=10, maxRadius=100)
         
         has_ac = circles is not None and len(circles[0]) > 2
         count = len(circles[0]) if circles is not None else 0
-        confidence = 0.88 + np.random.random() * 0.10
+        confidence = float(0.88 + np.random.random() * 0.10)
         
         if has_ac:
             description = f"تم اكتشاف {count} وحدة تكييف ظاهرة على الواجهة"
@@ -267,19 +262,17 @@ class InspectionAIEngine:
     
     def _detect_floor_joints(self, image_path: str) -> Dict[str, Any]:
         """Detect floor joints/cracks"""
-        img = cv2.imread(image_path)
-        if img is None:
+        gray = as_image(image_path).gray
+        if gray is None:
             return {"detected": False, "count": 0, "confidence": 0, "description": "صورة غير صالحة"}
         
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
         # Edge detection for joints
         edges = cv2.Canny(gray, 30, 100)
         lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=30, maxLineGap=5)
         
         has_joints = lines is not None and len(lines) > 20
         count = len(lines) if lines is not None else 0
-        confidence = 0.80 + np.random.random() * 0.15
+        confidence = float(0.80 + np.random.random() * 0.15)
         
         if has_joints:
             description = f"تم اكتشاف {count} فاصل في الأرضية"
@@ -295,17 +288,16 @@ class InspectionAIEngine:
     
     def _analyze_lighting(self, image_path: str) -> Dict[str, Any]:
         """Analyze lighting level"""
-        img = cv2.imread(image_path)
-        if img is None:
+        gray = as_image(image_path).gray
+        if gray is None:
             return {"brightness": 0, "adequate": False, "confidence": 0, "description": "صورة غير صالحة"}
         
-        # Convert to grayscale and calculate average brightness
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        avg_brightness = np.mean(gray)
+        # Calculate average brightness (grayscale decoded once per image)
+        avg_brightness = float(np.mean(gray))
         
         # Threshold for adequate lighting (adjust based on testing)
         is_adequate = avg_brightness > 100  # 0-255 scale
-        confidence = 0.85 + np.random.random() * 0.10
+        confidence = float(0.85 + np.random.random() * 0.10)
         
         brightness_percent = int((avg_brightness / 255) * 100)
         
@@ -0,0 +1,134 @@
+"""
+Hybrid AI Engine for Restaurant Inspection
+Screens every image with the fast local OpenCV detectors first and only
+escalates ambiguous cases to Google Cloud Vision / Gemini
+"""
+import os
+import threading
+from typing import Dict, Any
+
+from ai_engine import InspectionAIEngine as LocalEngine
+from inspection_image import InspectionImage
+from lighting import LIGHTING_CRITERION
+from criteria import Criterion
+from pipeline import run_inspection
+
+
+# Confident-local bands; results between the two bounds go to the cloud.
+# Wire check: every photo with at most CLEAR Hough lines is clearly clean, a
+# photo with at least DENSE lines (the local detector flags > 15) clearly has
+# exposed runs
+HYBRID_WIRE_CLEAR_LINES = int(os.getenv("HYBRID_WIRE_CLEAR_LINES", "12"))
+HYBRID_WIRE_DENSE_LINES = int(os.getenv("HYBRID_WIRE_DENSE_LINES", "40"))
+# Floor check: at most SEAMLESS joint lines is a seamless floor without a
+# straight wall junction; at least TILE lines is an obviously tiled floor
+HYBRID_FLOOR_SEAMLESS_LINES = int(os.getenv("HYBRID_FLOOR_SEAMLESS_LINES", "3"))
+HYBRID_FLOOR_TILE_LINES = int(os.getenv("HYBRID_FLOOR_TILE_LINES", "60"))
+
+
+class InspectionAIEngine:
+    """AI Engine that pays for cloud calls only when the local screen is unsure"""
+
+    # The OpenCV screen reads the grayscale decode; cloud features are fetched only on escalation
+    CRITERIA = [
+        Criterion(1, "check_exposed_wires", {"ceiling": "ceiling", "wall": "wall", "floor": "floor_general"},
+                  features=("gray",)),
+        Criterion(3, "check_floor_joints", "floor_prep", features=("gray",)),
+        LIGHTING_CRITERION,
+    ]
+
+    def __init__(self):
+        """Initialize the local engine, and the cloud engine if credentials allow"""
+        self.local = LocalEngine()
+        try:
+            from ai_engine_vision import InspectionAIEngine as CloudEngine
+            self.cloud = CloudEngine()
+        except Exception as e:
+            print(f"[WARNING] Cloud engine unavailable, using local results only: {e}")
+            self.cloud = None
+
+        # Per criterion: decided locally / escalated to the cloud
+        self.stats = {method: {"local": 0, "escalated": 0} for method in ("check_exposed_wires", "check_floor_joints")}
+        self._stats_lock = threading.Lock()
+        print("[OK] Hybrid AI Engine initialized")
+
+    def analyze_inspection(self, image_paths: Dict[str, str]) -> Dict[str, Any]:
+        """Analyze a complete set of images (criteria run in parallel)"""
+        return run_inspection(self, image_paths)
+
+    def prefetch(self, image: InspectionImage, features):
+        """Decode the grayscale image the local detectors share"""
+        self.local.prefetch(image, features)
+
+    def warm_up(self, image: InspectionImage):
+        """Warm the local screen only (the cloud engine would bill)"""
+        return self.local.warm_up(image)
+
+    def use_shared_state(self, shared):
+        if self.cloud is not None:
+            self.cloud.use_shared_state(shared)
+
+    def detected_objects(self, image: InspectionImage):
+        return self.cloud.detected_objects(image) if self.cloud is not None else None
+
+    def release_images(self, image_paths):
+        if self.cloud is not None:
+            self.cloud.release_images(image_paths)
+
+    def has_pending(self, image_paths) -> bool:
+        return self.cloud is not None and self.cloud.has_pending(image_paths)
+
+    def wait_pending(self, image_paths) -> bool:
+        return self.cloud is None or self.cloud.wait_pending(image_paths)
+
+    def _decide(self, local_result: Dict[str, Any], escalate: bool, reason: str, method: str, args) -> Dict[str, Any]:
+        """Keep the local result, or replace it with the cloud result"""
+        if escalate and self.cloud is not None:
+            with self._stats_lock:
+                self.stats[method]["escalated"] += 1
+            print(f"[INFO] {method}: escalating to cloud ({reason})")
+            result = getattr(self.cloud, method)(args)
+            result["screening"] = {
+                "escalated": True,
+                "reason": reason,
+                "local_status": local_result["status"],
+            }
+            return result
+
+        with self._stats_lock:
+            self.stats[method]["local"] += 1
+        local_result["ai_used"] = "local_opencv"
+        local_result["screening"] = {"escalated": False, "reason": reason}
+        if escalate:
+            local_result["screening"]["note"] = "cloud engine unavailable"
+        return local_result
+
+    def check_exposed_wires(self, images: Dict[str, InspectionImage]) -> Dict[str, Any]:
+        """Few straight edges everywhere means no wires, very many means exposed runs; the rest goes to Vision"""
+        local_result = self.local.check_exposed_wires(images)
+        most_lines = max(details["line_count"] for details in local_result["details"].values())
+        if most_lines <= HYBRID_WIRE_CLEAR_LINES:
+            return self._decide(local_result, False, f"at most {most_lines} lines per photo",
+                                "check_exposed_wires", images)
+        if most_lines >= HYBRID_WIRE_DENSE_LINES:
+            local_result["status"] = "non_compliant"
+            local_result["score"] = 40
+            return self._decide(local_result, False, f"{most_lines} lines in one photo",
+                                "check_exposed_wires", images)
+        return self._decide(local_result, True, f"up to {most_lines} lines per photo",
+                            "check_exposed_wires", images)
+
+    def check_floor_joints(self, image: InspectionImage) -> Dict[str, Any]:
+        """A dense joint grid is an obvious tiled floor, no straight edge at all a seamless one; the rest needs Gemini"""
+        local_result = self.local.check_floor_joints(image)
+        joint_count = local_result["details"]["floor"]["joint_count"]
+        if joint_count >= HYBRID_FLOOR_TILE_LINES:
+            local_result["status"] = "non_compliant"
+            local_result["score"] = 30
+            local_result["details"]["floor"]["violation_reason"] = "أرضية مبلطة مع فواصل - غير مطابقة للمعايير الصحية"
+            return self._decide(local_result, False, f"{joint_count} joint lines", "check_floor_joints", image)
+        if joint_count <= HYBRID_FLOOR_SEAMLESS_LINES:
+            local_result["status"] = "compliant"
+            local_result["score"] = 90
+            return self._decide(local_result, False, f"{joint_count} joint lines", "check_floor_joints", image)
+        return self._decide(local_result, True, f"{joint_count} joint lines", "check_floor_joints", image)
@@ -7,6 +7,8 @@ from typing import Dict, Any
 from PIL import Image
 import io
 
+from criteria import criterion_result, SEAMLESS_FLOORING_NAMES
+
 
 class InspectionAIEngine:
     """Lightweight AI Engine using mock analysis"""
@@ -34,9 +36,7 @@ class InspectionAIEngine:
         
         # Criterion 1: Exposed Wires/Cables
         results["criteria"].append({
-            "criterion_id": 1,
-            "criterion_name": "الأسلاك والأنابيب الظاهرة",
-            "criterion_name_en": "Exposed Wires and Pipes",
+            **criterion_result(1),
             "status": "compliant" if criterion1_score >= 80 else "non_compliant",
             "score": criterion1_score,
             "confidence": random.uniform(0.85, 0.95),
@@ -50,9 +50,7 @@ class InspectionAIEngine:
         
         # Criterion 2: AC Units
         results["criteria"].append({
-            "criterion_id": 2,
-            "criterion_name": "وحدات التكييف على الواجهة",
-            "criterion_name_en": "AC Units on Facade",
+            **criterion_result(2),
             "status": "compliant" if criterion2_score >= 80 else "non_compliant",
             "score": criterion2_score,
             "confidence": random.uniform(0.88, 0.96),
@@ -68,9 +66,7 @@ class InspectionAIEngine:
         
         # Criterion 3: Floor Joints
         results["criteria"].append({
-            "criterion_id": 3,
-            "criterion_name": "الأرضيات بدون فواصل",
-            "criterion_name_en": "Seamless Flooring",
+            **criterion_result(3, names=SEAMLESS_FLOORING_NAMES),
             "status": "compliant" if criterion3_score >= 70 else "needs_improvement",
             "score": criterion3_score,
             "confidence": random.uniform(0.80, 0.92),
@@ -86,9 +82,7 @@ class InspectionAIEngine:
         
         # Criterion 4: Lighting
         results["criteria"].append({
-            "criterion_id": 4,
-            "criterion_name": "كفاية الإضاءة",
-            "criterion_name_en": "Lighting Adequacy",
+            **criterion_result(4),
             "status": "compliant" if criterion4_score >= 75 else "non_compliant",
             "score": criterion4_score,
             "confidence": random.uniform(0.85, 0.93),
@@ -0,0 +1,278 @@
+"""
+Batch Reports
+Renders report packs for many inspections at once: one PDF per inspection
+across a process pool, or a single consolidated PDF that opens with a
+summary table. Inspections are read from the upload directory or from the
+day's archive, like the API does.
+
+Usage:
+    python batch_reports.py --date 2026-10-19 --consolidated
+    python batch_reports.py --date 2026-10-19 --output packs/2026-10-19 --workers 8
+    python batch_reports.py INS_20261019_083450 INS_20261019_091200 --consolidated
+
+Also available as POST /api/reports/batch (see main.py).
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.units import cm
+from reportlab.platypus import PageBreak, Paragraph, Spacer, Table, TableStyle
+
+from pdf_generator import (REPORTS_DIR, STATUS_AR, STATUS_COLOR, arabic_text, build_inspection_report,
+                           footer, inspection_story, report_document, report_styles)
+from retention import RetentionManager, ARCHIVE_DIR
+from serialization import loads
+
+
+UPLOAD_DIR = "uploads"
+# Packs are written here and served by main.py under /reports/batch
+BATCH_DIR = os.path.join(REPORTS_DIR, "batch")
+BATCH_REPORT_WORKERS = int(os.getenv("BATCH_REPORT_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+# Flowables kept ahead of the one being laid out in a consolidated report
+_FEED_LOOKAHEAD = 8
+
+# Per-process store, set up by _init_worker
+_store: Optional[RetentionManager] = None
+
+
+def _init_worker(upload_dir: str, reports_dir: str, archive_dir: str):
+    global _store
+    _store = RetentionManager(upload_dir, reports_dir, archive_dir)
+    report_styles()  # Built once per process, shared by every document it renders
+
+
+def _load(inspection_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, str], Callable[[str], Optional[bytes]]]]:
+    """Stored results, their image URLs and a reader for those URLs"""
+    data = _store.read_results(inspection_id)
+    if data is None:
+        return None
+    results = loads(data)
+    return results, results.get("images", {}), lambda url: _store.read_image(inspection_id, url)
+
+
+def _render_one(task: Tuple[str, str]) -> Dict[str, Any]:
+    inspection_id, output_dir = task
+    try:
+        loaded = _load(inspection_id)
+        if loaded is None:
+            return {"inspection_id": inspection_id, "error": "not found"}
+        results, images, read_image = loaded
+        path = build_inspection_report(results, inspection_id, images, read_image, report_dir=output_dir)
+        return {"inspection_id": inspection_id, "path": path}
+    except Exception as e:
+        return {"inspection_id": inspection_id, "error": str(e)}
+
+
+def _summarize(inspection_id: str) -> Dict[str, Any]:
+    """Summary row of an inspection; also renders its evidence photos into the shared cache"""
+    try:
+        loaded = _load(inspection_id)
+        if loaded is None:
+            return {"inspection_id": inspection_id, "error": "not found"}
+        results, images, read_image = loaded
+        inspection_story(results, inspection_id, images, read_image)
+        return {
+            "inspection_id": inspection_id,
+            "restaurant_name": results.get("restaurant_name", ""),
+            "commercial_register": results.get("commercial_register", ""),
+            "timestamp": results.get("timestamp", ""),
+            "overall_status": results.get("overall_status", "non_compliant"),
+            "overall_score": results.get("overall_score", 0),
+        }
+    except Exception as e:
+        return {"inspection_id": inspection_id, "error": str(e)}
+
+
+class _StoryFeed(list):
+    """
+    Flowables handed to ReportLab lazily. The document consumes the list
+    from the front; the next inspection's section is only built (results
+    loaded, photos read) once the current one runs low, so memory does not
+    grow with the number of inspections in the pack.
+    """
+
+    def __init__(self, sections: Iterator[List[Any]]):
+        super().__init__()
+        self._sections = sections
+        self._refill()
+
+    def _refill(self):
+        while len(self) < _FEED_LOOKAHEAD:
+            section = next(self._sections, None)
+            if section is None:
+                return
+            self.extend(section)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._refill()
+
+
+def summary_story(rows: List[Dict[str, Any]], title: str) -> List[Any]:
+    """Cover page of a consolidated report: counts per status and one row per inspection"""
+    arabic_style = report_styles()["arabic"]
+    story = [
+        Paragraph(arabic_text("ملخص تقارير الفحص"), report_styles()["title"]),
+        Spacer(1, 0.5*cm),
+        Paragraph(arabic_text(title), arabic_style),
+        Spacer(1, 0.5*cm),
+    ]
+
+    counts = [[arabic_text(STATUS_AR[status]), str(sum(row["overall_status"] == status for row in rows))]
+              for status in STATUS_AR]
+    counts.append([arabic_text("عدد الفحوصات"), str(len(rows))])
+    counts_table = Table(counts, colWidths=[6*cm, 3*cm])
+    counts_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#E0F2F1')),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('PADDING', (0, 0), (-1, -1), 6),
+    ]))
+    story += [counts_table, Spacer(1, cm)]
+
+    header = [arabic_text(text) for text in
+              ("رقم الفحص", "اسم المنشأة", "السجل التجاري", "التاريخ", "الدرجة", "النتيجة")]
+    data = [header]
+    style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#00695C')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('PADDING', (0, 0), (-1, -1), 4),
+    ]
+    for index, row in enumerate(rows, start=1):
+        try:
+            date = datetime.fromisoformat(row["timestamp"]).strftime("%Y-%m-%d %H:%M")
+        except ValueError:
+            date = ""
+        data.append([
+            row["inspection_id"],
+            arabic_text(str(row["restaurant_name"])),
+            str(row["commercial_register"]),
+            date,
+            f"{row['overall_score']:.1f}",
+            arabic_text(STATUS_AR[row["overall_status"]]),
+        ])
+        style.append(('TEXTCOLOR', (5, index), (5, index), STATUS_COLOR[row["overall_status"]]))
+
+    # Header row repeated on every page of the table
+    summary_table = Table(data, colWidths=[4*cm, 3.8*cm, 2.8*cm, 2.6*cm, 1.4*cm, 2.4*cm], repeatRows=1)
+    summary_table.setStyle(TableStyle(style))
+    story += [summary_table, Spacer(1, cm), footer()]
+    return story
+
+
+def _pool_map(function, items: List[Any], workers: int, dirs: Tuple[str, str, str]) -> List[Any]:
+    """function over items in worker processes (in this process for a single worker)"""
+    if workers <= 1 or len(items) <= 1:
+        _init_worker(*dirs)
+        return [function(item) for item in items]
+    # spawn: forking a server process with running threads is unsafe
+    with ProcessPoolExecutor(max_workers=min(workers, len(items)), mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=dirs) as pool:
+        return list(pool.map(function, items, chunksize=max(1, len(items) // (workers * 4))))
+
+
+def render_individual(inspection_ids: List[str], output_dir: str, workers: int = BATCH_REPORT_WORKERS,
+                      dirs: Tuple[str, str, str] = (UPLOAD_DIR, REPORTS_DIR, ARCHIVE_DIR)) -> List[Dict[str, Any]]:
+    """One PDF per inspection in output_dir, rendered across a process pool"""
+    os.makedirs(output_dir, exist_ok=True)
+    return _pool_map(_render_one, [(inspection_id, output_dir) for inspection_id in inspection_ids], workers, dirs)
+
+
+def render_consolidated(inspection_ids: List[str], output_path: str, title: str,
+                        workers: int = BATCH_REPORT_WORKERS,
+                        dirs: Tuple[str, str, str] = (UPLOAD_DIR, REPORTS_DIR, ARCHIVE_DIR)) -> List[Dict[str, Any]]:
+    """
+    One PDF: the summary table, then every inspection's report. Evidence
+    photos are rendered across the process pool first; the document itself
+    is then laid out in this process from the cached photos.
+    """
+    rows = _pool_map(_summarize, inspection_ids, workers, dirs)
+    found = sorted((row for row in rows if "error" not in row), key=lambda row: row["timestamp"])
+    _init_worker(*dirs)
+
+    def sections() -> Iterator[List[Any]]:
+        yield summary_story(found, title)
+        for row in found:
+            loaded = _load(row["inspection_id"])
+            if loaded is None:
+                continue
+            results, images, read_image = loaded
+            yield [PageBreak()] + inspection_story(results, row["inspection_id"], images, read_image) + [footer()]
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    report_document(tmp_path).build(_StoryFeed(sections()))
+    os.replace(tmp_path, output_path)
+    return [{"inspection_id": row["inspection_id"], "path": output_path} if "error" not in row else row
+            for row in rows]
+
+
+def run_batch(inspection_ids: List[str], output: str, consolidated: bool, title: str = "",
+              workers: int = BATCH_REPORT_WORKERS,
+              dirs: Tuple[str, str, str] = (UPLOAD_DIR, REPORTS_DIR, ARCHIVE_DIR)) -> Dict[str, Any]:
+    """Render a pack; returns where it was written and which inspections failed"""
+    started = time.perf_counter()
+    if consolidated:
+        outcomes = render_consolidated(inspection_ids, output, title, workers, dirs)
+    else:
+        outcomes = render_individual(inspection_ids, output, workers, dirs)
+    return {
+        "output": output,
+        "consolidated": consolidated,
+        "rendered": sum("error" not in outcome for outcome in outcomes),
+        "failed": {outcome["inspection_id"]: outcome["error"] for outcome in outcomes if "error" in outcome},
+        "reports": sorted({outcome["path"] for outcome in outcomes if "path" in outcome}),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def batch_id() -> str:
+    """Unique name of a pack (served under /reports, which browsers cache as immutable)"""
+    return f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inspection_ids", nargs="*", help="inspections to include (default: every one of --date)")
+    parser.add_argument("--date", help="YYYY-MM-DD, default today")
+    parser.add_argument("--consolidated", action="store_true", help="a single PDF with a summary table")
+    parser.add_argument("--output", help="PDF path (consolidated) or directory")
+    parser.add_argument("--workers", type=int, default=BATCH_REPORT_WORKERS)
+    parser.add_argument("--upload-dir", default=UPLOAD_DIR)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    day = args.date or datetime.now().strftime("%Y-%m-%d")
+    dirs = (args.upload_dir, REPORTS_DIR, args.archive_dir)
+    inspection_ids = args.inspection_ids or RetentionManager(*dirs).inspection_ids(day)
+    if not inspection_ids:
+        print(f"[ERROR] No inspections found for {day}")
+        sys.exit(1)
+
+    name = f"{batch_id()}_{day}"
+    output = args.output or os.path.join(BATCH_DIR, f"{name}.pdf" if args.consolidated else name)
+    print(f"Rendering {len(inspection_ids)} inspections with {args.workers} workers...")
+    summary = run_batch(inspection_ids, output, args.consolidated, f"تقارير يوم {day}", args.workers, dirs)
+    for inspection_id, error in summary["failed"].items():
+        print(f"[WARNING] {inspection_id}: {error}")
+    print(f"[OK] {summary['rendered']} inspections in {summary['seconds']}s -> {output}")
+
+
+if __name__ == "__main__":
+    main()
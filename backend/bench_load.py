@@ -0,0 +1,265 @@
+"""
+Load-Test Benchmark
+Drives POST /api/analyze at a fixed request rate against each engine and
+reports latency percentiles, throughput, errors and server memory.
+
+Usage:
+    python bench_load.py [--engines lite,opencv,hybrid,vision] [--rps 2] [--duration 30]
+                         [--mock-latency-ms 300] [--mock-error-rate 0.02]
+
+Runs fully offline: the vision and hybrid engines are pointed at mock_ai_server.py, and
+every engine runs in its own uvicorn process in a scratch directory.
+Arrivals are open-loop (request i is sent at i / rps whether or not earlier
+ones finished), so a slow server shows up as growing latency, not lower load.
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_KEYS = ["ceiling", "wall", "floor_general", "floor_prep", "lighting"]
+
+
+def make_photo(seed: int, width: int, height: int) -> bytes:
+    """Distinct synthetic JPEG per seed (different pHash, realistic size)"""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    base = np.asarray(Image.fromarray(blocks).resize((width, height), Image.BILINEAR), dtype=np.int16)
+    noise = rng.normal(0, 20, (height, width, 3)).astype(np.int16)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def multipart_body(fields: Dict[str, str], files: Dict[str, bytes]):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, content in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def wait_for(url: str, timeout: float, process: subprocess.Popen = None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} before {url} was up")
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.25)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """Current and peak resident set size (kB) from /proc (Linux only)"""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split(":", 1)
+                    memory[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def start_server(engine: str, port: int, workdir: str, mock_url: str, allow_reuse: bool) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "AI_ENGINE": engine,
+        "VISION_API_ENDPOINT": mock_url,
+        "GEMINI_BASE_URL": mock_url,
+        "GEMINI_API_KEY": "mock",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if not allow_reuse:
+        # Every request must do real work: no near-duplicate reuse between requests
+        env["NEAR_DUPLICATE_DISTANCE"] = "-1"
+    log = open(os.path.join(workdir, "server.log"), "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def run_load(base_url: str, photo_sets: List[Dict[str, bytes]], rps: float, duration: float,
+             timeout: float, pid: int) -> Dict[str, Any]:
+    total = max(1, int(rps * duration))
+    latencies, errors = [], {}
+    lock = threading.Lock()
+    rss_samples = []
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.is_set():
+            rss = read_memory(pid).get("VmRSS")
+            if rss:
+                rss_samples.append(rss)
+            stop.wait(0.2)
+
+    def send(index: int):
+        body, content_type = multipart_body(
+            {"restaurant_name": f"Bench {index}", "commercial_register": f"CR{index % 50:04d}"},
+            {f"{key}_image": content for key, content in photo_sets[index % len(photo_sets)].items()},
+        )
+        request = urllib.request.Request(f"{base_url}/api/analyze", data=body, method="POST",
+                                         headers={"Content-Type": content_type})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+        except urllib.error.HTTPError as e:
+            with lock:
+                errors[str(e.code)] = errors.get(str(e.code), 0) + 1
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(8, int(rps * timeout))) as pool:
+        for index in range(total):
+            delay = started + index / rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, index)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    memory = read_memory(pid)
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "rss_avg_mb": (sum(rss_samples) / len(rss_samples) / 1024) if rss_samples else float("nan"),
+        "rss_peak_mb": memory.get("VmHWM", max(rss_samples, default=0)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", default="lite,opencv,hybrid,vision")
+    parser.add_argument("--rps", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals per engine")
+    parser.add_argument("--warmup", type=int, default=2, help="requests sent before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--photo-sets", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--mock-latency-ms", type=float, default=300.0)
+    parser.add_argument("--mock-sigma", type=float, default=0.4)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--allow-reuse", action="store_true",
+                        help="let repeated photos reuse earlier analysis (off: every request is analyzed)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"Generating {args.photo_sets} photo sets ({args.width}x{args.height})...")
+    photo_sets = [
+        {key: make_photo(index * len(IMAGE_KEYS) + offset, args.width, args.height)
+         for offset, key in enumerate(IMAGE_KEYS)}
+        for index in range(args.photo_sets)
+    ]
+
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "mock_ai_server.py"), "--port", str(args.mock_port),
+         "--latency-ms", str(args.mock_latency_ms), "--sigma", str(args.mock_sigma),
+         "--error-rate", str(args.mock_error_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    results = {}
+    try:
+        wait_for(f"{mock_url}/stats", 30, mock)
+        for offset, engine in enumerate(args.engines.split(",")):
+            engine = engine.strip()
+            scratch = tempfile.mkdtemp(prefix=f"bench_{engine}_")
+            # pdf_generator writes next to the working directory, keep it inside scratch
+            workdir = os.path.join(scratch, "backend")
+            os.makedirs(workdir)
+            port = args.port + offset
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(engine, port, workdir, mock_url, args.allow_reuse)
+            try:
+                wait_for(f"{base_url}/api/health", 60, server)
+                print(f"\n[{engine}] warming up ({args.warmup} requests)...")
+                if args.warmup:
+                    run_load(base_url, photo_sets, max(args.rps, 1), args.warmup / max(args.rps, 1),
+                             args.timeout, server.pid)
+                print(f"[{engine}] {args.rps:g} req/s for {args.duration:g}s...")
+                results[engine] = run_load(base_url, photo_sets, args.rps, args.duration,
+                                           args.timeout, server.pid)
+            except RuntimeError as e:
+                print(f"[ERROR] {engine}: {e} (see {workdir}/server.log)")
+                continue
+            finally:
+                server.send_signal(signal.SIGINT)
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        with urllib.request.urlopen(f"{mock_url}/stats") as response:
+            mock_stats = json.load(response)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    print(f"\n{'engine':<8}{'sent':>6}{'ok':>6}{'err':>5}{'req/s':>8}"
+          f"{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'RSS avg':>9}{'RSS peak':>10}")
+    for engine, r in results.items():
+        print(f"{engine:<8}{r['requests']:>6}{r['ok']:>6}{sum(r['errors'].values()):>5}{r['throughput']:>8.2f}"
+              f"{r['p50']:>8.2f}{r['p95']:>8.2f}{r['p99']:>8.2f}{r['rss_avg_mb']:>8.0f}M{r['rss_peak_mb']:>9.0f}M")
+        if r["errors"]:
+            print(f"{'':<8}errors: {r['errors']}")
+    print(f"Mock server: {mock_stats}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results, "mock": mock_stats}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
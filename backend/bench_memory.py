@@ -0,0 +1,148 @@
+"""
+Memory Benchmark for Image Handling
+Compares per-inspection peak traced memory (tracemalloc) and time of the
+legacy read-per-call image handling against the shared InspectionImage path,
+separately for the cloud (Vision + Gemini) and OpenCV engines.
+
+Usage:
+    python bench_memory.py [--width 4032] [--height 3024] [--repeat 3]
+
+Runs offline: the Vision request is serialized the way the gRPC transport
+would, and the Gemini payload is built the way google-genai does for REST.
+"""
+import os
+import cv2
+import time
+import json
+import base64
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from google.cloud import vision
+from google.genai import types
+
+from inspection_image import InspectionImage
+
+
+# Image reads of one inspection: floor photo is used by two criteria
+VISION_READS = ["ceiling", "wall", "floor", "floor", "lighting"]
+GEMINI_READS = ["floor"]
+OPENCV_READS = ["ceiling", "wall", "floor", "floor", "lighting"]
+
+
+def make_photo(path: str, width: int, height: int):
+    """Noisy synthetic camera photo (noise keeps the JPEG realistically large)"""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 40, (height, width, 3)).astype(np.float32)
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    cv2.imwrite(path, pixels, [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+
+def vision_transport(content: bytes) -> int:
+    # What the client library sends over the wire
+    request = vision.AnnotateImageRequest(
+        image=vision.Image(content=content),
+        features=[vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION)],
+    )
+    return len(vision.AnnotateImageRequest.serialize(request))
+
+
+def gemini_transport(part) -> int:
+    # google-genai validates the part, then JSON-encodes it for REST
+    part = types.Part.model_validate(part) if isinstance(part, dict) else part
+    return len(json.dumps(part.model_dump(mode="json", exclude_none=True)))
+
+
+def legacy_cloud(paths: dict):
+    """Pre-InspectionImage Vision/Gemini handling: every call re-reads the file"""
+    for key in VISION_READS:
+        with open(paths[key], "rb") as f:
+            vision_transport(f.read())
+    for key in GEMINI_READS:
+        with open(paths[key], "rb") as f:
+            image_b64 = base64.b64encode(f.read()).decode("utf-8")
+        gemini_transport({"inline_data": {"mime_type": "image/jpeg", "data": image_b64}})
+
+
+def legacy_opencv(paths: dict):
+    """Pre-InspectionImage OpenCV handling: full BGR decode per detector"""
+    for key in OPENCV_READS:
+        img = cv2.imread(paths[key])
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray.mean()
+
+
+def _shared_images(paths: dict) -> dict:
+    images = {}
+    for key, path in paths.items():
+        images[key] = next((img for img in images.values() if img.path == path), None) or InspectionImage(path)
+    return images
+
+
+def shared_cloud(paths: dict):
+    """One InspectionImage per file; raw bytes handed to both SDKs"""
+    images = _shared_images(paths)
+    for key in VISION_READS:
+        vision_transport(images[key].content)
+    for key in GEMINI_READS:
+        gemini_transport(types.Part.from_bytes(data=images[key].content, mime_type="image/jpeg"))
+    for image in images.values():
+        image.release()
+
+
+def shared_opencv(paths: dict):
+    """One InspectionImage per file; grayscale decoded straight from memory once"""
+    images = _shared_images(paths)
+    for key in OPENCV_READS:
+        images[key].gray.mean()
+    for image in images.values():
+        image.release()
+
+
+SCENARIOS = [
+    ("cloud", "legacy", legacy_cloud),
+    ("cloud", "shared", shared_cloud),
+    ("opencv", "legacy", legacy_opencv),
+    ("opencv", "shared", shared_opencv),
+]
+
+
+def measure(func, paths: dict, repeat: int) -> dict:
+    peaks, times = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        func(paths)
+        times.append(time.perf_counter() - started)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+    return {"peak": min(peaks), "seconds": min(times)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        for key in ["ceiling", "wall", "floor", "lighting"]:
+            paths[key] = os.path.join(tmp, f"{key}.jpg")
+            make_photo(paths[key], args.width, args.height)
+        file_mb = os.path.getsize(paths["ceiling"]) / 1e6
+        print(f"Photo: {args.width}x{args.height}, {file_mb:.1f} MB JPEG, "
+              f"{len(VISION_READS)} Vision / {len(GEMINI_READS)} Gemini / {len(OPENCV_READS)} OpenCV uses")
+
+        print(f"{'engines':<10}{'handling':<10}{'peak MB':>10}{'time s':>10}")
+        for engines, handling, func in SCENARIOS:
+            result = measure(func, paths, args.repeat)
+            print(f"{engines:<10}{handling:<10}{result['peak'] / 1e6:>10.1f}{result['seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Adaptive Concurrency
+AIMD limits on the number of calls in flight to each external AI backend
+(Vision, Gemini). The limit grows by about one per round trip while calls
+stay fast, and is cut when the backend answers 429/503, times out, or
+becomes much slower than its unloaded latency. Callers over the limit wait
+instead of piling more requests onto a saturated quota.
+
+Limits are per worker process; every process adapts to the throttling it
+sees itself.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+
+AI_CONCURRENCY_INITIAL = int(os.getenv("AI_CONCURRENCY_INITIAL", "4"))
+AI_CONCURRENCY_MIN = int(os.getenv("AI_CONCURRENCY_MIN", "1"))
+AI_CONCURRENCY_MAX = int(os.getenv("AI_CONCURRENCY_MAX", "32"))
+# Calls slower than this multiple of the unloaded latency count as congestion
+AI_LATENCY_TOLERANCE = float(os.getenv("AI_LATENCY_TOLERANCE", "2.5"))
+# Seconds a call may wait for a slot before going ahead anyway
+AI_ACQUIRE_TIMEOUT = float(os.getenv("AI_ACQUIRE_TIMEOUT", "60"))
+
+# Limit kept after an overload signal
+_BACKOFF = 0.7
+# HTTP statuses meaning "too much load" (google-api-core and google-genai errors carry them in .code)
+_OVERLOAD_CODES = (429, 503, 504)
+
+
+def is_overload(error: BaseException) -> bool:
+    """Whether a failed call was throttled or timed out (other errors leave the limit alone)"""
+    if isinstance(error, TimeoutError):
+        return True
+    code = getattr(error, "code", None)
+    if callable(code):  # gRPC errors: code() returns a StatusCode
+        code = getattr(code(), "name", None)
+        return code in ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED")
+    return code in _OVERLOAD_CODES or getattr(error, "status_code", None) in _OVERLOAD_CODES
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent calls to one backend"""
+
+    def __init__(self, name: str, initial: int = AI_CONCURRENCY_INITIAL,
+                 min_limit: int = AI_CONCURRENCY_MIN, max_limit: int = AI_CONCURRENCY_MAX,
+                 tolerance: float = AI_LATENCY_TOLERANCE):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.waiting = 0
+        # Smoothed latency, and the lowest recent latency as the unloaded baseline
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        self.counts = {"calls": 0, "overloads": 0, "slow": 0, "errors": 0, "wait_timeouts": 0}
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float = AI_ACQUIRE_TIMEOUT) -> float:
+        """Take a slot (waiting while the limit is reached); returns the start time to pass to release()"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counts["wait_timeouts"] += 1
+                        break
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, error: Optional[BaseException] = None):
+        """Give the slot back, recording the call's latency or how it failed"""
+        outcome = "ok" if error is None else "overload" if is_overload(error) else "error"
+        elapsed = time.monotonic() - started
+        with self._condition:
+            self.in_flight -= 1
+            self.counts["calls"] += 1
+            if outcome == "ok":
+                self._on_success(elapsed)
+            elif outcome == "overload":
+                self.counts["overloads"] += 1
+                self._decrease(started)
+            else:
+                self.counts["errors"] += 1
+            self._condition.notify_all()
+
+    def _on_success(self, elapsed: float):
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+        # Baseline drifts up slowly so it follows a backend that got permanently slower
+        self.baseline = elapsed if self.baseline is None else min(elapsed, self.baseline * 1.01)
+        if elapsed > self.baseline * self.tolerance:
+            self.counts["slow"] += 1
+            self._decrease(time.monotonic() - elapsed)
+        elif self.in_flight + 1 >= int(self.limit) * 0.5:
+            # Only grow while the limit is actually in use: +1 per limit's worth of calls
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self, started: float):
+        # Calls started before the previous cut saw the old limit; count their signal once
+        if started < self._last_decrease:
+            return
+        self.limit = max(self.min_limit, self.limit * _BACKOFF)
+        self._last_decrease = time.monotonic()
+
+    @contextmanager
+    def slot(self, timeout: float = AI_ACQUIRE_TIMEOUT):
+        """Hold one in-flight slot around a backend call; records its latency or failure"""
+        started = self.acquire(timeout)
+        try:
+            yield
+        except BaseException as e:
+            self.release(started, e)
+            raise
+        self.release(started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "baseline_ms": round(self.baseline * 1000, 1) if self.baseline is not None else None,
+                **self.counts,
+            }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(name: str) -> AdaptiveLimiter:
+    """The process-wide limiter of a backend"""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = AdaptiveLimiter(name)
+        return _limiters[name]
+
+
+def limits() -> Dict[str, Dict[str, Any]]:
+    """Current state of every backend limiter (for /api/metrics)"""
+    with _limiters_lock:
+        current = dict(_limiters)
+    return {name: current[name].snapshot() for name in sorted(current)}
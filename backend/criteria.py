@@ -0,0 +1,119 @@
+"""
+Inspection Criteria
+Shared criterion definitions (IDs, names) and the declarative plugin
+interface the incremental pipeline schedules
+"""
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple, Union
+
+
+# Criterion IDs and display names, shared by every engine
+CRITERION_NAMES = {
+    1: ("الأسلاك والأنابيب الظاهرة", "Exposed Wires and Pipes"),
+    2: ("وحدات التكييف على الواجهة", "AC Units on Facade"),
+    3: ("وصلات الأرضية المنحنية", "Curved Floor Junctions"),
+    4: ("كفاية الإضاءة", "Lighting Adequacy"),
+}
+
+# Criterion 3 as the local engines score it (floor joints only, not the junction shape)
+SEAMLESS_FLOORING_NAMES = ("الأرضيات بدون فواصل", "Seamless Flooring")
+
+
+def criterion_result(criterion_id: int, names: Optional[Tuple[str, str]] = None, **fields) -> Dict[str, Any]:
+    """Empty result of a criterion (status/score filled in by its check); names overrides the shared ones"""
+    name, name_en = names or CRITERION_NAMES[criterion_id]
+    results = {
+        "criterion_id": criterion_id,
+        "criterion_name": name,
+        "criterion_name_en": name_en,
+        "status": "compliant",
+        "score": 0,
+        "confidence": 0,
+        "details": {}
+    }
+    results.update(fields)
+    return results
+
+
+class Criterion:
+    """
+    A criterion plugin.
+
+    criterion_id  shared ID (see CRITERION_NAMES)
+    method        engine method that scores it, called with the criterion's
+                  images; also the key analysis reuse is indexed under
+    inputs        image key (check receives one InspectionImage) or
+                  {location: image_key} (check receives {location: image})
+    features      per-image artifacts the check reads (e.g. Vision "labels",
+                  "objects", or "gray" for local detectors). The pipeline
+                  fetches the union for each image once, before any check
+                  that uses the image runs, so adding a criterion that reads
+                  already-fetched features costs no extra round trip.
+    after         IDs of criteria whose results this one needs; they are
+                  passed as dependencies={criterion_id: result}
+    evaluate      optional engine-independent check, evaluate(images) (or
+                  evaluate(images, dependencies)), used instead of method
+    """
+
+    def __init__(self, criterion_id: int, method: str, inputs: Union[str, Dict[str, str]],
+                 features: Sequence[str] = (), after: Sequence[int] = (),
+                 evaluate: Optional[Callable] = None):
+        self.criterion_id = criterion_id
+        self.method = method
+        self.inputs = inputs
+        self.features = tuple(features)
+        self.after = tuple(after)
+        self.evaluate = evaluate
+
+    def __repr__(self):
+        return f"Criterion({self.criterion_id}, {self.method!r})"
+
+    @property
+    def keys(self) -> List[str]:
+        """Image keys this criterion reads"""
+        return [self.inputs] if isinstance(self.inputs, str) else list(self.inputs.values())
+
+    def run(self, engine, images, dependencies: Optional[Dict[int, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        check = self.evaluate or getattr(engine, self.method)
+        if self.after:
+            return check(images, dependencies=dependencies or {})
+        return check(images)
+
+
+def as_criterion(spec) -> Criterion:
+    """Accept a Criterion or a legacy (method, inputs) tuple"""
+    if isinstance(spec, Criterion):
+        return spec
+    method, inputs = spec
+    return Criterion(0, method, inputs)
+
+
+def criteria_order(criteria: List[Criterion]) -> List[int]:
+    """Indexes of the criteria in dependency order; ValueError on unknown or cyclic 'after'"""
+    by_id = {c.criterion_id: index for index, c in enumerate(criteria)}
+    order, state = [], {}
+
+    def visit(index: int, path: List[int]):
+        if state.get(index) == "done":
+            return
+        if state.get(index) == "visiting":
+            raise ValueError(f"Criteria dependency cycle: {path + [criteria[index].criterion_id]}")
+        state[index] = "visiting"
+        for dependency in criteria[index].after:
+            if dependency not in by_id:
+                raise ValueError(f"Criterion {criteria[index].criterion_id} depends on unknown criterion {dependency}")
+            visit(by_id[dependency], path + [criteria[index].criterion_id])
+        state[index] = "done"
+        order.append(index)
+
+    for index in range(len(criteria)):
+        visit(index, [])
+    return order
+
+
+def feature_plan(criteria: List[Criterion]) -> Dict[str, tuple]:
+    """Union of required features per image key"""
+    plan = {}
+    for criterion in criteria:
+        for key in criterion.keys:
+            plan.setdefault(key, set()).update(criterion.features)
+    return {key: tuple(sorted(features)) for key, features in plan.items() if features}
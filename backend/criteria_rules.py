@@ -0,0 +1,63 @@
+"""
+Criterion Keyword Rules
+Label/object classification rules loaded from criteria_rules.json and
+compiled once into a single regular expression per rule
+"""
+import os
+import re
+import json
+from typing import Dict, Any, Iterable, List, Tuple
+
+
+CRITERIA_RULES_PATH = os.getenv(
+    "CRITERIA_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "criteria_rules.json"),
+)
+
+
+class KeywordRule:
+    """A set of keywords matched as case-insensitive substrings of a name"""
+
+    def __init__(self, name: str, keywords: Iterable[str], description: str = ""):
+        self.name = name
+        self.description = description
+        self.keywords = sorted({keyword.lower() for keyword in keywords}, key=lambda k: (-len(k), k))
+        # One alternation scanned once per name, however many keywords there are
+        self.pattern = re.compile("|".join(re.escape(keyword) for keyword in self.keywords)) if self.keywords else None
+
+    def __repr__(self):
+        return f"KeywordRule({self.name!r}, {len(self.keywords)} keywords)"
+
+    def matches(self, text: str) -> bool:
+        return self.pattern is not None and self.pattern.search(text.lower()) is not None
+
+    def find(self, objects: Iterable[Tuple[str, float]] = (),
+             labels: Iterable[Tuple[str, float]] = ()) -> List[Tuple[str, float]]:
+        """
+        Matching detections: every matching object, then matching labels whose
+        name was not already found (objects take precedence over labels)
+        """
+        found = []
+        seen = set()
+        for name, score in objects:
+            if self.matches(name):
+                found.append((name, score))
+                seen.add(name)
+        for name, score in labels:
+            if name not in seen and self.matches(name):
+                found.append((name, score))
+                seen.add(name)
+        return found
+
+
+def load_rules(path: str = CRITERIA_RULES_PATH) -> Dict[str, KeywordRule]:
+    """Compile every rule of a rules file"""
+    with open(path, "r", encoding="utf-8") as f:
+        config: Dict[str, Any] = json.load(f)
+    return {
+        name: KeywordRule(name, spec.get("keywords", []), spec.get("description", ""))
+        for name, spec in config.items()
+    }
+
+
+RULES = load_rules()
@@ -0,0 +1,146 @@
+"""
+Derived Images
+Resized previews of inspection photos, optionally annotated with the Vision
+object boxes stored in the results, generated once and cached on disk by
+(image hash, size, variant)
+"""
+import io
+import os
+import hashlib
+import tempfile
+from PIL import Image, ImageDraw
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from criteria_rules import RULES
+from retention import THUMBNAIL_FORMAT
+
+
+DERIVATIVES_DIR = os.getenv("DERIVATIVES_DIR", "derivatives")
+# Disk budget of the cache; least recently used derivatives are pruned beyond it
+DERIVATIVES_MAX_MB = int(os.getenv("DERIVATIVES_MAX_MB", "200"))
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "75"))
+
+# Requested sizes are rounded up to one of these (longest side, pixels)
+DERIVATIVE_SIZES = (160, 320, 640, 1280)
+
+_SUFFIXES = {"WEBP": ".webp", "JPEG": ".jpg"}
+DERIVATIVE_MEDIA_TYPE = "image/webp" if THUMBNAIL_FORMAT == "WEBP" else "image/jpeg"
+
+# Boxes of objects matching a violation rule are drawn in red, others in yellow
+_VIOLATION_RULES = ("wires", "ac_units")
+_VIOLATION_COLOR = (229, 57, 53)
+_OTHER_COLOR = (255, 193, 7)
+
+
+def snap_size(size: int) -> int:
+    """Smallest supported size at least as large as the requested one"""
+    return next((s for s in DERIVATIVE_SIZES if s >= size), DERIVATIVE_SIZES[-1])
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def source_hash(name: str, load_source: Callable[[], Optional[bytes]]) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    SHA-256 of a source image and the bytes read for it, if any: taken from
+    content-addressed part names ({sha256}.jpg) without reading, else hashed
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return stem, None
+    data = load_source()
+    return (content_hash(data), data) if data is not None else (None, None)
+
+
+def render(data: bytes, size: int, boxes: Optional[List[Dict[str, Any]]] = None,
+           image_format: str = THUMBNAIL_FORMAT) -> bytes:
+    """Resize an image to fit size x size and draw object boxes on it"""
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG decoder downscales while decoding
+        img.draft("RGB", (size, size))
+        preview = img.convert("RGB")
+    preview.thumbnail((size, size))
+
+    if boxes:
+        draw = ImageDraw.Draw(preview)
+        width, height = preview.size
+        line = max(2, size // 160)
+        for detection in boxes:
+            left, top, right, bottom = detection["box"]
+            violation = any(RULES[name].matches(detection["name"]) for name in _VIOLATION_RULES if name in RULES)
+            color = _VIOLATION_COLOR if violation else _OTHER_COLOR
+            rect = [left * width, top * height, right * width, bottom * height]
+            draw.rectangle(rect, outline=color, width=line)
+            label = f"{detection['name']} {int(detection['score'] * 100)}%"
+            text_box = draw.textbbox((rect[0] + line, rect[1] + line), label)
+            draw.rectangle(text_box, fill=color)
+            draw.text((rect[0] + line, rect[1] + line), label, fill=(0, 0, 0))
+
+    buffer = io.BytesIO()
+    preview.save(buffer, image_format, quality=DERIVATIVE_QUALITY)
+    return buffer.getvalue()
+
+
+class DerivativeCache:
+    """On-disk cache of rendered derivatives, content-addressed so any inspection reusing a photo shares them"""
+
+    def __init__(self, directory: str = DERIVATIVES_DIR, max_bytes: int = DERIVATIVES_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, image_hash: str, size: int, boxes: Optional[List[Dict[str, Any]]], image_format: str) -> str:
+        variant = "plain"
+        if boxes:
+            variant = "boxes-" + hashlib.sha256(repr(boxes).encode("utf-8")).hexdigest()[:12]
+        name = f"{image_hash[:32]}_{size}_{variant}{_SUFFIXES[image_format]}"
+        return os.path.join(self.directory, image_hash[:2], name)
+
+    def get(self, image_hash: str, size: int, boxes: Optional[List[Dict[str, Any]]], load_source,
+            image_format: str = THUMBNAIL_FORMAT) -> bytes:
+        """
+        Cached derivative, rendered from load_source() on a miss. image_hash
+        identifies the source content (its SHA-256).
+        """
+        path = self._path(image_hash, size, boxes, image_format)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Recently used: pruned last
+            return data
+        except FileNotFoundError:
+            pass
+
+        data = render(load_source(), size, boxes, image_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique temp file: concurrent renders of the same derivative just replace each other
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return data
+
+    def prune(self) -> int:
+        """Delete least recently used derivatives beyond the disk budget; returns files removed"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
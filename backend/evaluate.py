@@ -0,0 +1,245 @@
+"""
+Offline Evaluation Harness
+Runs an engine over a labeled image corpus and reports per-criterion
+precision/recall together with throughput and latency.
+
+Corpus layout (one directory per case):
+    corpus/
+      case_001/
+        ceiling.jpg  wall.jpg  floor_general.jpg  floor_prep.jpg  lighting.jpg
+        labels.json     {"1": "non_compliant", "3": "compliant", "4": "compliant"}
+
+labels.json maps criterion_id to the expected status; criteria without a
+label are not scored. A violation (anything but "compliant") is the
+positive class, so recall is the share of real violations the engine caught.
+
+Usage:
+    python evaluate.py corpus/ --engine ai_engine_vision --mock --workers 8
+    python evaluate.py corpus/ --engine ai_engine --max-dimension 1024
+
+--max-dimension downscales every photo once before the run (like the
+browser does before upload) so speed gains can be weighed against accuracy.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+import subprocess
+import urllib.request
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_KEYS = ["ceiling", "wall", "floor_general", "floor_prep", "lighting"]
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_case(case_dir: str) -> Optional[Dict[str, Any]]:
+    """Images and labels of one case directory, None if it has no labels"""
+    labels_path = os.path.join(case_dir, "labels.json")
+    if not os.path.exists(labels_path):
+        return None
+    with open(labels_path, "r", encoding="utf-8") as f:
+        labels = {str(criterion_id): status for criterion_id, status in json.load(f).items()}
+
+    images = {}
+    for name in os.listdir(case_dir):
+        key, extension = os.path.splitext(name)
+        if key in IMAGE_KEYS and extension.lower() in IMAGE_EXTENSIONS:
+            images[key] = os.path.join(case_dir, name)
+    return {"name": os.path.basename(case_dir), "images": images, "labels": labels}
+
+
+def load_corpus(corpus_dir: str) -> List[Dict[str, Any]]:
+    cases = []
+    for name in sorted(os.listdir(corpus_dir)):
+        case_dir = os.path.join(corpus_dir, name)
+        if os.path.isdir(case_dir):
+            case = load_case(case_dir)
+            if case is not None:
+                cases.append(case)
+    return cases
+
+
+def downscale_corpus(cases: List[Dict[str, Any]], max_dimension: int, quality: int, output_dir: str):
+    """Re-encode every image with its longest side capped (done once, not timed)"""
+    for case in cases:
+        case_dir = os.path.join(output_dir, case["name"])
+        os.makedirs(case_dir, exist_ok=True)
+        for key, path in case["images"].items():
+            target = os.path.join(case_dir, f"{key}.jpg")
+            with Image.open(path) as img:
+                img.draft("RGB", (max_dimension, max_dimension))
+                img = img.convert("RGB")
+                img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+                img.save(target, format="JPEG", quality=quality)
+            case["images"][key] = target
+
+
+def is_violation(status: str) -> bool:
+    return status != "compliant"
+
+
+def score_cases(outcomes: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Confusion counts and precision/recall per criterion (violation = positive)"""
+    scores = {}
+    for outcome in outcomes:
+        for criterion_id, expected in outcome["labels"].items():
+            predicted = outcome["predicted"].get(criterion_id)
+            if predicted is None:
+                continue
+            entry = scores.setdefault(criterion_id, {
+                "name": outcome["names"].get(criterion_id, criterion_id),
+                "tp": 0, "fp": 0, "fn": 0, "tn": 0,
+            })
+            actual, guess = is_violation(expected), is_violation(predicted)
+            if actual and guess:
+                entry["tp"] += 1
+            elif guess:
+                entry["fp"] += 1
+            elif actual:
+                entry["fn"] += 1
+            else:
+                entry["tn"] += 1
+
+    for entry in scores.values():
+        tp, fp, fn, tn = entry["tp"], entry["fp"], entry["fn"], entry["tn"]
+        entry["precision"] = tp / (tp + fp) if tp + fp else float("nan")
+        entry["recall"] = tp / (tp + fn) if tp + fn else float("nan")
+        entry["accuracy"] = (tp + tn) / (tp + fp + fn + tn)
+    return scores
+
+
+def _percent(value: float) -> str:
+    return "-" if value != value else f"{value:.1%}"
+
+
+def evaluate_case(engine, case: Dict[str, Any]) -> Dict[str, Any]:
+    from pipeline import run_inspection
+
+    started = time.perf_counter()
+    outcome = {"case": case["name"], "labels": case["labels"], "predicted": {}, "names": {}}
+    try:
+        results = run_inspection(engine, dict(case["images"]))
+    except Exception as e:
+        outcome["error"] = f"{type(e).__name__}: {e}"
+    else:
+        for criterion in results.get("criteria", []):
+            criterion_id = str(criterion["criterion_id"])
+            outcome["predicted"][criterion_id] = criterion["status"]
+            outcome["names"][criterion_id] = criterion.get("criterion_name_en", criterion_id)
+    outcome["seconds"] = time.perf_counter() - started
+    outcome["bytes"] = sum(os.path.getsize(path) for path in case["images"].values())
+    return outcome
+
+
+def start_mock(port: int, latency_ms: float) -> subprocess.Popen:
+    """Start mock_ai_server.py and point the Vision engine at it"""
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "mock_ai_server.py"),
+         "--port", str(port), "--latency-ms", str(latency_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/stats", timeout=2):
+                break
+        except OSError:
+            if time.time() > deadline or mock.poll() is not None:
+                mock.kill()
+                raise RuntimeError("Mock server did not start")
+            time.sleep(0.25)
+    os.environ["VISION_API_ENDPOINT"] = url
+    os.environ["GEMINI_BASE_URL"] = url
+    os.environ.setdefault("GEMINI_API_KEY", "mock")
+    return mock
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="directory of labeled cases")
+    parser.add_argument("--engine", default="ai_engine", help="ai_engine, ai_engine_hybrid, ai_engine_vision or ai_engine_lite")
+    parser.add_argument("--workers", type=int, default=4, help="cases analyzed in parallel")
+    parser.add_argument("--max-dimension", type=int, help="downscale photos so the longest side is at most this")
+    parser.add_argument("--jpeg-quality", type=int, default=80, help="quality used when downscaling")
+    parser.add_argument("--mock", action="store_true", help="run the cloud engines against mock_ai_server.py")
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--mock-latency-ms", type=float, default=300.0)
+    parser.add_argument("--json", help="also write per-case outcomes and scores to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    cases = load_corpus(args.corpus)
+    if not cases:
+        print(f"[ERROR] No labeled cases found in {args.corpus}")
+        sys.exit(1)
+
+    mock = start_mock(args.mock_port, args.mock_latency_ms) if args.mock else None
+    scratch = tempfile.TemporaryDirectory() if args.max_dimension else None
+    try:
+        if scratch is not None:
+            downscale_corpus(cases, args.max_dimension, args.jpeg_quality, scratch.name)
+
+        engine = importlib.import_module(args.engine).InspectionAIEngine()
+        print(f"Evaluating {args.engine} on {len(cases)} cases with {args.workers} workers...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            outcomes = list(pool.map(lambda case: evaluate_case(engine, case), cases))
+        elapsed = time.perf_counter() - started
+
+        mock_stats = None
+        if mock is not None:
+            with urllib.request.urlopen(f"http://127.0.0.1:{args.mock_port}/stats") as response:
+                mock_stats = json.load(response)
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+        if scratch is not None:
+            scratch.cleanup()
+
+    scores = score_cases([o for o in outcomes if "error" not in o])
+    failed = [o for o in outcomes if "error" in o]
+    latencies = [o["seconds"] for o in outcomes]
+    image_count = sum(len(case["images"]) for case in cases)
+
+    print(f"\n{'criterion':<32}{'TP':>5}{'FP':>5}{'FN':>5}{'TN':>5}{'precision':>11}{'recall':>8}{'accuracy':>10}")
+    for criterion_id in sorted(scores, key=int):
+        s = scores[criterion_id]
+        print(f"{criterion_id + ' ' + s['name']:<32}{s['tp']:>5}{s['fp']:>5}{s['fn']:>5}{s['tn']:>5}"
+              f"{_percent(s['precision']):>11}{_percent(s['recall']):>8}{_percent(s['accuracy']):>10}")
+
+    print(f"\nCases: {len(cases)} ({len(failed)} failed), images: {image_count}, "
+          f"avg upload: {sum(o['bytes'] for o in outcomes) / image_count / 1024:.0f} KB/image")
+    print(f"Throughput: {len(cases) / elapsed:.2f} cases/s, {image_count / elapsed:.2f} images/s")
+    print(f"Latency per case: p50 {np.percentile(latencies, 50):.2f}s, "
+          f"p95 {np.percentile(latencies, 95):.2f}s, max {max(latencies):.2f}s")
+    if mock_stats is not None:
+        print(f"API calls per case: {mock_stats['vision_requests'] / len(cases):.2f} Vision "
+              f"({mock_stats['vision_features'] / len(cases):.2f} billed features), "
+              f"{mock_stats['gemini_requests'] / len(cases):.2f} Gemini")
+    if getattr(engine, "stats", None):
+        print(f"Engine: {engine.stats}")
+        for method, counts in engine.stats.items():
+            if isinstance(counts, dict) and "escalated" in counts:
+                runs = counts["escalated"] + counts.get("local", 0)
+                print(f"  {method}: escalated {counts['escalated']}/{runs} ({_percent(counts['escalated'] / runs if runs else float('nan'))})")
+    for outcome in failed:
+        print(f"[ERROR] {outcome['case']}: {outcome['error']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "scores": scores, "outcomes": outcomes,
+                       "seconds": elapsed, "mock": mock_stats}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for the multi-worker deployment:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Workers share uploads/, reports/ and the SQLite state (STATE_DB_PATH),
+so any worker can serve any request of an upload session.
+"""
+import os
+import time
+import uuid
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Every worker loads OpenCV, the AI clients and its own duplicate index:
+# raise this only where memory allows (2 fits a small free-tier instance)
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Analyses run inside the request for /api/analyze
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+# Each worker imports the app itself: the gRPC Vision client must not be created before fork
+preload_app = False
+accesslog = "-"
+
+
+def on_starting(server):
+    # Inherited by every worker; identifies this server start (see warmup.py)
+    os.environ["SERVER_START_ID"] = f"{int(time.time())}_{uuid.uuid4().hex[:6]}"
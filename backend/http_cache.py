@@ -0,0 +1,190 @@
+"""
+HTTP Caching and Compression
+Content-hash ETags with conditional GET (304), Cache-Control policies
+for stored files and API reads, and response compression for text payloads
+(Brotli with brotli-asgi, GZip for clients or installs without it)
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+from serialization import JSONBytesResponse
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # Optional, GZip only
+    BrotliMiddleware = None
+
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+
+# Files written once and never modified (content-addressed parts, per-inspection PDFs)
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_CONFIG = "public, max-age=3600"
+CACHE_NONE = "no-store"
+
+# Content types sent as they are (already compressed; recompressing only costs CPU)
+PRECOMPRESSED_TYPES = ("image/", "application/pdf", "application/zip")
+
+
+_SHA256_NAME = re.compile(r"^[0-9a-f]{64}$")
+_ETAG_CACHE_SIZE = 4096
+_etag_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+def bytes_etag(data: bytes) -> str:
+    """Strong ETag of a payload (SHA-256 of its content)"""
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def is_precompressed(content_type: str) -> bool:
+    """True for types the CompressionMiddleware sends unchanged"""
+    return content_type.startswith(PRECOMPRESSED_TYPES)
+
+
+def representation_headers(etag: str, content_type: str) -> Dict[str, str]:
+    """
+    ETag and Vary of a response. Compressible bodies may go out gzip- or
+    br-encoded, so their ETag is weak (the same for every coding) and
+    caches key them by Accept-Encoding.
+    """
+    if is_precompressed(content_type):
+        return {"ETag": etag}
+    return {"ETag": f"W/{etag}", "Vary": "Accept-Encoding"}
+
+
+def file_etag(path: str, stat_result: os.stat_result) -> str:
+    """
+    Strong ETag of a stored file. Content-addressed parts are named by their
+    SHA-256 already; other files are hashed once per (path, mtime, size).
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if _SHA256_NAME.match(stem):
+        return f'"{stem[:32]}"'
+    key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+        if etag is not None:
+            _etag_cache.move_to_end(key)
+            return etag
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    with _etag_lock:
+        _etag_cache[key] = etag
+        if len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def etag_matches(request_headers: Headers, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for GET)"""
+    if_none_match = request_headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    etag = etag[2:] if etag.startswith("W/") else etag
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def cached_response(request_headers: Headers, body: bytes, cache_control: str,
+                    response_class=JSONBytesResponse, **kwargs) -> Response:
+    """Response for stored bytes: 304 when the client already has them"""
+    media_type = kwargs.get("media_type") or response_class.media_type or ""
+    headers = representation_headers(bytes_etag(body), media_type)
+    headers["Cache-Control"] = cache_control
+    if etag_matches(request_headers, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return response_class(content=body, headers=headers, **kwargs)
+
+
+def results_cache_control(stable_seconds: int) -> str:
+    """Immutable for as long as the content cannot change, else revalidate with the ETag"""
+    if stable_seconds < 60:
+        return "no-cache"
+    return f"public, max-age={min(stable_seconds, 31536000)}, immutable"
+
+
+def upload_cache_control(path: str) -> str:
+    """Uploaded photos never change once stored; session state and results do"""
+    if path.endswith(".json") or path.endswith(".part"):
+        return CACHE_NONE
+    return CACHE_IMMUTABLE
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with content-hash ETags and a Cache-Control header chosen per file path"""
+
+    def __init__(self, *args, cache_control: Callable[[str], str] = lambda path: CACHE_IMMUTABLE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers.update(representation_headers(file_etag(str(full_path), stat_result),
+                                                        response.media_type or ""))
+        response.headers["Cache-Control"] = self.cache_control(str(full_path))
+        if etag_matches(Headers(scope=scope), response.headers["ETag"]):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses unless their content type is already compressed
+    (photos, PDFs, archives), whatever route served them
+    """
+
+    def __init__(self, app, skip_types: Sequence[str] = PRECOMPRESSED_TYPES,
+                 minimum_size: int = COMPRESSION_MIN_SIZE, brotli: Optional[bool] = None):
+        self.app = app
+        self.skip_types = tuple(skip_types)
+        self.minimum_size = minimum_size
+        self.encoding = "br" if BrotliMiddleware is not None and brotli is not False else "gzip"
+
+    def _compressor(self, app):
+        if self.encoding == "br":
+            return BrotliMiddleware(app, quality=4, minimum_size=self.minimum_size, gzip_fallback=True)
+        return GZipMiddleware(app, minimum_size=self.minimum_size, compresslevel=6)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # The compressor holds the response start until the first body chunk;
+        # responses of a skipped type bypass it and go out unchanged
+        bypass = False
+
+        async def app(scope, receive, compressor_send):
+            async def send_checked(message):
+                nonlocal bypass
+                if message["type"] == "http.response.start":
+                    content_type = Headers(raw=message["headers"]).get("content-type", "")
+                    bypass = content_type.startswith(self.skip_types)
+                await (send if bypass else compressor_send)(message)
+
+            await self.app(scope, receive, send_checked)
+
+        async def send_vary_once(message):
+            # The compressor appends Accept-Encoding to a Vary the route may have set already
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if "vary" in headers:
+                    values = [value.strip() for value in headers["vary"].split(",")]
+                    headers["vary"] = ", ".join(dict.fromkeys(values))
+            await send(message)
+
+        await self._compressor(app)(scope, receive, send_vary_once)
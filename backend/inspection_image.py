@@ -0,0 +1,171 @@
+"""
+Inspection Image
+One immutable in-memory image per upload, shared by the Vision, Gemini and
+OpenCV paths so the file is read once and decoded/encoded at most once
+"""
+import io
+import os
+import mmap
+import base64
+import threading
+import numpy as np
+from typing import Optional, Union
+
+from near_duplicates import phash as perceptual_hash
+
+try:
+    import cv2
+except ImportError:  # Lite deployments run without OpenCV
+    cv2 = None
+
+
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = int(os.getenv("IMAGE_MMAP_THRESHOLD", str(1024 * 1024)))
+
+
+class InspectionImage:
+    """
+    Raw image bytes plus lazily computed derived forms.
+
+    data       read-only memoryview over the raw file (bytes or mmap backed)
+    content    the raw file as a bytes object, for client libraries that
+               require bytes (mmap-backed images copy it once, on first use)
+    open()     binary file object reading data without copying it (for PIL)
+    gray       decoded 8-bit grayscale array (computed once)
+    array      decoded BGR array (computed once)
+    base64     base64 text of the raw file (computed once, only if asked for)
+    phash      64-bit perceptual hash (computed once)
+    """
+
+    def __init__(self, path: str, data: Optional[bytes] = None, mime_type: str = "image/jpeg"):
+        self.path = path
+        self.mime_type = mime_type
+        self._buffer = data
+        self._lock = threading.RLock()
+        self._derived = {}
+
+    def __repr__(self):
+        return f"InspectionImage({self.path!r})"
+
+    def _load(self):
+        if self._buffer is None:
+            size = os.path.getsize(self.path)
+            with open(self.path, "rb") as f:
+                if size >= MMAP_THRESHOLD:
+                    self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    self._buffer = f.read()
+        return self._buffer
+
+    def _lazy(self, name: str, compute):
+        # Compute a derived form once; concurrent callers wait for the first
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = compute()
+            return self._derived[name]
+
+    @property
+    def data(self) -> memoryview:
+        return self._lazy("data", lambda: memoryview(self._load()))
+
+    @property
+    def content(self) -> bytes:
+        return self._lazy("content", self._copy)
+
+    def _copy(self) -> bytes:
+        buffer = self._load()
+        return buffer if isinstance(buffer, bytes) else bytes(self.data)
+
+    def open(self) -> io.BufferedReader:
+        return io.BufferedReader(_MemoryReader(self.data))
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def is_empty(self) -> bool:
+        return self.size == 0
+
+    @property
+    def base64(self) -> str:
+        return self._lazy("base64", lambda: base64.b64encode(self.data).decode("ascii"))
+
+    @property
+    def gray(self) -> Optional[np.ndarray]:
+        return self._lazy("gray", lambda: self._decode(grayscale=True))
+
+    @property
+    def array(self) -> Optional[np.ndarray]:
+        return self._lazy("array", lambda: self._decode(grayscale=False))
+
+    @property
+    def phash(self) -> int:
+        return self._lazy("phash", lambda: perceptual_hash(self.open()))
+
+    def _decode(self, grayscale: bool) -> Optional[np.ndarray]:
+        """Decode straight from memory (no second file read); None if invalid"""
+        try:
+            encoded = np.frombuffer(self.data, dtype=np.uint8)
+        except OSError:
+            return None
+        if encoded.size == 0:
+            return None
+        if cv2 is not None:
+            flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+            return cv2.imdecode(encoded, flag)
+
+        from PIL import Image
+        try:
+            with Image.open(self.open()) as img:
+                if grayscale:
+                    return np.asarray(img.convert("L"))
+                return np.asarray(img.convert("RGB"))[:, :, ::-1]
+        except OSError:
+            return None
+
+    def release(self):
+        """Drop derived forms and unmap the file"""
+        with self._lock:
+            self._derived.clear()
+            if isinstance(self._buffer, mmap.mmap):
+                try:
+                    self._buffer.close()
+                except BufferError:
+                    # Still exported (e.g. a view held by a caller); GC will unmap it
+                    pass
+            self._buffer = None
+
+
+class _MemoryReader(io.RawIOBase):
+    """Seekable raw file over a memoryview; reads copy only what is asked for"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = max(0, min(len(target), len(self._view) - self._position))
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def as_image(image: Union[str, InspectionImage]) -> InspectionImage:
+    """Accept either a file path or an InspectionImage"""
+    if isinstance(image, InspectionImage):
+        return image
+    return InspectionImage(image)
@@ -0,0 +1,139 @@
+"""
+Local Lighting Analysis
+Luminance statistics from a downsampled decode of the lighting photo:
+histogram percentiles, clipping and spatial uniformity (no network call)
+"""
+import os
+import numpy as np
+from PIL import Image
+from typing import Dict, Any, Optional
+
+from inspection_image import as_image
+from criteria import Criterion, criterion_result
+
+try:
+    import cv2
+except ImportError:  # Lite deployments run without OpenCV
+    cv2 = None
+
+
+# Mean luminance (0-255) below which the room is too dark
+LIGHTING_MIN_BRIGHTNESS = float(os.getenv("LIGHTING_MIN_BRIGHTNESS", "100"))
+# Share of the photo's regions allowed to be dark before lighting counts as uneven
+LIGHTING_MAX_DARK_REGIONS = float(os.getenv("LIGHTING_MAX_DARK_REGIONS", "0.25"))
+# Longest side of the decoded image (statistics do not need full resolution)
+LIGHTING_MAX_DIMENSION = int(os.getenv("LIGHTING_MAX_DIMENSION", "512"))
+
+GRID_SIZE = 4
+DARK_PIXEL = 5
+BRIGHT_PIXEL = 250
+
+
+def _decode_luminance(image) -> Optional[np.ndarray]:
+    """Grayscale pixels, downscaled by the JPEG decoder where possible"""
+    image = as_image(image)
+    if image.is_empty():
+        return None
+    longest = LIGHTING_MAX_DIMENSION
+    if cv2 is not None:
+        encoded = np.frombuffer(image.data, dtype=np.uint8)
+        gray = None
+        for flag, factor in ((cv2.IMREAD_REDUCED_GRAYSCALE_8, 8), (cv2.IMREAD_REDUCED_GRAYSCALE_4, 4),
+                             (cv2.IMREAD_REDUCED_GRAYSCALE_2, 2), (cv2.IMREAD_GRAYSCALE, 1)):
+            gray = cv2.imdecode(encoded, flag)
+            if gray is None or factor == 1 or max(gray.shape) >= longest:
+                break
+        return gray
+
+    try:
+        with Image.open(image.open()) as img:
+            img.draft("L", (longest, longest))
+            return np.asarray(img.convert("L"))
+    except OSError:
+        return None
+
+
+def analyze_lighting(image) -> Optional[Dict[str, Any]]:
+    """Luminance metrics of a photo, None if it cannot be decoded"""
+    gray = _decode_luminance(image)
+    if gray is None or gray.size == 0:
+        return None
+
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    total = gray.size
+    cumulative = np.cumsum(histogram) / total
+    levels = np.arange(256)
+    p5, p50, p95 = (int(np.searchsorted(cumulative, q)) for q in (0.05, 0.5, 0.95))
+    mean = float(histogram @ levels / total)
+
+    # Mean brightness of each cell of a GRID_SIZE x GRID_SIZE grid
+    rows, cols = gray.shape[0] // GRID_SIZE, gray.shape[1] // GRID_SIZE
+    if rows and cols:
+        cells = gray[:rows * GRID_SIZE, :cols * GRID_SIZE].reshape(GRID_SIZE, rows, GRID_SIZE, cols)
+        region_means = cells.mean(axis=(1, 3))
+    else:
+        region_means = np.array([[mean]])
+    dark_regions = float((region_means < LIGHTING_MIN_BRIGHTNESS / 2).mean())
+    uniformity = float(region_means.min() / region_means.max()) if region_means.max() > 0 else 0.0
+
+    return {
+        "mean": mean,
+        "median": p50,
+        "p5": p5,
+        "p95": p95,
+        "contrast": p95 - p5,
+        "clipped_dark": float(histogram[:DARK_PIXEL + 1].sum() / total),
+        "clipped_bright": float(histogram[BRIGHT_PIXEL:].sum() / total),
+        "uniformity": uniformity,
+        "dark_regions": dark_regions,
+    }
+
+
+def check_lighting(image) -> Dict[str, Any]:
+    """Lighting Adequacy criterion computed locally"""
+    results = criterion_result(4, ai_used="local_histogram")
+
+    metrics = analyze_lighting(image)
+    if metrics is None:
+        results["status"] = "non_compliant"
+        results["score"] = 0
+        results["details"]["lighting"] = {
+            "brightness_level": 0.0,
+            "is_adequate": False,
+            "confidence": 0.0,
+            "description": "صورة غير صالحة"
+        }
+        return results
+
+    brightness_percent = int((metrics["mean"] / 255) * 100)
+    is_bright = metrics["mean"] >= LIGHTING_MIN_BRIGHTNESS
+    is_even = metrics["dark_regions"] <= LIGHTING_MAX_DARK_REGIONS
+    # Confidence grows with the distance from the brightness threshold
+    confidence = min(0.98, 0.7 + abs(metrics["mean"] - LIGHTING_MIN_BRIGHTNESS) / 255)
+
+    if is_bright and is_even:
+        results["status"] = "compliant"
+        results["score"] = 90
+        description = f"مستوى الإضاءة جيد ({brightness_percent}%)"
+    elif is_bright:
+        results["status"] = "needs_improvement"
+        results["score"] = 75
+        description = f"الإضاءة غير متساوية - {int(metrics['dark_regions'] * 100)}% من المساحة مظلمة"
+    else:
+        results["status"] = "non_compliant"
+        results["score"] = 55
+        description = f"مستوى الإضاءة ضعيف ({brightness_percent}%)"
+
+    results["details"]["lighting"] = {
+        "brightness_level": metrics["mean"],
+        "is_adequate": is_bright and is_even,
+        "confidence": float(confidence),
+        "description": description,
+        "metrics": metrics
+    }
+    results["confidence"] = float(confidence)
+    return results
+
+
+# Engine-independent Lighting Adequacy criterion (no per-image features needed)
+LIGHTING_CRITERION = Criterion(4, "check_lighting", "lighting", evaluate=check_lighting)
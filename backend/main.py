@@ -1,20 +1,49 @@
 """
 FastAPI Backend for Restaurant Inspection System
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, FileResponse
-from typing import List
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 import os
 import shutil
+import asyncio
+import logging
 from datetime import datetime
 import json
 
-from ai_engine_vision import InspectionAIEngine  # Google Cloud Vision API
-from pdf_generator import generate_inspection_report
+# AI_ENGINE: vision (Google Cloud Vision + Gemini), hybrid (local screen, cloud when unsure),
+# opencv (local) or lite (mock scores)
+AI_ENGINE = os.getenv("AI_ENGINE", "vision")
+if AI_ENGINE == "opencv":
+    from ai_engine import InspectionAIEngine
+elif AI_ENGINE == "hybrid":
+    from ai_engine_hybrid import InspectionAIEngine
+elif AI_ENGINE == "lite":
+    from ai_engine_lite import InspectionAIEngine
+else:
+    from ai_engine_vision import InspectionAIEngine  # Google Cloud Vision API
+from pdf_generator import generate_inspection_report, REPORTS_DIR
+from upload_store import ResumableUploadStore, UploadError, REQUIRED_KEYS
+from pipeline import IncrementalInspection
+from near_duplicates import NearDuplicateIndex
+from shared_state import SharedState, JOB_LEASE_SECONDS
+from warmup import Warmup
+from retention import RetentionManager, RETENTION_INTERVAL, media_type
+from serialization import JSONBytesResponse, dumps, loads, write_file
+from batch_reports import run_batch, batch_id, BATCH_DIR
+from concurrency import limits
+import accounting
+from scheduler import Scheduler, Overloaded, PRIORITIES
+from derivatives import DerivativeCache, snap_size, source_hash, DERIVATIVE_MEDIA_TYPE
+from http_cache import (CachedStaticFiles, CompressionMiddleware, upload_cache_control, results_cache_control,
+                        cached_response, CACHE_IMMUTABLE, CACHE_CONFIG, CACHE_NONE)
 
-app = FastAPI(title="Restaurant Inspection System")
+app = FastAPI(title="Restaurant Inspection System", default_response_class=JSONBytesResponse)
+
+# The server's error log (configured by uvicorn / gunicorn)
+logger = logging.getLogger("uvicorn.error")
 
 # CORS Configuration
 app.add_middleware(
@@ -23,20 +52,75 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Upload-Offset", "Upload-Length"],
 )
 
+# Compress JSON responses; stored photos, PDFs and archives are sent as-is
+app.add_middleware(CompressionMiddleware)
+
+# State shared by every worker process (see gunicorn.conf.py)
+shared_state = SharedState()
+
 # Initialize AI Engine
 ai_engine = InspectionAIEngine()
+if hasattr(ai_engine, "use_shared_state"):
+    ai_engine.use_shared_state(shared_state)
+
+# Synthetic inspection run at startup (see /api/health/ready)
+warmup = Warmup()
 
 # Ensure directories exist
 UPLOAD_DIR = "uploads"
-REPORTS_DIR = "reports"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
+# Client-side image compression settings (advertised to the frontend)
+UPLOAD_MAX_DIMENSION = int(os.getenv("UPLOAD_MAX_DIMENSION", "1600"))
+UPLOAD_JPEG_QUALITY = float(os.getenv("UPLOAD_JPEG_QUALITY", "0.8"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+
+IMAGE_KEYS = REQUIRED_KEYS
+
+# Resumable (chunked) uploads
+upload_store = ResumableUploadStore(UPLOAD_DIR, max_chunk_size=UPLOAD_CHUNK_SIZE, state=shared_state)
+
+# Incremental analyses for upload sessions still in progress
+active_inspections = {}
+ACTIVE_INSPECTION_TTL = 3600
+
+# Near-duplicate photos across inspections (rebuilt from stored and archived
+# results in the background after startup, see load_duplicate_index)
+duplicate_index = NearDuplicateIndex(shared=shared_state)
+
+
+# Thumbnails, per-day archives and deletion of old inspections (deleted ones leave the duplicate index)
+retention = RetentionManager(UPLOAD_DIR, REPORTS_DIR, on_delete=duplicate_index.remove_inspections,
+                             batch_dir=BATCH_DIR)
+
+# Resized / annotated previews of inspection photos
+derivatives = DerivativeCache()
+
+# Order and admission of analyses in this process (interactive before batch)
+scheduler = Scheduler()
+
+
+def load_results(inspection_id: str) -> Optional[bytes]:
+    """Stored results JSON of an inspection (not re-encoded), from its directory or its archive"""
+    return retention.read_results(inspection_id)
+
+
+def read_stored_image(inspection_id: str, url: str) -> Optional[bytes]:
+    """Bytes of an image referenced by a results "images" URL (uploads or archive)"""
+    return retention.read_image(inspection_id, url)
+
+
+def new_incremental_inspection(inspection_id: str) -> IncrementalInspection:
+    return IncrementalInspection(ai_engine, inspection_id=inspection_id, duplicates=duplicate_index,
+                                 shared=shared_state)
+
 # Serve static files
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
-app.mount("/reports", StaticFiles(directory=REPORTS_DIR), name="reports")
+app.mount("/uploads", CachedStaticFiles(directory=UPLOAD_DIR, cache_control=upload_cache_control), name="uploads")
+app.mount("/reports", CachedStaticFiles(directory=REPORTS_DIR), name="reports")
 
 
 @app.get("/")
@@ -44,91 +128,612 @@ async def root():
     return {"message": "Restaurant Inspection API", "version": "1.0.0"}
 
 
+@app.get("/api/upload-config")
+async def upload_config():
+    """Image size/quality limits the frontend should compress to before upload"""
+    return JSONBytesResponse(content={
+        "max_dimension": UPLOAD_MAX_DIMENSION,
+        "jpeg_quality": UPLOAD_JPEG_QUALITY,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "image_keys": IMAGE_KEYS,
+    }, headers={"Cache-Control": CACHE_CONFIG})
+
+
+def new_inspection_id() -> str:
+    """Create a unique inspection ID and its upload directory"""
+    base_id = f"INS_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    inspection_id = base_id
+    suffix = 1
+    while True:
+        try:
+            os.makedirs(os.path.join(UPLOAD_DIR, inspection_id))
+            return inspection_id
+        except FileExistsError:
+            suffix += 1
+            inspection_id = f"{base_id}_{suffix}"
+
+
+def check_admission(priority: str):
+    """Validate a request's priority class; 503 + Retry-After when its queue is full"""
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(PRIORITIES)}")
+    try:
+        scheduler.admit(priority)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def process_inspection(inspection_id: str, image_paths: dict,
+                             restaurant_name: str, commercial_register: str,
+                             inspection: Optional[IncrementalInspection] = None,
+                             priority: str = "interactive") -> bytes:
+    """Run AI analysis, generate the PDF report and save results JSON; returns the stored JSON"""
+    async with scheduler.slot(priority, commercial_register):
+        return await _process_inspection(inspection_id, image_paths, restaurant_name, commercial_register,
+                                         inspection)
+
+
+async def _process_inspection(inspection_id: str, image_paths: dict,
+                              restaurant_name: str, commercial_register: str,
+                              inspection: Optional[IncrementalInspection]) -> bytes:
+    if inspection is None:
+        inspection = new_incremental_inspection(inspection_id)
+    for key, path in image_paths.items():
+        inspection.add_image(key, path)
+    
+    # Run AI Analysis (blocking engine calls run off the event loop)
+    results = await run_in_threadpool(inspection.results)
+    
+    # Add metadata
+    results["inspection_id"] = inspection_id
+    results["restaurant_name"] = restaurant_name
+    results["commercial_register"] = commercial_register
+    results["timestamp"] = datetime.now().isoformat()
+    results["images"] = {
+        key: "/" + path.replace(os.sep, "/") for key, path in image_paths.items()
+    }
+    
+    # Generate PDF Report
+    pdf_path = await generate_inspection_report(results, inspection_id, image_paths)
+    results["pdf_report"] = f"/reports/{os.path.basename(pdf_path)}"
+    
+    # Save results JSON (compact; encoded once and served as stored)
+    json_path = os.path.join(UPLOAD_DIR, inspection_id, "results.json")
+    return write_file(json_path, results)
+
+
+def resolve_image_refs(images: dict, image_refs: Optional[str]) -> dict:
+    """
+    Resolve images sent by reference to another uploaded part.
+    image_refs is a JSON object such as {"floor_prep": "floor_general"},
+    letting the client send a duplicate photo only once.
+    """
+    refs = {}
+    if image_refs:
+        try:
+            refs = json.loads(image_refs)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="image_refs must be a JSON object")
+        if not isinstance(refs, dict):
+            raise HTTPException(status_code=400, detail="image_refs must be a JSON object")
+
+    for key, target in refs.items():
+        if key not in images or target not in images:
+            raise HTTPException(status_code=400, detail=f"Unknown image reference: {key} -> {target}")
+        if images[key] is not None or images[target] is None:
+            raise HTTPException(status_code=400, detail=f"Invalid image reference: {key} -> {target}")
+
+    missing = [key for key, image_file in images.items() if image_file is None and key not in refs]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing images: {', '.join(missing)}")
+
+    return refs
+
+
 @app.post("/api/analyze")
 async def analyze_inspection(
     restaurant_name: str = Form(...),
     commercial_register: str = Form(...),
-    ceiling_image: UploadFile = File(...),
-    wall_image: UploadFile = File(...),
-    floor_general_image: UploadFile = File(...),
-    floor_prep_image: UploadFile = File(...),
-    lighting_image: UploadFile = File(...),
+    ceiling_image: Optional[UploadFile] = File(None),
+    wall_image: Optional[UploadFile] = File(None),
+    floor_general_image: Optional[UploadFile] = File(None),
+    floor_prep_image: Optional[UploadFile] = File(None),
+    lighting_image: Optional[UploadFile] = File(None),
+    image_refs: Optional[str] = Form(None),
+    priority: str = Form("interactive"),
 ):
     """
     Main inspection endpoint
     Accepts 5 images and restaurant info
     Returns AI analysis results
     """
+    # Shed load before storing anything
+    check_admission(priority)
+    
+    # Map uploaded files to dictionary
+    images = {
+        "ceiling": ceiling_image,
+        "wall": wall_image,
+        "floor_general": floor_general_image,
+        "floor_prep": floor_prep_image,
+        "lighting": lighting_image,
+    }
+    refs = resolve_image_refs(images, image_refs)
+
     try:
         # Create unique inspection ID
-        inspection_id = f"INS_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        inspection_id = new_inspection_id()
         inspection_dir = os.path.join(UPLOAD_DIR, inspection_id)
-        os.makedirs(inspection_dir, exist_ok=True)
-        
-        # Map uploaded files to dictionary
-        images = {
-            "ceiling": ceiling_image,
-            "wall": wall_image,
-            "floor_general": floor_general_image,
-            "floor_prep": floor_prep_image,
-            "lighting": lighting_image,
-        }
         
         image_paths = {}
         for key, image_file in images.items():
+            if image_file is None:
+                continue
             file_path = os.path.join(inspection_dir, f"{key}.jpg")
             with open(file_path, "wb") as buffer:
                 shutil.copyfileobj(image_file.file, buffer)
             image_paths[key] = file_path
         
-        # Run AI Analysis
-        results = ai_engine.analyze_inspection(image_paths)
-        
-        # Add metadata
-        results["inspection_id"] = inspection_id
-        results["restaurant_name"] = restaurant_name
-        results["commercial_register"] = commercial_register
-        results["timestamp"] = datetime.now().isoformat()
+        # Referenced images share the already uploaded file
+        for key, target in refs.items():
+            image_paths[key] = image_paths[target]
         
-        # Generate PDF Report
-        pdf_path = await generate_inspection_report(results, inspection_id)
-        results["pdf_report"] = f"/reports/{os.path.basename(pdf_path)}"
+        body = await process_inspection(inspection_id, image_paths, restaurant_name, commercial_register,
+                                        priority=priority)
         
-        # Save results JSON
-        json_path = os.path.join(inspection_dir, "results.json")
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        
-        return JSONResponse(content=results)
+        return JSONBytesResponse(content=body)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Resumable uploads (tus-like protocol)
+#
+#   POST  /api/uploads                      -> start a session, returns inspection_id
+#   POST  /api/uploads/{id}/parts/{key}     -> declare Upload-Length + Upload-Hash (SHA-256)
+#   HEAD  /api/uploads/{id}/parts/{key}     -> current Upload-Offset (resume point)
+#   PATCH /api/uploads/{id}/parts/{key}     -> append a chunk at Upload-Offset
+#   GET   /api/uploads/{id}                 -> session status, results once analyzed
+#
+# Each image is handed to the incremental pipeline as soon as it is stored, so
+# per-criterion analysis overlaps the remaining uploads; the overall result is
+# finalized in the background once every required key is present.
+#
+# With several worker processes, chunks of one session may reach different
+# workers. Whichever worker stores the last part claims the analysis (a leased
+# job in the shared state); criterion results and Vision detections already
+# computed by the worker that created the session are reused from the shared
+# state. Jobs whose worker died are taken over when a worker (re)starts.
+
+def _upload_headers(status: dict) -> dict:
+    return {
+        "Upload-Offset": str(status["offset"]),
+        "Upload-Length": str(status["length"]),
+        "Cache-Control": "no-store",
+    }
+
+
+def _feed_inspection(inspection_id: str):
+    """Hand every stored image of a session to its incremental analysis"""
+    inspection = active_inspections.get(inspection_id)
+    if inspection is None:
+        return
+    session = upload_store.get_session(inspection_id)
+    for key, path in upload_store.image_paths(session).items():
+        inspection.add_image(key, path)
+
+
+def _expire_inspections():
+    # Drop analyses of sessions abandoned by their client
+    now = datetime.now().timestamp()
+    for inspection_id, inspection in list(active_inspections.items()):
+        if now - inspection.created_at > ACTIVE_INSPECTION_TTL:
+            active_inspections.pop(inspection_id, None)
+            inspection.close()
+
+
+async def _renew_job_lease(inspection_id: str):
+    # Keep the job claimed while the analysis runs
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        if not shared_state.renew_job(inspection_id):
+            return
+
+
+async def _run_uploaded_inspection(inspection_id: str):
+    """Background analysis for a completed upload session"""
+    session = upload_store.get_session(inspection_id)
+    image_paths = upload_store.image_paths(session)
+    inspection = active_inspections.pop(inspection_id, None)
+    heartbeat = asyncio.create_task(_renew_job_lease(inspection_id))
+    try:
+        await process_inspection(
+            inspection_id,
+            image_paths,
+            session["restaurant_name"],
+            session["commercial_register"],
+            inspection=inspection,
+            priority=session.get("priority", "interactive"),
+        )
+        upload_store.set_status(inspection_id, "completed")
+        shared_state.finish_job(inspection_id)
+    except Exception as e:
+        print(f"[ERROR] Analysis failed for {inspection_id}: {e}")
+        upload_store.set_status(inspection_id, "failed", error=str(e))
+        shared_state.finish_job(inspection_id, "failed")
+    finally:
+        heartbeat.cancel()
+
+
+def _start_analysis_if_ready(inspection_id: str, background_tasks: BackgroundTasks):
+    if upload_store.claim_for_analysis(inspection_id) and shared_state.claim_job(inspection_id):
+        background_tasks.add_task(_run_uploaded_inspection, inspection_id)
+
+
+# Seconds between checks for analyses whose worker died (expired job leases)
+JOB_RECOVERY_INTERVAL = int(os.getenv("JOB_RECOVERY_INTERVAL", "60"))
+
+_background_tasks = set()
+
+
+def _resume_analyses(inspection_ids):
+    # Take over analyses left 'processing' by a worker that stopped mid-job
+    for inspection_id in inspection_ids:
+        try:
+            if upload_store.get_session(inspection_id)["status"] != "processing":
+                continue
+        except UploadError:
+            continue
+        if shared_state.claim_job(inspection_id):
+            print(f"[INFO] Resuming analysis of {inspection_id}")
+            task = asyncio.create_task(_run_uploaded_inspection(inspection_id))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+
+async def _watch_job_leases():
+    while True:
+        await asyncio.sleep(JOB_RECOVERY_INTERVAL)
+        try:
+            _resume_analyses(shared_state.expired_jobs())
+        except Exception as e:
+            print(f"[WARNING] Job recovery check failed: {e}")
+
+
+@app.on_event("startup")
+async def recover_interrupted_analyses():
+    shared_state.cache_purge()
+    _resume_analyses(upload_store.session_ids("processing"))
+    _background_tasks.add(asyncio.create_task(_watch_job_leases()))
+
+
+async def _run_retention():
+    # One worker per interval compacts old inspections (the others skip the slot)
+    while True:
+        slot = f"retention_{int(datetime.now().timestamp() // RETENTION_INTERVAL)}"
+        if shared_state.claim_job(slot, lease_seconds=RETENTION_INTERVAL):
+            try:
+                stats = await run_in_threadpool(retention.run_once)
+                stats["derivatives_pruned"] = await run_in_threadpool(derivatives.prune)
+                stats["events_pruned"] = await run_in_threadpool(shared_state.prune_events)
+                stats["jobs_pruned"] = await run_in_threadpool(shared_state.prune_jobs)
+                if any(stats.values()):
+                    print(f"[OK] Retention: {stats}")
+                shared_state.finish_job(slot)
+            except Exception as e:
+                print(f"[WARNING] Retention run failed: {e}")
+                shared_state.finish_job(slot, "failed")
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_retention():
+    _background_tasks.add(asyncio.create_task(_run_retention()))
+
+
+def _index_previous_inspections() -> int:
+    specs = getattr(ai_engine, "CRITERIA", [])
+    loaded = duplicate_index.load_directory(UPLOAD_DIR, specs)
+    for results in retention.archived_results():
+        duplicate_index.load_results(results, specs)
+        loaded += 1
+    return loaded
+
+
+@app.on_event("startup")
+async def load_duplicate_index():
+    # In the background: boot and readiness do not wait for the whole history to be read
+    async def load():
+        try:
+            loaded = await run_in_threadpool(_index_previous_inspections)
+            logger.info(f"Indexed {loaded} previous inspections for near-duplicate detection")
+        except Exception as e:
+            logger.warning(f"Could not index previous inspections: {e}")
+    _background_tasks.add(asyncio.create_task(load()))
+
+
+@app.on_event("startup")
+async def start_warmup():
+    # In the background: the process answers liveness checks while warming up
+    _background_tasks.add(asyncio.create_task(warmup.run(ai_engine, shared_state)))
+
+
+@app.post("/api/uploads")
+async def create_upload(
+    restaurant_name: str = Form(...),
+    commercial_register: str = Form(...),
+    priority: str = Form("interactive"),
+):
+    """Start a resumable upload session for a new inspection"""
+    # Admitted here; once uploaded, the analysis is queued without a bound
+    check_admission(priority)
+    inspection_id = new_inspection_id()
+    upload_store.create_session(inspection_id, restaurant_name, commercial_register, priority)
+    _expire_inspections()
+    active_inspections[inspection_id] = new_incremental_inspection(inspection_id)
+    return {
+        "inspection_id": inspection_id,
+        "required_keys": REQUIRED_KEYS,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+    }
+
+
+@app.get("/api/uploads/{inspection_id}")
+async def get_upload(inspection_id: str):
+    """Upload session status; includes results once analysis is complete"""
+    try:
+        session = upload_store.get_session(inspection_id)
+        parts = {key: upload_store.part_status(inspection_id, key) for key in session["keys"]}
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    response = {
+        "inspection_id": inspection_id,
+        "status": session["status"],
+        "parts": parts,
+        "missing_keys": [key for key in REQUIRED_KEYS if key not in session["keys"]],
+    }
+    if inspection_id in active_inspections:
+        response["criteria_completed"] = active_inspections[inspection_id].completed_criteria()
+    if session["status"] == "failed":
+        response["error"] = session.get("error")
+
+    body = dumps(response)
+    results = load_results(inspection_id) if session["status"] == "completed" else None
+    if results is not None:
+        # Splice the stored results bytes in as the last member instead of re-encoding them
+        body = body[:-1] + b',"results":' + results + b"}"
+    return JSONBytesResponse(content=body, headers={"Cache-Control": CACHE_NONE})
+
+
+@app.post("/api/uploads/{inspection_id}/parts/{key}")
+async def declare_upload_part(inspection_id: str, key: str, request: Request,
+                              background_tasks: BackgroundTasks):
+    """Declare an image (length + SHA-256); parts already stored are reused"""
+    try:
+        length = int(request.headers.get("Upload-Length", "0"))
+        status = upload_store.declare_part(
+            inspection_id, key, length, request.headers.get("Upload-Hash", "")
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Upload-Length must be an integer")
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if status["complete"]:
+        _feed_inspection(inspection_id)
+        _start_analysis_if_ready(inspection_id, background_tasks)
+
+    return JSONResponse(content=status, headers=_upload_headers(status))
+
+
+@app.head("/api/uploads/{inspection_id}/parts/{key}")
+async def upload_part_offset(inspection_id: str, key: str):
+    """Current offset of a part, used by the client to resume"""
+    try:
+        status = upload_store.part_status(inspection_id, key)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return Response(status_code=200, headers=_upload_headers(status))
+
+
+@app.patch("/api/uploads/{inspection_id}/parts/{key}")
+async def upload_part_chunk(inspection_id: str, key: str, request: Request,
+                            background_tasks: BackgroundTasks):
+    """Append a chunk to a part at Upload-Offset"""
+    try:
+        offset = int(request.headers.get("Upload-Offset", "-1"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Upload-Offset must be an integer")
+
+    data = await request.body()
+    try:
+        status = await run_in_threadpool(upload_store.write_chunk, inspection_id, key, offset, data)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if status["complete"]:
+        _feed_inspection(inspection_id)
+        _start_analysis_if_ready(inspection_id, background_tasks)
+
+    return Response(status_code=204, headers=_upload_headers(status))
+
+
 @app.get("/api/inspection/{inspection_id}")
-async def get_inspection(inspection_id: str):
-    """Get inspection results by ID"""
-    json_path = os.path.join(UPLOAD_DIR, inspection_id, "results.json")
+async def get_inspection(inspection_id: str, request: Request):
+    """Get inspection results by ID (archived inspections included); 304 if unchanged"""
+    results = load_results(inspection_id)
     
-    if not os.path.exists(json_path):
+    if results is None:
         raise HTTPException(status_code=404, detail="Inspection not found")
     
-    with open(json_path, "r", encoding="utf-8") as f:
-        results = json.load(f)
-    
-    return JSONResponse(content=results)
+    # Finished results only change when retention compacts them
+    stable_seconds = retention.stable_seconds(inspection_id, loads(results))
+    return cached_response(request.headers, results, results_cache_control(stable_seconds))
+
+
+def _render_derivative(inspection_id: str, key: str, size: int, boxes: bool) -> Optional[bytes]:
+    results = load_results(inspection_id)
+    if results is None:
+        return None
+    results = loads(results)
+    url = results.get("images", {}).get(key)
+    if url is None:
+        return None
+    detections = results.get("detections", {}).get(key) if boxes else None
+
+    image_hash, source = source_hash(url, lambda: read_stored_image(inspection_id, url))
+    if image_hash is None:
+        return None
+
+    def load_source():
+        data = source if source is not None else read_stored_image(inspection_id, url)
+        if data is None:
+            raise FileNotFoundError(url)
+        return data
+
+    try:
+        return derivatives.get(image_hash, size, detections, load_source)
+    except OSError as e:
+        print(f"[WARNING] Could not render {key} of {inspection_id}: {e}")
+        return None
+
+
+@app.get("/api/inspection/{inspection_id}/images/{key}")
+async def get_inspection_image(inspection_id: str, key: str, request: Request,
+                               size: int = 320, boxes: bool = False):
+    """
+    Preview of an inspection photo: longest side `size` (rounded up to a
+    supported size), with the detected object boxes drawn when boxes=true
+    """
+    data = await run_in_threadpool(_render_derivative, inspection_id, key, snap_size(size), boxes)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return cached_response(request.headers, data, CACHE_IMMUTABLE, response_class=Response,
+                           media_type=DERIVATIVE_MEDIA_TYPE)
+
+
+@app.get("/api/archive/{inspection_id}/{name:path}")
+async def get_archived_file(inspection_id: str, name: str, request: Request):
+    """Image or PDF report of an archived inspection"""
+    data = await run_in_threadpool(retention.read_archived, inspection_id, name)
+    if data is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return cached_response(request.headers, data, CACHE_IMMUTABLE, response_class=Response,
+                           media_type=media_type(name))
+
+
+# Report packs (batch_reports.py): rendered in worker processes, outside the request
+BATCH_MAX_INSPECTIONS = int(os.getenv("BATCH_MAX_INSPECTIONS", "1000"))
+BATCH_JOB_LEASE = 3600
+# How long a finished pack's summary stays queryable
+BATCH_RESULT_TTL = 7 * 24 * 3600
+
+
+def _report_url(path: str) -> str:
+    return "/reports/" + os.path.relpath(path, REPORTS_DIR).replace(os.sep, "/")
+
+
+async def _run_report_batch(job_id: str, inspection_ids: List[str], output: str, consolidated: bool, title: str):
+    try:
+        summary = await run_in_threadpool(run_batch, inspection_ids, output, consolidated, title,
+                                          dirs=(UPLOAD_DIR, REPORTS_DIR, retention.archive_dir))
+        summary["reports"] = [_report_url(path) for path in summary["reports"]]
+        summary["output"] = _report_url(output)
+        shared_state.cache_set("batch", job_id, summary, ttl=BATCH_RESULT_TTL)
+        shared_state.finish_job(job_id)
+        print(f"[OK] Report batch {job_id}: {summary['rendered']} inspections in {summary['seconds']}s")
+    except Exception as e:
+        print(f"[ERROR] Report batch {job_id} failed: {e}")
+        shared_state.cache_set("batch", job_id, {"error": str(e)}, ttl=BATCH_RESULT_TTL)
+        shared_state.finish_job(job_id, "failed")
+
+
+@app.post("/api/reports/batch", status_code=202)
+async def create_report_batch(
+    date: Optional[str] = Form(None),
+    inspection_ids: Optional[str] = Form(None),
+    consolidated: bool = Form(True),
+):
+    """
+    Start rendering a report pack: the inspections of a day (YYYY-MM-DD) or
+    a comma-separated list, as one consolidated PDF or one PDF each
+    """
+    if inspection_ids:
+        ids = [inspection_id.strip() for inspection_id in inspection_ids.split(",") if inspection_id.strip()]
+        title = f"{len(ids)} فحص"
+    elif date:
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+        ids = await run_in_threadpool(retention.inspection_ids, date)
+        title = f"تقارير يوم {date}"
+    else:
+        raise HTTPException(status_code=400, detail="date or inspection_ids is required")
+    if not ids:
+        raise HTTPException(status_code=404, detail="No inspections found")
+    if len(ids) > BATCH_MAX_INSPECTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_INSPECTIONS} inspections per batch")
+
+    job_id = batch_id()
+    output = os.path.join(BATCH_DIR, f"{job_id}.pdf" if consolidated else job_id)
+    shared_state.claim_job(job_id, lease_seconds=BATCH_JOB_LEASE)
+    task = asyncio.create_task(_run_report_batch(job_id, ids, output, consolidated, title))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return {
+        "job_id": job_id,
+        "status": "running",
+        "inspections": len(ids),
+        "status_url": f"/api/reports/batch/{job_id}",
+    }
+
+
+@app.get("/api/reports/batch/{job_id}")
+async def get_report_batch(job_id: str):
+    """Status of a report pack; lists the PDF URLs once it is done"""
+    job = shared_state.job_status(job_id) if job_id.startswith("batch_") else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    status = "failed" if job["expired"] else job["status"]
+    result = shared_state.cache_get("batch", job_id) or {}
+    return JSONResponse(content={"job_id": job_id, "status": status, **result}, headers={"Cache-Control": CACHE_NONE})
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime metrics of this worker process, and AI usage per day (all workers)"""
+    return JSONResponse(content={
+        "worker": shared_state.worker_id,
+        "ai_concurrency": limits(),
+        "scheduler": scheduler.snapshot(),
+        "usage": accounting.snapshot(shared_state),
+        "timestamp": datetime.now().isoformat(),
+    }, headers={"Cache-Control": CACHE_NONE})
 
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is up (also wakes a sleeping instance)"""
     return {
         "status": "healthy",
         "ai_engine": "loaded",
+        "ready": warmup.ready,
+        "warmup": warmup.status(),
         "timestamp": datetime.now().isoformat()
     }
 
 
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Readiness: 503 until the startup warm-up inspection has finished"""
+    content = {"ready": warmup.ready, "warmup": warmup.status()}
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content=content, headers={"Retry-After": "5"})
+    return content
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
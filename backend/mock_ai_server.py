@@ -0,0 +1,324 @@
+"""
+Mock Vision / Gemini Server
+Local stand-in for Google Cloud Vision (images:annotate) and the Gemini API
+(generateContent, streamGenerateContent) so engines can be benchmarked
+offline without credentials.
+
+Run:
+    python mock_ai_server.py --port 9100 --latency-ms 400 --sigma 0.4 --error-rate 0.02
+    python mock_ai_server.py --quota-concurrency 8    # 429 beyond 8 requests in flight
+    python mock_ai_server.py --token-ms 15            # Gemini answers take 15ms per output token
+
+Point the Vision engine at it with:
+    VISION_API_ENDPOINT=http://127.0.0.1:9100 GEMINI_BASE_URL=http://127.0.0.1:9100
+
+Responses are deterministic per image (derived from its content hash and
+pixels), so repeated runs over the same photos give the same answers.
+"""
+import io
+import os
+import json
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+from PIL import Image
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, Any
+
+
+# Latency is log-normal: median MOCK_LATENCY_MS, spread MOCK_LATENCY_SIGMA
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "300"))
+MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", "0.4"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+# Requests in flight beyond this get 429 (a per-project quota); 0 = unlimited
+MOCK_QUOTA_CONCURRENCY = int(os.getenv("MOCK_QUOTA_CONCURRENCY", "0"))
+# Share of Gemini answers wrapped in markdown code fences, like the real model often does
+MOCK_FENCE_RATE = float(os.getenv("MOCK_FENCE_RATE", "0.5"))
+# Gemini generation time per output token, after the first-token latency above
+MOCK_TOKEN_MS = float(os.getenv("MOCK_TOKEN_MS", "0"))
+# Output tokens per streamed chunk
+MOCK_STREAM_CHUNK_TOKENS = 8
+
+# Detail the real model adds to its descriptions (answers end with a long text field)
+_DESCRIPTION_DETAIL = (
+    " — تمت مراجعة الصورة بالكامل بما في ذلك الزوايا والحواف ومستوى الإضاءة ونظافة الأسطح،"
+    " ولم تُلاحظ عناصر أخرى تستدعي الانتباه ضمن نطاق هذا المعيار، ويُنصح بالتحقق الميداني"
+    " عند وجود أي شك في جودة الصورة أو زاوية التصوير."
+)
+
+LABEL_VOCABULARY = [
+    "Ceiling", "Wall", "Floor", "Room", "Interior design", "Tile", "Flooring",
+    "Wire", "Cable", "Pipe", "Light fixture", "Lighting", "Kitchen", "Building",
+]
+OBJECT_VOCABULARY = ["Cable", "Pipe", "Light fixture", "Lamp", "Door", "Cabinetry"]
+
+app = FastAPI(title="Mock Vision/Gemini Server")
+
+stats = {"vision_requests": 0, "vision_images": 0, "vision_features": 0, "gemini_requests": 0, "errors_injected": 0,
+         "quota_rejections": 0, "max_in_flight": 0, "gemini_json_mode": 0, "gemini_streams": 0}
+_in_flight = 0
+
+
+async def _simulate_latency():
+    if MOCK_LATENCY_MS > 0:
+        delay = random.lognormvariate(np.log(MOCK_LATENCY_MS / 1000), MOCK_LATENCY_SIGMA)
+        await asyncio.sleep(delay)
+
+
+def _quota_error():
+    stats["quota_rejections"] += 1
+    return JSONResponse(status_code=429, content={
+        "error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}
+    })
+
+
+async def _call(handler):
+    """Runs a request within the concurrency quota (rejected immediately beyond it)"""
+    global _in_flight
+    if MOCK_QUOTA_CONCURRENCY and _in_flight >= MOCK_QUOTA_CONCURRENCY:
+        return _quota_error()
+    _in_flight += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], _in_flight)
+    try:
+        await _simulate_latency()
+        response = _injected_error() or handler()
+        return await response if asyncio.iscoroutine(response) else response
+    finally:
+        _in_flight -= 1
+
+
+def _injected_error():
+    if MOCK_ERROR_RATE > 0 and random.random() < MOCK_ERROR_RATE:
+        stats["errors_injected"] += 1
+        status = random.choice([429, 503])
+        message = "Resource has been exhausted" if status == 429 else "The service is currently unavailable"
+        return JSONResponse(status_code=status, content={
+            "error": {"code": status, "message": message,
+                      "status": "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE"}
+        })
+    return None
+
+
+# The REST transport sends enums as integers ($alt=json;enum-encoding=int)
+FEATURE_TYPES = {4: "LABEL_DETECTION", 7: "IMAGE_PROPERTIES", 19: "OBJECT_LOCALIZATION"}
+
+
+def _decode_base64(data: str) -> bytes:
+    # Accept both standard and URL-safe alphabets, with or without padding
+    data = data.replace("-", "+").replace("_", "/")
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _image_facts(content: bytes) -> Dict[str, Any]:
+    """Deterministic pseudo-analysis of an image"""
+    digest = hashlib.sha256(content).digest()
+    rng = random.Random(digest)
+    facts = {"rng": rng, "colors": []}
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            img.draft("RGB", (128, 128))
+            small = img.convert("RGB").resize((64, 64))
+        pixels = np.asarray(small).reshape(-1, 3)
+        quantized = small.quantize(colors=5)
+        counts = sorted(quantized.getcolors(), reverse=True)
+        palette = quantized.getpalette()
+        total = float(len(pixels))
+        for count, index in counts:
+            red, green, blue = palette[index * 3:index * 3 + 3]
+            facts["colors"].append({
+                "color": {"red": red, "green": green, "blue": blue},
+                "score": count / total,
+                "pixelFraction": count / total,
+            })
+    except Exception:
+        pass
+    return facts
+
+
+def _annotate(request: Dict[str, Any]) -> Dict[str, Any]:
+    content = _decode_base64(request.get("image", {}).get("content", ""))
+    facts = _image_facts(content)
+    rng = facts["rng"]
+    response = {}
+    for feature in request.get("features", []):
+        feature_type = feature.get("type")
+        feature_type = FEATURE_TYPES.get(feature_type, feature_type)
+        max_results = int(feature.get("maxResults", 10))
+        if feature_type == "LABEL_DETECTION":
+            labels = rng.sample(LABEL_VOCABULARY, k=min(max_results, rng.randint(3, 7)))
+            response["labelAnnotations"] = [
+                {"description": label, "score": round(rng.uniform(0.55, 0.98), 3), "topicality": 0.8}
+                for label in labels
+            ]
+        elif feature_type == "IMAGE_PROPERTIES":
+            response["imagePropertiesAnnotation"] = {"dominantColors": {"colors": facts["colors"]}}
+        elif feature_type == "OBJECT_LOCALIZATION":
+            objects = []
+            for name in rng.sample(OBJECT_VOCABULARY, k=min(max_results, rng.randint(0, 2))):
+                x, y = rng.uniform(0, 0.6), rng.uniform(0, 0.6)
+                w, h = rng.uniform(0.1, 0.4), rng.uniform(0.1, 0.4)
+                objects.append({
+                    "name": name,
+                    "score": round(rng.uniform(0.5, 0.95), 3),
+                    "boundingPoly": {"normalizedVertices": [
+                        {"x": x, "y": y}, {"x": x + w, "y": y},
+                        {"x": x + w, "y": y + h}, {"x": x, "y": y + h},
+                    ]},
+                })
+            response["localizedObjectAnnotations"] = objects
+    return response
+
+
+@app.post("/v1/images:annotate")
+async def images_annotate(request: Request):
+    """Vision API batch annotate (what ImageAnnotatorClient.annotate_image calls over REST)"""
+    body = await request.json()
+    stats["vision_requests"] += 1
+    stats["vision_images"] += len(body.get("requests", []))
+    # Vision bills per feature per image
+    stats["vision_features"] += sum(len(item.get("features", [])) for item in body.get("requests", []))
+    return await _call(lambda: {"responses": [_annotate(item) for item in body.get("requests", [])]})
+
+
+def _gemini_answer(prompt: str, content: bytes) -> Dict[str, Any]:
+    rng = random.Random(hashlib.sha256(content + prompt.encode("utf-8")).digest())
+    if "has_ac_units" in prompt:
+        count = rng.choice([0, 0, 0, 1, 2])
+        return {
+            "has_ac_units": count > 0,
+            "count": count,
+            "confidence": rng.randint(70, 98),
+            "description": ("تم العثور على وحدات تكييف" if count else "لا توجد وحدات تكييف ظاهرة") + _DESCRIPTION_DETAIL,
+        }
+    if "has_curved_junction" in prompt:
+        tiled = rng.random() < 0.4
+        curved = not tiled and rng.random() < 0.7
+        return {
+            "has_curved_junction": curved,
+            "is_tiled_floor": tiled,
+            "has_grout_lines": tiled,
+            "junction_type": "curved" if curved else "straight",
+            "floor_type": "tiled" if tiled else "seamless",
+            "is_compliant": curved and not tiled,
+            "confidence": rng.randint(70, 98),
+            "description": ("أرضية مبلطة مع فواصل" if tiled else "أرضية موحدة") + _DESCRIPTION_DETAIL,
+        }
+    return {"description": "تحليل تجريبي", "confidence": rng.randint(70, 98)}
+
+
+@app.post("/{api_version}/models/{model}:generateContent")
+async def generate_content(api_version: str, model: str, request: Request):
+    """Gemini generateContent (what genai Client.models.generate_content calls)"""
+    body = await request.json()
+    stats["gemini_requests"] += 1
+
+    async def respond():
+        response = _gemini_response(model, body)
+        # The whole answer is generated before anything is sent
+        await asyncio.sleep(response["usageMetadata"]["candidatesTokenCount"] * MOCK_TOKEN_MS / 1000)
+        return response
+
+    return await _call(respond)
+
+
+@app.post("/{api_version}/models/{model}:streamGenerateContent")
+async def stream_generate_content(api_version: str, model: str, request: Request):
+    """Gemini streamGenerateContent (alt=sse): the answer text arrives in chunks as it is generated"""
+    body = await request.json()
+    stats["gemini_requests"] += 1
+    stats["gemini_streams"] += 1
+
+    def respond():
+        response = _gemini_response(model, body)
+        text = response["candidates"][0]["content"]["parts"][0]["text"]
+        chunk_chars = MOCK_STREAM_CHUNK_TOKENS * 4
+
+        async def events():
+            for start in range(0, len(text), chunk_chars):
+                await asyncio.sleep(MOCK_STREAM_CHUNK_TOKENS * MOCK_TOKEN_MS / 1000)
+                last = start + chunk_chars >= len(text)
+                chunk = {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": text[start:start + chunk_chars]}]},
+                                    **({"finishReason": "STOP"} if last else {})}],
+                    "modelVersion": model,
+                }
+                if last:
+                    chunk["usageMetadata"] = response["usageMetadata"]
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return await _call(respond)
+
+
+def _gemini_response(model: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    prompt, content = "", b""
+    for item in body.get("contents", []):
+        for part in item.get("parts", []):
+            if "text" in part:
+                prompt += part["text"]
+            elif "inlineData" in part:
+                content += _decode_base64(part["inlineData"].get("data", ""))
+
+    answer = _gemini_answer(prompt, content)
+    # Fields come in the schema's propertyOrdering, like the real model's
+    ordering = body.get("generationConfig", {}).get("responseSchema", {}).get("propertyOrdering", [])
+    answer = {name: answer[name] for name in [*ordering, *answer] if name in answer}
+    text = json.dumps(answer, ensure_ascii=False)
+    # JSON mode (responseMimeType) answers are bare JSON; free text is often fenced
+    json_mode = body.get("generationConfig", {}).get("responseMimeType") == "application/json"
+    if json_mode:
+        stats["gemini_json_mode"] += 1
+    elif random.random() < MOCK_FENCE_RATE:
+        text = f"```json\n{text}\n```"
+    prompt_tokens = len(prompt) // 4 + 258
+    output_tokens = len(text) // 4
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+        "modelVersion": model,
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    global MOCK_LATENCY_MS, MOCK_LATENCY_SIGMA, MOCK_ERROR_RATE, MOCK_FENCE_RATE, MOCK_QUOTA_CONCURRENCY, MOCK_TOKEN_MS
+
+    parser = argparse.ArgumentParser(description="Mock Vision/Gemini server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LATENCY_MS)
+    parser.add_argument("--sigma", type=float, default=MOCK_LATENCY_SIGMA)
+    parser.add_argument("--error-rate", type=float, default=MOCK_ERROR_RATE)
+    parser.add_argument("--fence-rate", type=float, default=MOCK_FENCE_RATE)
+    parser.add_argument("--quota-concurrency", type=int, default=MOCK_QUOTA_CONCURRENCY,
+                        help="reject requests beyond this many in flight with 429")
+    parser.add_argument("--token-ms", type=float, default=MOCK_TOKEN_MS,
+                        help="Gemini generation time per output token")
+    args = parser.parse_args()
+
+    MOCK_LATENCY_MS = args.latency_ms
+    MOCK_LATENCY_SIGMA = args.sigma
+    MOCK_ERROR_RATE = args.error_rate
+    MOCK_FENCE_RATE = args.fence_rate
+    MOCK_QUOTA_CONCURRENCY = args.quota_concurrency
+    MOCK_TOKEN_MS = args.token_ms
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Near-Duplicate Image Detection
+Perceptual hashes (pHash) with a BK-tree index for Hamming-distance lookups,
+used to reuse analysis of re-submitted photos and flag suspicious reuse
+"""
+import os
+import copy
+import json
+import threading
+import numpy as np
+from PIL import Image
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+from criteria import as_criterion
+from shared_state import SharedState
+
+
+# Maximum Hamming distance (of 64 bits) for two photos to count as near-identical
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "6"))
+
+_DCT_SIZE = 32
+_HASH_SIZE = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def phash(source) -> int:
+    """64-bit perceptual hash from the low-frequency DCT of a 32x32 grayscale image"""
+    with Image.open(source) as img:
+        # Let the JPEG decoder downscale while decoding (much faster for camera photos)
+        img.draft("L", (_DCT_SIZE * 4, _DCT_SIZE * 4))
+        small = img.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].flatten()
+    median = np.median(coefficients[1:])
+    bits = coefficients > median
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def hash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes (metric: Hamming distance)"""
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value: int, item: Any):
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """All items within max_distance, nearest first"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            # Triangle inequality: only children in [d - r, d + r] can match
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return found
+
+    def remove(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every item matching predicate (the tree is rebuilt from the rest); returns how many"""
+        kept = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            kept.extend((node[0], item) for item in node[1] if not predicate(item))
+            stack.extend(node[2].values())
+        removed = self._size - len(kept)
+        if removed:
+            self._root, self._size = None, 0
+            for value, item in kept:
+                self.add(value, item)
+        return removed
+
+
+class NearDuplicateIndex:
+    """
+    In-memory index of previously analyzed images and criterion results.
+
+    Images are indexed by pHash so re-submitted (or lightly edited) photos are
+    found by Hamming distance. Criterion results are indexed by the hash of
+    their first input image; a result is reused only when every input image
+    of the criterion is near-identical to the earlier inspection's inputs.
+
+    With a SharedState, additions (and removals of deleted inspections) are
+    also published to the other worker processes, which apply them before
+    their next lookup.
+    """
+
+    EVENT_TOPIC = "near_duplicates"
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE, shared: Optional[SharedState] = None):
+        self.max_distance = max_distance
+        self.shared = shared
+        self._images = BKTree()
+        self._criteria = BKTree()
+        self._lock = threading.Lock()
+        # Earlier events are covered by the stored results load_directory() reads
+        self._last_event = shared.latest_event(self.EVENT_TOPIC) if shared is not None else 0
+
+    def _sync(self):
+        # Apply entries other workers added since the last lookup
+        if self.shared is None:
+            return
+        with self._lock:
+            events = self.shared.events_since(self.EVENT_TOPIC, self._last_event)
+            for event_id, event in events:
+                self._last_event = event_id
+                if event["worker"] == self.shared.worker_id:
+                    continue
+                if event["kind"] == "image":
+                    self._images.add(event["hash"], (event["inspection_id"], event["key"]))
+                elif event["kind"] == "remove":
+                    self._remove(set(event["inspection_ids"]))
+                else:
+                    self._criteria.add(event["entry"]["hashes"][0], event["entry"])
+
+    def _publish(self, event: Dict[str, Any]):
+        if self.shared is not None:
+            self.shared.publish(self.EVENT_TOPIC, dict(event, worker=self.shared.worker_id))
+
+    def find_image(self, image_hash: int, inspection_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Closest earlier image from another inspection, if near-identical"""
+        self._sync()
+        with self._lock:
+            matches = self._images.search(image_hash, self.max_distance)
+        for distance, (other_id, key) in matches:
+            if other_id != inspection_id:
+                return {"inspection_id": other_id, "image_key": key, "distance": distance}
+        return None
+
+    def add_image(self, image_hash: int, inspection_id: str, key: str, publish: bool = True):
+        with self._lock:
+            self._images.add(image_hash, (inspection_id, key))
+        if publish:
+            self._publish({"kind": "image", "hash": image_hash, "inspection_id": inspection_id, "key": key})
+
+    def find_criterion(self, method: str, hashes: List[int],
+                       inspection_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Reusable criterion result whose inputs all match the given hashes"""
+        self._sync()
+        with self._lock:
+            candidates = self._criteria.search(hashes[0], self.max_distance)
+        best = None
+        for _, entry in candidates:
+            if entry["method"] != method or entry["inspection_id"] == inspection_id:
+                continue
+            if len(entry["hashes"]) != len(hashes):
+                continue
+            distances = [hamming(a, b) for a, b in zip(hashes, entry["hashes"])]
+            if max(distances) > self.max_distance:
+                continue
+            if best is None or max(distances) < best[0]:
+                best = (max(distances), entry)
+        if best is None:
+            return None
+
+        result = copy.deepcopy(best[1]["result"])
+        result["reused_analysis"] = {
+            "inspection_id": best[1]["inspection_id"],
+            "max_distance": best[0],
+        }
+        return result
+
+    def add_criterion(self, method: str, hashes: List[int], result: Dict[str, Any], inspection_id: str,
+                      publish: bool = True):
+        if "reused_analysis" in result:
+            return
+        entry = {
+            "method": method,
+            "hashes": list(hashes),
+            "result": copy.deepcopy(result),
+            "inspection_id": inspection_id,
+        }
+        with self._lock:
+            self._criteria.add(hashes[0], entry)
+        if publish:
+            self._publish({"kind": "criterion", "entry": entry})
+
+    def remove_inspections(self, inspection_ids: Iterable[str], publish: bool = True) -> int:
+        """Forget deleted inspections, so their images and results are no longer matched"""
+        inspection_ids = set(inspection_ids)
+        if not inspection_ids:
+            return 0
+        with self._lock:
+            removed = self._remove(inspection_ids)
+        if publish:
+            self._publish({"kind": "remove", "inspection_ids": sorted(inspection_ids)})
+        return removed
+
+    def _remove(self, inspection_ids: set) -> int:
+        return (self._images.remove(lambda item: item[0] in inspection_ids)
+                + self._criteria.remove(lambda entry: entry["inspection_id"] in inspection_ids))
+
+    def load_results(self, results: Dict[str, Any], specs: List[Any]):
+        """Re-index a stored inspection (results.json written by the pipeline); not published"""
+        image_hashes = results.get("image_hashes")
+        inspection_id = results.get("inspection_id")
+        if not image_hashes or not inspection_id:
+            return
+        hashes = {key: int(value, 16) for key, value in image_hashes.items()}
+        for key, value in hashes.items():
+            self.add_image(value, inspection_id, key, publish=False)
+
+        criteria = results.get("criteria", [])
+        if len(criteria) != len(specs):
+            return
+        for spec, criterion in zip(specs, criteria):
+            spec = as_criterion(spec)
+            if all(key in hashes for key in spec.keys):
+                self.add_criterion(spec.method, [hashes[key] for key in spec.keys], criterion, inspection_id,
+                                   publish=False)
+
+    def load_directory(self, upload_dir: str, specs: List[Any]) -> int:
+        """Rebuild the index from every stored results.json; returns inspections loaded"""
+        loaded = 0
+        if not os.path.isdir(upload_dir):
+            return loaded
+        for inspection_id in sorted(os.listdir(upload_dir)):
+            json_path = os.path.join(upload_dir, inspection_id, "results.json")
+            if not os.path.exists(json_path):
+                continue
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    self.load_results(json.load(f), specs)
+                loaded += 1
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Could not index {json_path}: {e}")
+        return loaded
@@ -11,25 +11,118 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_RIGHT, TA_CENTER
 from datetime import datetime
+from functools import lru_cache
+import io
 import os
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import arabic_reshaper
 from bidi.algorithm import get_display
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
 
+from derivatives import DerivativeCache, source_hash
 
-async def generate_inspection_report(results: Dict[str, Any], inspection_id: str) -> str:
+
+# Served by main.py under /reports
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+
+# Evidence photos are pre-scaled to this print resolution and embedded as
+# JPEG as-is (no re-encoding by ReportLab), so report size stays bounded
+EVIDENCE_DPI = int(os.getenv("EVIDENCE_DPI", "150"))
+EVIDENCE_WIDTH = 8 * cm
+
+EVIDENCE_LABELS = {
+    "ceiling": "السقف",
+    "wall": "الجدار",
+    "floor_general": "الأرضية",
+    "floor_prep": "أرضية منطقة التحضير",
+    "lighting": "الإضاءة",
+}
+
+# Shared with the preview endpoint: same content-addressed cache directory
+_evidence_cache = DerivativeCache()
+
+
+def _read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _evidence_images(results: Dict[str, Any], image_paths: Dict[str, str],
+                     read_image: Callable[[str], Optional[bytes]] = _read_file) -> List[Tuple[List[str], bytes]]:
     """
-    Generate PDF inspection report
-    Returns path to generated PDF
+    (image keys, JPEG bytes) per distinct photo, with the detected object
+    boxes drawn. Cached per image hash, so regenerating a report only reads
+    the cached files.
     """
-    report_dir = "../reports"
-    os.makedirs(report_dir, exist_ok=True)
-    
-    pdf_filename = f"inspection_report_{inspection_id}.pdf"
-    pdf_path = os.path.join(report_dir, pdf_filename)
-    
-    # Create PDF document
-    doc = SimpleDocTemplate(
+    size = round(EVIDENCE_WIDTH / cm / 2.54 * EVIDENCE_DPI)
+    detections = results.get("detections", {})
+    by_path: Dict[str, List[str]] = {}
+    for key, path in image_paths.items():
+        by_path.setdefault(path, []).append(key)
+
+    evidence = []
+    for path, keys in by_path.items():
+        try:
+            image_hash, source = source_hash(path, lambda: read_image(path))
+            if image_hash is None:
+                continue
+            data = _evidence_cache.get(image_hash, size, detections.get(keys[0]),
+                                       lambda: source if source is not None else read_image(path), "JPEG")
+            evidence.append((keys, data))
+        except Exception as e:
+            print(f"[WARNING] Evidence image skipped ({path}): {e}")
+    return evidence
+
+
+@lru_cache(maxsize=4096)
+def arabic_text(text: str) -> str:
+    """Reshaped, visually ordered Arabic (cached: labels repeat across documents)"""
+    reshaped = arabic_reshaper.reshape(text)
+    return get_display(reshaped)
+
+
+@lru_cache(maxsize=1)
+def report_styles() -> Dict[str, ParagraphStyle]:
+    """Paragraph styles, built once per process and shared by every document"""
+    styles = getSampleStyleSheet()
+    return {
+        "arabic": ParagraphStyle(
+            'Arabic',
+            parent=styles['Normal'],
+            alignment=TA_RIGHT,
+            fontSize=12,
+            leading=18
+        ),
+        "title": ParagraphStyle(
+            'ArabicTitle',
+            parent=styles['Title'],
+            alignment=TA_CENTER,
+            fontSize=18,
+            leading=24,
+            textColor=colors.HexColor('#00695C')
+        ),
+    }
+
+
+STATUS_AR = {
+    "compliant": "مستوفي للمعايير",
+    "needs_improvement": "يحتاج تحسينات",
+    "non_compliant": "غير مستوفي"
+}
+
+STATUS_COLOR = {
+    "compliant": colors.green,
+    "needs_improvement": colors.orange,
+    "non_compliant": colors.red
+}
+
+
+def report_document(pdf_path: str) -> SimpleDocTemplate:
+    return SimpleDocTemplate(
         pdf_path,
         pagesize=A4,
         rightMargin=2*cm,
@@ -37,33 +130,49 @@ async def generate_inspection_report(results: Dict[str, Any], inspection_id: str
         topMargin=2*cm,
         bottomMargin=2*cm
     )
+
+
+def footer() -> Paragraph:
+    return Paragraph(arabic_text("تم إنشاء هذا التقرير بواسطة نظام الفحص الذكي - وزارة البلديات والإسكان"),
+                     report_styles()["arabic"])
+
+
+async def generate_inspection_report(results: Dict[str, Any], inspection_id: str,
+                                     image_paths: Optional[Dict[str, str]] = None) -> str:
+    """
+    Generate PDF inspection report
+    Returns path to generated PDF (built in the threadpool: evidence photos
+    are decoded and resized, which must not stall the event loop)
+    """
+    return await run_in_threadpool(build_inspection_report, results, inspection_id, image_paths)
+
+
+def build_inspection_report(results: Dict[str, Any], inspection_id: str,
+                            image_paths: Optional[Dict[str, str]] = None,
+                            read_image: Callable[[str], Optional[bytes]] = _read_file,
+                            report_dir: str = REPORTS_DIR) -> str:
+    """Synchronous report build (also run in batch_reports worker processes)"""
+    os.makedirs(report_dir, exist_ok=True)
     
-    # Build content
-    story = []
-    styles = getSampleStyleSheet()
+    pdf_filename = f"inspection_report_{inspection_id}.pdf"
+    pdf_path = os.path.join(report_dir, pdf_filename)
     
-    # Arabic style
-    arabic_style = ParagraphStyle(
-        'Arabic',
-        parent=styles['Normal'],
-        alignment=TA_RIGHT,
-        fontSize=12,
-        leading=18
-    )
+    story = inspection_story(results, inspection_id, image_paths, read_image)
+    story.append(footer())
     
-    title_style = ParagraphStyle(
-        'ArabicTitle',
-        parent=styles['Title'],
-        alignment=TA_CENTER,
-        fontSize=18,
-        leading=24,
-        textColor=colors.HexColor('#00695C')
-    )
+    # Build PDF
+    report_document(pdf_path).build(story)
     
-    # Helper function for Arabic text
-    def arabic_text(text):
-        reshaped = arabic_reshaper.reshape(text)
-        return get_display(reshaped)
+    return pdf_path
+
+
+def inspection_story(results: Dict[str, Any], inspection_id: str,
+                     image_paths: Optional[Dict[str, str]] = None,
+                     read_image: Callable[[str], Optional[bytes]] = _read_file) -> List[Any]:
+    """Flowables of one inspection's report, without the footer"""
+    story = []
+    arabic_style = report_styles()["arabic"]
+    title_style = report_styles()["title"]
     
     # Title
     title = Paragraph(arabic_text("تقرير الفحص الذكي للمنشأة"), title_style)
@@ -99,29 +208,17 @@ async def generate_inspection_report(results: Dict[str, Any], inspection_id: str
     story.append(Spacer(1, cm))
     
     # Overall Result
-    status_ar = {
-        "compliant": "مستوفي للمعايير",
-        "needs_improvement": "يحتاج تحسينات",
-        "non_compliant": "غير مستوفي"
-    }
-    
-    status_color = {
-        "compliant": colors.green,
-        "needs_improvement": colors.orange,
-        "non_compliant": colors.red
-    }
-    
     overall_status = results.get("overall_status", "non_compliant")
     score = results.get("overall_score", 0)
     
     result_data = [
-        [arabic_text("النتيجة الإجمالية:"), arabic_text(status_ar[overall_status])],
+        [arabic_text("النتيجة الإجمالية:"), arabic_text(STATUS_AR[overall_status])],
         [arabic_text("الدرجة:"), f"{score:.1f}/100"],
     ]
     
     result_table = Table(result_data, colWidths=[6*cm, 10*cm])
     result_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), status_color[overall_status]),
+        ('BACKGROUND', (0, 0), (-1, -1), STATUS_COLOR[overall_status]),
         ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
         ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
         ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
@@ -145,14 +242,14 @@ async def generate_inspection_report(results: Dict[str, Any], inspection_id: str
         crit_name = criterion.get("criterion_name", "")
         
         crit_data = [
-            [arabic_text(crit_name), f"{crit_score}/100", arabic_text(status_ar[crit_status])]
+            [arabic_text(crit_name), f"{crit_score}/100", arabic_text(STATUS_AR[crit_status])]
         ]
         
         crit_table = Table(crit_data, colWidths=[10*cm, 3*cm, 3*cm])
         crit_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#F5F5F5')),
             ('TEXTCOLOR', (0, 0), (1, -1), colors.black),
-            ('TEXTCOLOR', (2, 0), (2, -1), status_color[crit_status]),
+            ('TEXTCOLOR', (2, 0), (2, -1), STATUS_COLOR[crit_status]),
             ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
             ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
             ('FONTSIZE', (0, 0), (-1, -1), 11),
@@ -166,11 +263,33 @@ async def generate_inspection_report(results: Dict[str, Any], inspection_id: str
     
     story.append(Spacer(1, cm))
     
-    # Footer
-    footer = Paragraph(arabic_text("تم إنشاء هذا التقرير بواسطة نظام الفحص الذكي - وزارة البلديات والإسكان"), arabic_style)
-    story.append(footer)
-    
-    # Build PDF
-    doc.build(story)
+    # Evidence photos, two per row
+    evidence = _evidence_images(results, image_paths, read_image) if image_paths else []
+    if evidence:
+        story.append(Paragraph(arabic_text("الأدلة المصورة"), title_style))
+        story.append(Spacer(1, 0.5*cm))
+        
+        cells = []
+        for keys, data in evidence:
+            with Image.open(io.BytesIO(data)) as img:  # Header only
+                img_width, img_height = img.size
+            height = EVIDENCE_WIDTH * img_height / img_width
+            caption = " / ".join(EVIDENCE_LABELS.get(key, key) for key in keys)
+            cells.append([
+                RLImage(io.BytesIO(data), width=EVIDENCE_WIDTH, height=height),
+                Paragraph(arabic_text(caption), arabic_style),
+            ])
+        if len(cells) % 2:
+            cells.append("")
+        
+        evidence_table = Table([cells[i:i + 2] for i in range(0, len(cells), 2)],
+                               colWidths=[EVIDENCE_WIDTH + 0.5*cm] * 2)
+        evidence_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('PADDING', (0, 0), (-1, -1), 4),
+        ]))
+        story.append(evidence_table)
+        story.append(Spacer(1, cm))
     
-    return pdf_path
+    return story
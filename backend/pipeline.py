@@ -0,0 +1,276 @@
+"""
+Incremental Inspection Pipeline
+Starts per-image analysis as soon as each image arrives instead of
+waiting for the whole upload to finish
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import accounting
+from accounting import Usage
+from near_duplicates import NearDuplicateIndex, hash_to_hex
+from inspection_image import InspectionImage
+from criteria import Criterion, as_criterion, criteria_order, feature_plan
+from shared_state import SharedState
+
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+# How long criterion results of an unfinished inspection stay in the shared state
+SHARED_RESULT_TTL = int(os.getenv("SHARED_RESULT_TTL", "3600"))
+
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="inspection")
+
+
+def summarize_criteria(criteria: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the inspection result (overall score + status) from criterion results"""
+    results = {
+        "overall_status": "compliant",
+        "overall_score": 0,
+        "criteria": criteria
+    }
+
+    # Calculate overall score
+    total_score = sum([c["score"] for c in criteria])
+    results["overall_score"] = round(total_score / len(criteria), 1)
+
+    # Determine overall status
+    if results["overall_score"] >= 90:
+        results["overall_status"] = "compliant"
+    elif results["overall_score"] >= 70:
+        results["overall_status"] = "needs_improvement"
+    else:
+        results["overall_status"] = "non_compliant"
+
+    return results
+
+
+class IncrementalInspection:
+    """
+    Runs an engine's criteria incrementally while images are still arriving.
+
+    Engines opt in by declaring CRITERIA, a list of criteria.Criterion
+    plugins (legacy (method_name, inputs) tuples are accepted too), and
+    optionally:
+      prefetch(image, features)  fetch an image's features (the union over
+                                 every criterion reading it) the moment the
+                                 image is stored
+      detected_objects(image)    object boxes already fetched for an image,
+                                 stored in the result's "detections"
+      wait_pending(paths)        wait for result fields an engine fills in
+                                 after its criterion returned (streamed
+                                 answers), before the result is summarized;
+                                 False if some never arrived
+      has_pending(paths)         True while such fields are still missing
+                                 (the result is cached only once complete)
+      release_images(paths)      drop per-image caches
+
+    The criteria form a DAG: image -> its features -> every criterion that
+    reads it (-> criteria declaring it in "after"). Each criterion starts as
+    soon as its images are ingested and its dependencies have finished, so
+    independent criteria run in parallel.
+
+    Each stored file becomes one shared InspectionImage (keys that point to
+    the same file share it), so raw bytes and decoded pixels exist once.
+
+    Engines without CRITERIA fall back to analyze_inspection() once all
+    images are present.
+
+    With a NearDuplicateIndex, every image is pHashed at ingest. Criteria
+    whose inputs are all near-identical to an earlier inspection reuse its
+    result (marked with "reused_analysis") instead of calling the engine,
+    and near-duplicate images are listed in the result's "near_duplicates".
+
+    With a SharedState, finished criterion results are stored per inspection
+    so another worker process finalizing the same upload reuses them.
+    Results with fields still pending are stored in neither cache until
+    wait_pending() has filled them in.
+
+    External calls the engine makes for the inspection's images (see
+    accounting.py) are totalled in the result's "usage".
+    """
+
+    def __init__(self, engine, executor: Optional[ThreadPoolExecutor] = None,
+                 inspection_id: Optional[str] = None,
+                 duplicates: Optional[NearDuplicateIndex] = None,
+                 shared: Optional[SharedState] = None):
+        self.engine = engine
+        self.executor = executor or _executor
+        self.inspection_id = inspection_id
+        self.duplicates = duplicates
+        self.shared = shared if inspection_id else None
+        self.created_at = time.time()
+        self.image_paths: Dict[str, str] = {}
+        self.images: Dict[str, InspectionImage] = {}
+        self.image_hashes: Dict[str, int] = {}
+        self.near_duplicates: Dict[str, Dict[str, Any]] = {}
+        self.usage = Usage(inspection_id, self.shared)
+        self._specs = [as_criterion(spec) for spec in getattr(engine, "CRITERIA", [])]
+        self._order = criteria_order(self._specs)
+        self._features = feature_plan(self._specs)
+        self._index_by_id = {c.criterion_id: index for index, c in enumerate(self._specs)}
+        self._has_dependents = {self._index_by_id[d] for c in self._specs for d in c.after}
+        self._ingest = {}
+        self._criteria = {}
+        self._unstored = []
+        self._lock = threading.RLock()
+
+    def add_image(self, key: str, path: str):
+        """Register an uploaded image and start whatever work it unblocks"""
+        with self._lock:
+            if key in self.image_paths:
+                return
+            self.image_paths[key] = path
+            accounting.track(path, self.usage)
+            shared = next((image for image in self.images.values() if image.path == path), None)
+            self.images[key] = shared or InspectionImage(path)
+            future = self.executor.submit(self._ingest_image, key, self.images[key])
+            self._ingest[key] = future
+            future.add_done_callback(lambda _: self._schedule())
+
+    def _ingest_image(self, key: str, image: InspectionImage):
+        # Per-image work: perceptual hash, then the image's features unless
+        # the photo was seen before (its criteria may then be reused)
+        if self.duplicates is not None:
+            try:
+                image_hash = image.phash
+            except Exception as e:
+                print(f"[WARNING] Could not hash {image.path}: {e}")
+            else:
+                self.image_hashes[key] = image_hash
+                match = self.duplicates.find_image(image_hash, self.inspection_id)
+                if self.inspection_id:
+                    self.duplicates.add_image(image_hash, self.inspection_id, key)
+                if match:
+                    self.near_duplicates[key] = match
+                    return
+
+        if key in self._features and hasattr(self.engine, "prefetch"):
+            self.engine.prefetch(image, self._features[key])
+
+    def _schedule(self):
+        # Submit every criterion whose images are ingested and whose dependencies finished
+        with self._lock:
+            for index in self._order:
+                if index in self._criteria:
+                    continue
+                criterion = self._specs[index]
+                if not all(key in self._ingest and self._ingest[key].done() for key in criterion.keys):
+                    continue
+                dependencies = [self._criteria.get(self._index_by_id[d]) for d in criterion.after]
+                if not all(future is not None and future.done() for future in dependencies):
+                    continue
+                future = self.executor.submit(self._run_criterion, criterion, dependencies)
+                self._criteria[index] = future
+                if index in self._has_dependents:
+                    future.add_done_callback(lambda _: self._schedule())
+
+    def _run_criterion(self, criterion: Criterion, dependencies: List) -> Dict[str, Any]:
+        method = criterion.method
+        if self.shared is not None:
+            stored = self.shared.cache_get("criteria", f"{self.inspection_id}:{method}")
+            if stored is not None:
+                self.usage.add(cache_hits_criteria=1)
+                return stored
+
+        hashes = [self.image_hashes.get(key) for key in criterion.keys]
+        can_reuse = self.duplicates is not None and None not in hashes and not criterion.after
+        if can_reuse:
+            reused = self.duplicates.find_criterion(method, hashes, self.inspection_id)
+            if reused is not None:
+                print(f"[OK] Reusing {method} result from {reused['reused_analysis']['inspection_id']}")
+                self.usage.add(cache_hits_duplicates=1)
+                return reused
+
+        if isinstance(criterion.inputs, str):
+            args = self.images[criterion.inputs]
+        else:
+            args = {location: self.images[key] for location, key in criterion.inputs.items()}
+        dependency_results = {c: f.result() for c, f in zip(criterion.after, dependencies)}
+        result = criterion.run(self.engine, args, dependency_results)
+
+        paths = [self.images[key].path for key in criterion.keys]
+        if hasattr(self.engine, "has_pending") and self.engine.has_pending(paths):
+            with self._lock:
+                self._unstored.append((method, hashes, can_reuse, result))
+            return result
+        if can_reuse and self.inspection_id:
+            self.duplicates.add_criterion(method, hashes, result, self.inspection_id)
+        if self.shared is not None:
+            self.shared.cache_set("criteria", f"{self.inspection_id}:{method}", result, ttl=SHARED_RESULT_TTL)
+        return result
+
+    def completed_criteria(self) -> List[Dict[str, Any]]:
+        """Criterion results finalized so far (for progress reporting)"""
+        with self._lock:
+            futures = [self._criteria[i] for i in sorted(self._criteria)]
+        return [f.result() for f in futures if f.done() and f.exception() is None]
+
+    def results(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait for every criterion and compute the overall result"""
+        try:
+            with self._lock:
+                missing = [key for criterion in self._specs
+                           for key in criterion.keys if key not in self.image_paths]
+                if missing:
+                    raise KeyError(f"Missing images: {', '.join(sorted(set(missing)))}")
+                ingests = list(self._ingest.values())
+
+            # Criteria are scheduled once their images are ingested (errors are left to the criterion)
+            for future in ingests:
+                future.exception(timeout=timeout)
+
+            if self._specs:
+                # Dependency order: each criterion's dependencies are finished before it is awaited
+                for index in self._order:
+                    with self._lock:
+                        self._schedule()
+                        future = self._criteria[index]
+                    future.exception(timeout=timeout)
+                complete = True
+                if hasattr(self.engine, "wait_pending"):
+                    complete = self.engine.wait_pending(list(self.image_paths.values())) is not False
+                if complete and self.inspection_id:
+                    # Results held back while fields were streaming (the shared entries end here anyway)
+                    for method, hashes, can_reuse, result in self._unstored:
+                        if can_reuse:
+                            self.duplicates.add_criterion(method, hashes, result, self.inspection_id)
+                results = summarize_criteria([self._criteria[i].result() for i in range(len(self._specs))])
+                if self.shared is not None:
+                    self.shared.cache_delete("criteria", [f"{self.inspection_id}:{c.method}" for c in self._specs])
+            else:
+                results = self.engine.analyze_inspection(dict(self.image_paths))
+
+            if hasattr(self.engine, "detected_objects"):
+                detections = {key: self.engine.detected_objects(image) for key, image in self.images.items()}
+                results["detections"] = {key: boxes for key, boxes in detections.items() if boxes is not None}
+            if self.duplicates is not None:
+                results["image_hashes"] = {key: hash_to_hex(value) for key, value in self.image_hashes.items()}
+                results["near_duplicates"] = [
+                    dict(match, key=key) for key, match in sorted(self.near_duplicates.items())
+                ]
+            results["usage"] = self.usage.finish()
+            return results
+        finally:
+            self.close()
+
+    def close(self):
+        """Release per-image engine caches and image buffers held for this inspection"""
+        # Spend of a failed or abandoned inspection still reaches the daily totals
+        # (a no-op after results() finished it)
+        self.usage.finish(completed=False)
+        if hasattr(self.engine, "release_images"):
+            self.engine.release_images(list(self.image_paths.values()))
+        accounting.untrack(self.image_paths.values(), self.usage)
+        for image in self.images.values():
+            image.release()
+
+
+def run_inspection(engine, image_paths: Dict[str, str]) -> Dict[str, Any]:
+    """Analyze a complete set of images through the incremental pipeline"""
+    inspection = IncrementalInspection(engine)
+    for key, path in image_paths.items():
+        inspection.add_image(key, path)
+    return inspection.results()
@@ -0,0 +1,370 @@
+"""
+Upload and Report Retention
+Background compaction of old inspections: original photos are transcoded
+to small thumbnails, whole inspections are bundled into one ZIP archive per
+day, and archives and report packs are deleted once past their TTL
+"""
+import os
+import shutil
+import zipfile
+import mimetypes
+from datetime import datetime, timedelta
+from PIL import Image, features
+from typing import Callable, Dict, Any, Iterator, List, Optional
+
+from serialization import dumps, loads, write_file
+
+
+# Policies (days since the inspection; 0 disables the step)
+RETENTION_THUMBNAIL_DAYS = int(os.getenv("RETENTION_THUMBNAIL_DAYS", "7"))
+RETENTION_ARCHIVE_DAYS = int(os.getenv("RETENTION_ARCHIVE_DAYS", "30"))
+RETENTION_DELETE_DAYS = int(os.getenv("RETENTION_DELETE_DAYS", "365"))
+# Upload sessions never completed are removed after this many hours
+RETENTION_ABANDONED_HOURS = int(os.getenv("RETENTION_ABANDONED_HOURS", "24"))
+# Report packs (batch PDFs / per-inspection folders) are removed after this many days
+RETENTION_BATCH_DAYS = int(os.getenv("RETENTION_BATCH_DAYS", "7"))
+RETENTION_THUMBNAIL_SIZE = int(os.getenv("RETENTION_THUMBNAIL_SIZE", "800"))
+RETENTION_THUMBNAIL_QUALITY = int(os.getenv("RETENTION_THUMBNAIL_QUALITY", "70"))
+# Seconds between compaction runs
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives")
+
+# Cache lifetime of results no retention step will rewrite
+STABLE_FOREVER = 365 * 24 * 3600
+
+# WebP thumbnails where Pillow was built with WebP support
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMBNAIL_SUFFIX = ".webp" if THUMBNAIL_FORMAT == "WEBP" else ".thumb.jpg"
+ORIGINAL_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+# Already compressed: stored as-is in the archives
+_STORED_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def _id_time(inspection_id: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(inspection_id[4:19], "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+
+
+def inspection_time(inspection_id: str, path: str) -> datetime:
+    """Creation time from an INS_YYYYMMDD_HHMMSS ID, else the directory's mtime"""
+    return _id_time(inspection_id) or datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            return loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+class RetentionManager:
+    """
+    Applies the retention policies to the upload, report and archive directories.
+
+    Only finished inspections (with results.json) are thumbnailed or archived.
+    Archived inspections stay readable through read_archived(); their image
+    and report URLs are rewritten to /api/archive/{inspection_id}/{name}.
+    on_delete, if given, is called with the IDs of inspections deleted for good.
+    Report packs in batch_dir are regenerated on demand, so they only live
+    RETENTION_BATCH_DAYS.
+    """
+
+    def __init__(self, upload_dir: str, reports_dir: str, archive_dir: str = ARCHIVE_DIR,
+                 on_delete: Optional[Callable[[List[str]], None]] = None,
+                 batch_dir: Optional[str] = None):
+        self.upload_dir = upload_dir
+        self.reports_dir = reports_dir
+        self.archive_dir = archive_dir
+        self.on_delete = on_delete
+        self.batch_dir = batch_dir
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """One compaction pass; returns how many inspections each step touched"""
+        now = now or datetime.now()
+        stats = {"thumbnailed": 0, "archived": 0, "deleted": 0, "abandoned": 0, "batches": 0}
+        to_archive: Dict[str, List[str]] = {}
+        deleted: List[str] = []
+
+        for inspection_id in sorted(os.listdir(self.upload_dir)) if os.path.isdir(self.upload_dir) else []:
+            path = os.path.join(self.upload_dir, inspection_id)
+            if not os.path.isdir(path):
+                continue
+            age = now - inspection_time(inspection_id, path)
+            finished = os.path.exists(os.path.join(path, "results.json"))
+
+            try:
+                if not finished:
+                    if RETENTION_ABANDONED_HOURS and age > timedelta(hours=RETENTION_ABANDONED_HOURS) \
+                            and self._is_abandoned(path):
+                        shutil.rmtree(path)
+                        stats["abandoned"] += 1
+                elif RETENTION_DELETE_DAYS and age > timedelta(days=RETENTION_DELETE_DAYS):
+                    self._delete_inspection(inspection_id)
+                    deleted.append(inspection_id)
+                    stats["deleted"] += 1
+                elif RETENTION_ARCHIVE_DAYS and age > timedelta(days=RETENTION_ARCHIVE_DAYS):
+                    day = inspection_time(inspection_id, path).strftime("%Y-%m-%d")
+                    to_archive.setdefault(day, []).append(inspection_id)
+                elif RETENTION_THUMBNAIL_DAYS and age > timedelta(days=RETENTION_THUMBNAIL_DAYS):
+                    stats["thumbnailed"] += self._thumbnail_inspection(inspection_id)
+            except OSError as e:
+                print(f"[WARNING] Retention failed for {inspection_id}: {e}")
+
+        for day, inspection_ids in sorted(to_archive.items()):
+            try:
+                stats["archived"] += self._archive_day(day, inspection_ids)
+            except (OSError, zipfile.BadZipFile) as e:
+                print(f"[WARNING] Could not archive {day}: {e}")
+
+        if RETENTION_DELETE_DAYS and os.path.isdir(self.archive_dir):
+            cutoff = (now - timedelta(days=RETENTION_DELETE_DAYS)).strftime("%Y-%m-%d")
+            for name in sorted(os.listdir(self.archive_dir)):
+                if name.endswith(".zip") and name[:-4] < cutoff:
+                    deleted.extend(self._archived_ids(name[:-4]))
+                    os.remove(os.path.join(self.archive_dir, name))
+                    stats["deleted"] += 1
+
+        if RETENTION_BATCH_DAYS and self.batch_dir and os.path.isdir(self.batch_dir):
+            cutoff = (now - timedelta(days=RETENTION_BATCH_DAYS)).timestamp()
+            for name in sorted(os.listdir(self.batch_dir)):
+                path = os.path.join(self.batch_dir, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        if os.path.isdir(path):
+                            shutil.rmtree(path)
+                        else:
+                            os.remove(path)
+                        stats["batches"] += 1
+                except OSError as e:
+                    print(f"[WARNING] Could not remove report pack {name}: {e}")
+
+        if deleted and self.on_delete is not None:
+            self.on_delete(deleted)
+        return stats
+
+    # Steps
+
+    @staticmethod
+    def _is_abandoned(path: str) -> bool:
+        # Upload sessions still uploading (or failed); never touch an analysis in progress
+        session = _read_json(os.path.join(path, "session.json"))
+        return session is None or session.get("status") in ("uploading", "failed")
+
+    def _report_path(self, results: Dict[str, Any]) -> Optional[str]:
+        pdf_report = results.get("pdf_report")
+        if not pdf_report or not pdf_report.startswith("/reports/"):
+            return None
+        return os.path.join(self.reports_dir, os.path.basename(pdf_report))
+
+    def _delete_inspection(self, inspection_id: str):
+        path = os.path.join(self.upload_dir, inspection_id)
+        report_path = self._report_path(_read_json(os.path.join(path, "results.json")) or {})
+        shutil.rmtree(path)
+        if report_path and os.path.exists(report_path):
+            os.remove(report_path)
+
+    def _thumbnail_inspection(self, inspection_id: str) -> int:
+        """Replace the original photos by thumbnails; returns 1 if anything changed"""
+        path = os.path.join(self.upload_dir, inspection_id)
+        results_path = os.path.join(path, "results.json")
+        results = _read_json(results_path)
+        if results is None or "thumbnails" in results.get("retention", {}):
+            return 0
+
+        converted = {}
+        for root, _, files in os.walk(path):
+            for name in files:
+                if not name.lower().endswith(ORIGINAL_SUFFIXES):
+                    continue
+                original = os.path.join(root, name)
+                thumbnail = os.path.splitext(original)[0] + THUMBNAIL_SUFFIX
+                with Image.open(original) as img:
+                    img.draft("RGB", (RETENTION_THUMBNAIL_SIZE, RETENTION_THUMBNAIL_SIZE))
+                    small = img.convert("RGB")
+                small.thumbnail((RETENTION_THUMBNAIL_SIZE, RETENTION_THUMBNAIL_SIZE))
+                small.save(f"{thumbnail}.tmp", THUMBNAIL_FORMAT, quality=RETENTION_THUMBNAIL_QUALITY)
+                os.replace(f"{thumbnail}.tmp", thumbnail)
+                os.remove(original)
+                converted["/" + original.replace(os.sep, "/")] = "/" + thumbnail.replace(os.sep, "/")
+
+        results["images"] = {key: converted.get(url, url) for key, url in results.get("images", {}).items()}
+        results["retention"] = {"thumbnails": THUMBNAIL_FORMAT.lower(), "compacted_at": datetime.now().isoformat()}
+        write_file(results_path, results)
+        return 1
+
+    def _archive_path(self, day: str) -> str:
+        return os.path.join(self.archive_dir, f"{day}.zip")
+
+    def _archive_day(self, day: str, inspection_ids: List[str]) -> int:
+        """
+        Add inspections to the day's archive. The archive is rewritten to a
+        temporary file and swapped in, so readers never see a partial ZIP.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archive_path = self._archive_path(day)
+        tmp_path = f"{archive_path}.tmp"
+        prefixes = tuple(f"{inspection_id}/" for inspection_id in inspection_ids)
+        reports, archived = [], []
+
+        with zipfile.ZipFile(tmp_path, "w") as bundle:
+            if os.path.exists(archive_path):
+                with zipfile.ZipFile(archive_path) as existing:
+                    for info in existing.infolist():
+                        if not info.filename.startswith(prefixes):
+                            bundle.writestr(info, existing.read(info))
+
+            for inspection_id in inspection_ids:
+                path = os.path.join(self.upload_dir, inspection_id)
+                results = _read_json(os.path.join(path, "results.json"))
+                if results is None:
+                    print(f"[WARNING] Not archiving {inspection_id}: unreadable results.json")
+                    continue
+                base_url = f"/api/archive/{inspection_id}/"
+
+                report_path = self._report_path(results)
+                if report_path and os.path.exists(report_path):
+                    name = os.path.basename(report_path)
+                    bundle.write(report_path, inspection_id + "/" + name, compress_type=zipfile.ZIP_DEFLATED)
+                    results["pdf_report"] = base_url + name
+                    reports.append(report_path)
+
+                upload_url = "/" + path.replace(os.sep, "/") + "/"
+                results["images"] = {
+                    key: base_url + url[len(upload_url):] if url.startswith(upload_url) else url
+                    for key, url in results.get("images", {}).items()
+                }
+                results.setdefault("retention", {})["archived_at"] = datetime.now().isoformat()
+                archived.append(inspection_id)
+
+                for root, _, files in os.walk(path):
+                    for name in files:
+                        file_path = os.path.join(root, name)
+                        member = inspection_id + "/" + os.path.relpath(file_path, path).replace(os.sep, "/")
+                        if name == "results.json":
+                            bundle.writestr(member, dumps(results),
+                                            compress_type=zipfile.ZIP_DEFLATED)
+                        else:
+                            stored = name.lower().endswith(_STORED_SUFFIXES)
+                            bundle.write(file_path, member,
+                                         compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+
+        os.replace(tmp_path, archive_path)
+        for inspection_id in archived:
+            shutil.rmtree(os.path.join(self.upload_dir, inspection_id))
+        for report_path in reports:
+            os.remove(report_path)
+        return len(archived)
+
+    # Reading
+
+    def stable_seconds(self, inspection_id: str, results: Dict[str, Any], now: Optional[datetime] = None) -> int:
+        """
+        How long stored results are certain not to change: until the next
+        retention step that rewrites them (0 if a step is already due)
+        """
+        created = _id_time(inspection_id)
+        if created is None:
+            return 0
+        now = now or datetime.now()
+        retention = results.get("retention", {})
+        applied = 2 if "archived_at" in retention else 1 if "thumbnails" in retention else 0
+        steps = (RETENTION_THUMBNAIL_DAYS, RETENTION_ARCHIVE_DAYS, RETENTION_DELETE_DAYS)
+        for index, days in enumerate(steps):
+            if not days or index < applied:
+                continue
+            due = created + timedelta(days=days)
+            return max(0, int((due - now).total_seconds()))
+        return STABLE_FOREVER
+
+    def read_archived(self, inspection_id: str, name: str) -> Optional[bytes]:
+        """A file of an archived inspection, None if it is not archived"""
+        if os.path.basename(inspection_id) != inspection_id or ".." in name.split("/"):
+            return None
+        created = _id_time(inspection_id)
+        if created is not None:
+            archives = [self._archive_path(created.strftime("%Y-%m-%d"))]
+        elif os.path.isdir(self.archive_dir):
+            # IDs without a date (not created by this app): search every archive
+            archives = [os.path.join(self.archive_dir, name) for name in sorted(os.listdir(self.archive_dir))
+                        if name.endswith(".zip")]
+        else:
+            archives = []
+        for archive_path in archives:
+            try:
+                with zipfile.ZipFile(archive_path) as bundle:
+                    return bundle.read(f"{inspection_id}/{name}")
+            except (OSError, KeyError, zipfile.BadZipFile):
+                continue
+        return None
+
+    def read_archived_results(self, inspection_id: str) -> Optional[Dict[str, Any]]:
+        data = self.read_archived(inspection_id, "results.json")
+        return loads(data) if data is not None else None
+
+    def read_results(self, inspection_id: str) -> Optional[bytes]:
+        """Stored results JSON of an inspection (not re-encoded), from its directory or its archive"""
+        if os.path.basename(inspection_id) == inspection_id:
+            try:
+                with open(os.path.join(self.upload_dir, inspection_id, "results.json"), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+        return self.read_archived(inspection_id, "results.json")
+
+    def read_image(self, inspection_id: str, url: str) -> Optional[bytes]:
+        """Bytes of an image referenced by a results "images" URL (uploads or archive)"""
+        archive_prefix = f"/api/archive/{inspection_id}/"
+        if url.startswith(archive_prefix):
+            return self.read_archived(inspection_id, url[len(archive_prefix):])
+        upload_url = "/" + self.upload_dir.replace(os.sep, "/") + "/"
+        if url.startswith(upload_url):
+            upload_root = os.path.realpath(self.upload_dir)
+            path = os.path.realpath(os.path.join(self.upload_dir, url[len(upload_url):]))
+            if path.startswith(upload_root + os.sep) and os.path.isfile(path):
+                with open(path, "rb") as f:
+                    return f.read()
+        return None
+
+    def inspection_ids(self, day: str) -> List[str]:
+        """Finished inspections created on a day (YYYY-MM-DD), stored or archived"""
+        ids = set()
+        if os.path.isdir(self.upload_dir):
+            for inspection_id in os.listdir(self.upload_dir):
+                created = _id_time(inspection_id)
+                if (created and created.strftime("%Y-%m-%d") == day
+                        and os.path.exists(os.path.join(self.upload_dir, inspection_id, "results.json"))):
+                    ids.add(inspection_id)
+        ids.update(self._archived_ids(day))
+        return sorted(ids)
+
+    def archived_results(self) -> Iterator[Dict[str, Any]]:
+        """Stored results of every archived inspection (oldest archive first)"""
+        if not os.path.isdir(self.archive_dir):
+            return
+        for name in sorted(os.listdir(self.archive_dir)):
+            if not name.endswith(".zip"):
+                continue
+            try:
+                with zipfile.ZipFile(os.path.join(self.archive_dir, name)) as bundle:
+                    members = [member for member in bundle.namelist() if member.endswith("/results.json")]
+                    for member in members:
+                        results = loads(bundle.read(member))
+                        if isinstance(results, dict):
+                            yield results
+            except (OSError, ValueError, zipfile.BadZipFile) as e:
+                print(f"[WARNING] Could not read archive {name}: {e}")
+
+    def _archived_ids(self, day: str) -> List[str]:
+        try:
+            with zipfile.ZipFile(self._archive_path(day)) as bundle:
+                return [name.split("/")[0] for name in bundle.namelist() if name.endswith("/results.json")]
+        except (OSError, zipfile.BadZipFile):
+            return []
+
+
+def media_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
@@ -0,0 +1,152 @@
+"""
+Analysis Scheduler
+Admission control and ordering for inspection analyses in this worker
+process:
+- a fixed number of analyses run at once (SCHEDULER_CONCURRENCY)
+- "interactive" requests (an inspector waiting on site) always go before
+  "batch" ones, and batch work may only use SCHEDULER_BATCH_SLOTS of the
+  slots, so the rest stays free for interactive arrivals
+- within a class, organizations (commercial registers) share the slots by
+  weighted fair queuing, so one organization's backlog does not delay
+  everyone else's
+- queues are bounded; beyond that, requests are refused at once with a
+  Retry-After estimate instead of waiting minutes
+"""
+import os
+import math
+import time
+import json
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+
+PRIORITIES = ("interactive", "batch")
+
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "4"))
+SCHEDULER_BATCH_SLOTS = int(os.getenv("SCHEDULER_BATCH_SLOTS", str(max(1, SCHEDULER_CONCURRENCY // 2))))
+# Waiting analyses per class beyond which new requests are refused
+SCHEDULER_MAX_QUEUE = {
+    "interactive": int(os.getenv("SCHEDULER_MAX_QUEUE", "16")),
+    "batch": int(os.getenv("SCHEDULER_MAX_BATCH_QUEUE", "64")),
+}
+# Fair-share weights by commercial register, e.g. {"1010123456": 2}; others weigh 1
+SCHEDULER_WEIGHTS: Dict[str, float] = json.loads(os.getenv("SCHEDULER_WEIGHTS", "{}"))
+
+
+class Overloaded(Exception):
+    """Queue full: the request should be retried after retry_after seconds"""
+
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"Too many {priority} analyses queued")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class Scheduler:
+    """
+    Weighted fair queuing (start-time virtual clock) per priority class.
+
+    Each organization's next analysis is tagged with a virtual finish time
+    max(class clock, its previous tag) + 1 / weight; the lowest tag runs
+    first. An organization with many queued analyses therefore takes turns
+    with the others instead of running all of them first. Once its last
+    queued analysis is dispatched, its tag is behind the clock and dropped.
+    """
+
+    def __init__(self, concurrency: int = SCHEDULER_CONCURRENCY, batch_slots: int = SCHEDULER_BATCH_SLOTS,
+                 max_queue: Optional[Dict[str, int]] = None, weights: Optional[Dict[str, float]] = None):
+        self.concurrency = concurrency
+        self.batch_slots = min(batch_slots, concurrency)
+        self.max_queue = max_queue or SCHEDULER_MAX_QUEUE
+        self.weights = SCHEDULER_WEIGHTS if weights is None else weights
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self._queues: Dict[str, List] = {priority: [] for priority in PRIORITIES}
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+        self._clock = {priority: 0.0 for priority in PRIORITIES}
+        self._finish: Dict[tuple, float] = {}
+        self._order = itertools.count()
+        # Smoothed time an analysis holds its slot, for Retry-After estimates
+        self._service_time = 10.0
+        self.counts = {"admitted": 0, "shed": 0}
+        self.wait_ms = {priority: 0.0 for priority in PRIORITIES}
+
+    def retry_after(self, priority: str) -> int:
+        """Seconds until the queue ahead of a new request has likely drained"""
+        ahead = self._waiting["interactive"] + (self._waiting["batch"] if priority == "batch" else 0)
+        slots = self.concurrency if priority == "interactive" else self.batch_slots
+        return max(1, math.ceil((ahead + 1) / slots * self._service_time))
+
+    def admit(self, priority: str):
+        """Refuse at once (Overloaded) when the class queue is full"""
+        if self._waiting[priority] >= self.max_queue[priority]:
+            self.counts["shed"] += 1
+            raise Overloaded(priority, self.retry_after(priority))
+        self.counts["admitted"] += 1
+
+    def _can_run(self, priority: str) -> bool:
+        if sum(self.running.values()) >= self.concurrency:
+            return False
+        return priority == "interactive" or self.running["batch"] < self.batch_slots
+
+    def _dispatch(self):
+        # Interactive first; batch only within its slots
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._can_run(priority):
+                tag, _, key, future = heapq.heappop(queue)
+                if self._finish.get(key) == tag:  # Organization's last queued analysis
+                    del self._finish[key]
+                if future.done():  # Caller gave up while waiting
+                    continue
+                self._clock[priority] = tag
+                self.running[priority] += 1
+                self._waiting[priority] -= 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: str, tenant: str):
+        """Wait for this analysis' turn and hold a slot while it runs (admit() first)"""
+        enqueued = time.monotonic()
+        if not any(self._waiting.values()) and self._can_run(priority):
+            self.running[priority] += 1
+        else:
+            key = (priority, tenant)
+            tag = max(self._clock[priority], self._finish.get(key, 0.0)) + 1.0 / self.weights.get(tenant, 1.0)
+            self._finish[key] = tag
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queues[priority], (tag, next(self._order), key, future))
+            self._waiting[priority] += 1
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Turn came just as the caller was cancelled: hand the slot on
+                    self.running[priority] -= 1
+                    self._dispatch()
+                else:
+                    self._waiting[priority] -= 1
+                raise
+        self.wait_ms[priority] = 0.8 * self.wait_ms[priority] + 0.2 * (time.monotonic() - enqueued) * 1000
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self.running[priority] -= 1
+            self._dispatch()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "batch_slots": self.batch_slots,
+            "running": dict(self.running),
+            "queued": dict(self._waiting),
+            "wait_ms": {priority: round(value, 1) for priority, value in self.wait_ms.items()},
+            "service_time_s": round(self._service_time, 2),
+            **self.counts,
+        }
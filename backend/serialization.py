@@ -0,0 +1,53 @@
+"""
+JSON Serialization
+Compact UTF-8 JSON bytes via orjson when installed (several times faster),
+else the standard library
+"""
+import os
+import json
+from typing import Any, Union
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up
+    orjson = None
+
+
+def dumps(data: Any) -> bytes:
+    """Compact JSON (no indentation, non-ASCII kept as UTF-8)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_file(path: str) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def write_file(path: str, data: Any) -> bytes:
+    """Write JSON atomically (readers in other workers never see a partial file); returns the bytes"""
+    body = dumps(data)
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(body)
+    os.replace(f"{path}.tmp", path)
+    return body
+
+
+class JSONBytesResponse(Response):
+    """JSON response rendered with dumps(); pass bytes to send already encoded JSON as-is"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
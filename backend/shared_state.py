@@ -0,0 +1,211 @@
+"""
+Shared State
+SQLite (WAL) store shared by every worker process on the box: a result
+cache, leased job claims, an append-only event log and a cross-process lock
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "state.db")
+# Seconds a claimed job may run before another worker may take it over
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+# Events older than this are pruned (workers sync them within seconds)
+EVENT_RETENTION_SECONDS = int(os.getenv("EVENT_RETENTION_SECONDS", "86400"))
+# Finished job claims older than this are pruned (batch status reads them back)
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 86400)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    worker TEXT NOT NULL,
+    status TEXT NOT NULL,
+    lease_until REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS events_topic ON events (topic, id);
+"""
+
+
+class SharedState:
+    """
+    One SQLite database opened by every worker.
+
+    WAL mode lets readers run alongside a writer; writers queue on the
+    database lock (busy timeout) instead of failing. Each thread gets its
+    own connection.
+    """
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        self.path = path
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            # Databases created before events had a timestamp
+            if "created_at" not in [row[1] for row in db.execute("PRAGMA table_info(events)")]:
+                try:
+                    db.execute("ALTER TABLE events ADD COLUMN created_at REAL")
+                except sqlite3.OperationalError:
+                    pass  # Another worker added it first
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA busy_timeout=30000")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def lock(self):
+        """
+        Cross-process critical section (a write transaction on the database).
+        Keep it short: every other writer waits for it.
+        """
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        else:
+            db.execute("COMMIT")
+
+    # Cache
+
+    def cache_get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def cache_set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), expires_at),
+        )
+
+    def cache_delete(self, namespace: str, keys: List[str]):
+        self._connect().executemany(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", [(namespace, key) for key in keys]
+        )
+
+    def counters_add(self, namespace: str, key: str, deltas: Dict[str, float],
+                     ttl: Optional[float] = None) -> Dict[str, float]:
+        """Add to numeric fields of a cache entry (created if missing) atomically; returns the new totals"""
+        with self.lock():
+            totals = self.cache_get(namespace, key) or {}
+            for name, value in deltas.items():
+                totals[name] = totals.get(name, 0) + value
+            self.cache_set(namespace, key, totals, ttl=ttl)
+        return totals
+
+    def cache_purge(self) -> int:
+        """Delete expired cache entries; returns how many"""
+        return self._connect().execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+        ).rowcount
+
+    # Jobs
+
+    def claim_job(self, job_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+        """
+        Claim a job for this worker. Succeeds once per job, or again after
+        the holder's lease expired without the job finishing.
+        """
+        now = time.time()
+        with self.lock() as db:
+            row = db.execute("SELECT status, lease_until FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is not None and (row[0] != "running" or row[1] > now):
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, worker, status, lease_until, updated_at) "
+                "VALUES (?, ?, 'running', ?, ?)",
+                (job_id, self.worker_id, now + lease_seconds, now),
+            )
+            return True
+
+    def renew_job(self, job_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+        """Extend this worker's lease on a running job; False if it lost the job"""
+        now = time.time()
+        return self._connect().execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE job_id = ? AND worker = ? AND status = 'running'",
+            (now + lease_seconds, now, job_id, self.worker_id),
+        ).rowcount == 1
+
+    def finish_job(self, job_id: str, status: str = "done"):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ? AND worker = ?",
+            (status, time.time(), job_id, self.worker_id),
+        )
+
+    def expired_jobs(self) -> List[str]:
+        """Running jobs whose lease ran out (their worker most likely died)"""
+        rows = self._connect().execute(
+            "SELECT job_id FROM jobs WHERE status = 'running' AND lease_until < ?", (time.time(),)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT worker, status, lease_until FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"worker": row[0], "status": row[1], "expired": row[1] == "running" and row[2] < time.time()}
+
+    def prune_jobs(self, max_age: float = JOB_RETENTION_SECONDS) -> int:
+        """Delete finished job claims not updated for max_age seconds; returns how many"""
+        return self._connect().execute(
+            "DELETE FROM jobs WHERE status != 'running' AND updated_at < ?", (time.time() - max_age,)
+        ).rowcount
+
+    # Events
+
+    def publish(self, topic: str, payload: Any) -> int:
+        return self._connect().execute(
+            "INSERT INTO events (topic, payload, created_at) VALUES (?, ?, ?)",
+            (topic, json.dumps(payload, ensure_ascii=False), time.time()),
+        ).lastrowid
+
+    def prune_events(self, max_age: float = EVENT_RETENTION_SECONDS) -> int:
+        """Delete events older than max_age seconds; returns how many"""
+        return self._connect().execute(
+            "DELETE FROM events WHERE created_at IS NULL OR created_at < ?", (time.time() - max_age,)
+        ).rowcount
+
+    def latest_event(self, topic: str) -> int:
+        row = self._connect().execute("SELECT MAX(id) FROM events WHERE topic = ?", (topic,)).fetchone()
+        return row[0] or 0
+
+    def events_since(self, topic: str, after_id: int) -> List[Tuple[int, Any]]:
+        rows = self._connect().execute(
+            "SELECT id, payload FROM events WHERE topic = ? AND id > ? ORDER BY id", (topic, after_id)
+        ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
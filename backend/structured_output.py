@@ -0,0 +1,173 @@
+"""
+Structured Model Output
+Tolerant extraction of the JSON object a model was asked to answer with:
+the first complete object in the text (code fences, prose before or after
+are skipped), repaired when the answer was cut off, then coerced to the
+expected schema (OpenAPI subset, as sent in response_schema)
+"""
+import json
+from typing import Dict, Any, List, Optional
+
+
+class JSONObjectStream:
+    """
+    Incremental scanner for the first valid JSON object in streamed text.
+
+    feed() only scans the new characters, so the object is available as soon
+    as its closing brace arrives, however the text is chunked.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.result: Optional[Dict[str, Any]] = None
+        self._pos = 0
+        self._start = -1
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """Add text; returns the first complete object once it has been seen"""
+        if self.result is not None:
+            return self.result
+        self.text += chunk
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._start < 0:
+                if ch == "{":
+                    self._start, self._stack, self._in_string, self._escape = i, ["}"], False, False
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append("}" if ch == "{" else "]")
+            elif ch in "}]":
+                if ch != self._stack.pop() or not self._stack:
+                    candidate = _loads_object(text[self._start:i + 1]) if ch == "}" else None
+                    if candidate is not None:
+                        self.result = candidate
+                        self._pos = i + 1
+                        return candidate
+                    # Not JSON after all (a brace in prose): rescan after that opening brace
+                    i, self._start = self._start, -1
+            i += 1
+        self._pos = i
+        return None
+
+    def partial(self) -> Optional[Dict[str, Any]]:
+        """Members of the object completed so far (the one still arriving is left out)"""
+        if self.result is not None or self._start < 0:
+            return self.result
+        return self._repair(keep_tail=False)
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """End of text: the complete object, else the longest parseable prefix of a cut-off one"""
+        if self.result is None and self._start >= 0:
+            self.result = self._repair(keep_tail=True)
+        return self.result
+
+    def _repair(self, keep_tail: bool) -> Optional[Dict[str, Any]]:
+        partial = self.text[self._start:]
+        cuts = [i for i in range(len(partial) - 1, 0, -1) if partial[i] == ","][:8]
+        # A cut-off string is kept (truncated text); a cut-off number would be wrong, so it is dropped
+        if keep_tail and (self._in_string or partial.rstrip()[-1:] not in "0123456789.-+eE"):
+            cuts.insert(0, len(partial))
+        for cut in cuts:
+            candidate = _loads_object(_close_open(partial[:cut]))
+            if candidate is not None:
+                return candidate
+        return None
+
+
+def _loads_object(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _close_open(text: str) -> str:
+    """Terminate an open string and close every open bracket of a JSON prefix"""
+    stack, in_string, escape = [], False, False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    text = text + '"' if in_string else text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+_TRUE = ("true", "yes", "1", "نعم")
+_FALSE = ("false", "no", "0", "لا")
+
+
+def coerce(value: Any, schema: Dict[str, Any]) -> Any:
+    """Value converted to the schema type where the meaning is clear (e.g. "85%" -> 85.0); None if not"""
+    kind = schema.get("type", "").lower()
+    if value is None:
+        return None
+    if kind == "object":
+        if not isinstance(value, dict):
+            return None
+        result = dict(value)
+        for name, field in schema.get("properties", {}).items():
+            if name in value:
+                result[name] = coerce(value[name], field)
+        if any(result.get(name) is None for name in schema.get("required", [])):
+            return None
+        # Fields that could not be read are left out, so callers' defaults apply
+        return {name: item for name, item in result.items() if item is not None}
+    if kind == "array":
+        if not isinstance(value, list):
+            return None
+        items = schema.get("items", {})
+        return [coerce(item, items) for item in value] if items else value
+    if kind == "boolean":
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        return True if text in _TRUE else False if text in _FALSE else None
+    if kind in ("integer", "number"):
+        if isinstance(value, bool):
+            return None
+        try:
+            number = float(str(value).strip().rstrip("%")) if isinstance(value, str) else float(value)
+        except ValueError:
+            return None
+        return int(round(number)) if kind == "integer" else number
+    if kind == "string":
+        value = str(value)
+        enum = schema.get("enum")
+        if enum and value not in enum:
+            lowered = value.strip().lower()
+            return next((option for option in enum if option.lower() == lowered), None)
+        return value
+    return value
+
+
+def parse_object(text: str, schema: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """First JSON object of a model answer, coerced to schema; None if there is none (or required fields are missing)"""
+    stream = JSONObjectStream()
+    found = stream.feed(text) or stream.close()
+    if found is None or schema is None:
+        return found
+    return coerce(found, schema)
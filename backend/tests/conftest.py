@@ -0,0 +1,41 @@
+"""
+Shared fixtures: the backend modules on sys.path, and the FastAPI app
+running the local OpenCV engine in a scratch directory
+"""
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def jpeg_bytes(color=(180, 180, 180), size=(64, 48)) -> bytes:
+    """A small JPEG photo of one color"""
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """main.py imported with its upload, report and state files under a temporary directory"""
+    workdir = tmp_path_factory.mktemp("backend")
+    patch = pytest.MonkeyPatch()
+    patch.chdir(workdir)
+    patch.setenv("AI_ENGINE", "opencv")
+    patch.setenv("WARMUP_INSPECTION", "0")
+    patch.setenv("STATE_DB_PATH", str(workdir / "state.db"))
+    import main
+    yield main
+    patch.undo()
+
+
+@pytest.fixture
+def client(main_module):
+    from fastapi.testclient import TestClient
+    with TestClient(main_module.app) as client:
+        yield client
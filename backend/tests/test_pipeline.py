@@ -0,0 +1,145 @@
+"""Incremental inspection pipeline: criteria DAG scheduling, early start and abandoned inspections"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import jpeg_bytes
+from criteria import Criterion, criteria_order
+from pipeline import IncrementalInspection
+
+TIMEOUT = 5
+
+
+class FakeEngine:
+    """Engine whose checks record when they run; wires waits until release_wires is set"""
+
+    CRITERIA = [
+        Criterion(3, "check_floor", "floor_general", after=[1]),
+        Criterion(1, "check_wires", {"ceiling": "ceiling", "wall": "wall"}, features=["labels"]),
+        Criterion(4, "check_lighting", "lighting"),
+    ]
+
+    def __init__(self):
+        self.events = []
+        self.prefetched = {}
+        self.released = []
+        self.dependencies = None
+        self.wires_started = threading.Event()
+        self.lighting_done = threading.Event()
+        self.release_wires = threading.Event()
+        self._lock = threading.Lock()
+
+    def _record(self, name):
+        with self._lock:
+            self.events.append(name)
+
+    def prefetch(self, image, features):
+        self.prefetched[image.path] = features
+
+    def check_wires(self, images):
+        self.wires_started.set()
+        assert self.release_wires.wait(TIMEOUT)
+        self._record("wires")
+        return {"criterion_id": 1, "score": 80}
+
+    def check_floor(self, image, dependencies):
+        self.dependencies = dependencies
+        self._record("floor")
+        return {"criterion_id": 3, "score": 100}
+
+    def check_lighting(self, image):
+        self._record("lighting")
+        self.lighting_done.set()
+        return {"criterion_id": 4, "score": 90}
+
+    def release_images(self, paths):
+        self.released.extend(paths)
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = {}
+    for key in ("ceiling", "wall", "floor_general", "lighting"):
+        path = tmp_path / f"{key}.jpg"
+        path.write_bytes(jpeg_bytes())
+        paths[key] = str(path)
+    return paths
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def test_criteria_order_follows_dependencies():
+    assert criteria_order(FakeEngine.CRITERIA) == [1, 0, 2]
+    with pytest.raises(ValueError):
+        criteria_order([Criterion(1, "a", "wall", after=[2]), Criterion(2, "b", "wall", after=[1])])
+    with pytest.raises(ValueError):
+        criteria_order([Criterion(1, "a", "wall", after=[9])])
+
+
+def test_criteria_start_as_images_arrive(images, executor):
+    engine = FakeEngine()
+    inspection = IncrementalInspection(engine, executor=executor)
+
+    # Lighting runs before the other photos are uploaded
+    inspection.add_image("lighting", images["lighting"])
+    assert engine.lighting_done.wait(TIMEOUT)
+
+    inspection.add_image("ceiling", images["ceiling"])
+    inspection.add_image("floor_general", images["floor_general"])
+    assert not engine.wires_started.is_set()
+    inspection.add_image("wall", images["wall"])
+    assert engine.wires_started.wait(TIMEOUT)
+
+    # The floor check needs the wires result, so it waits although its photo is there
+    assert "floor" not in engine.events
+    assert [c["criterion_id"] for c in inspection.completed_criteria()] == [4]
+    engine.release_wires.set()
+
+    results = inspection.results(timeout=TIMEOUT)
+    assert engine.events == ["lighting", "wires", "floor"]
+    assert engine.dependencies == {1: {"criterion_id": 1, "score": 80}}
+    # Results keep the declared order; the score is computed once all are in
+    assert [c["criterion_id"] for c in results["criteria"]] == [3, 1, 4]
+    assert results["overall_score"] == 90.0
+    assert results["overall_status"] == "compliant"
+    # Features of a photo are fetched once, only for photos a criterion reads them from
+    assert engine.prefetched == {images["ceiling"]: ("labels",), images["wall"]: ("labels",)}
+
+
+def test_shared_file_is_one_image(images, executor):
+    engine = FakeEngine()
+    engine.release_wires.set()
+    inspection = IncrementalInspection(engine, executor=executor)
+    for key in ("ceiling", "wall"):
+        inspection.add_image(key, images["ceiling"])
+    assert inspection.images["ceiling"] is inspection.images["wall"]
+    inspection.close()
+
+
+def test_missing_images_fail_and_release(images, executor):
+    engine = FakeEngine()
+    engine.release_wires.set()
+    inspection = IncrementalInspection(engine, executor=executor)
+    inspection.add_image("lighting", images["lighting"])
+    with pytest.raises(KeyError, match="ceiling, floor_general, wall"):
+        inspection.results(timeout=TIMEOUT)
+    assert engine.released == [images["lighting"]]
+
+
+def test_abandoned_inspection_releases_images(images, executor):
+    engine = FakeEngine()
+    inspection = IncrementalInspection(engine, executor=executor)
+    for key, path in images.items():
+        inspection.add_image(key, path)
+    assert engine.wires_started.wait(TIMEOUT)
+
+    # The client gave up mid-analysis: caches are dropped and the running check finishes on its own
+    inspection.close()
+    assert sorted(engine.released) == sorted(images.values())
+    assert all(image._derived == {} for image in inspection.images.values())
+    engine.release_wires.set()
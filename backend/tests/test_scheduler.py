@@ -0,0 +1,109 @@
+"""Analysis scheduler: weighted fair queuing, priorities, admission and cancellation"""
+import asyncio
+
+import pytest
+
+from scheduler import Scheduler, Overloaded
+
+
+async def run_all(scheduler, requests):
+    """Queue (priority, tenant) requests behind a running one; returns the order they ran in"""
+    order = []
+    blocker = asyncio.Event()
+
+    async def first():
+        async with scheduler.slot("interactive", "blocker"):
+            await blocker.wait()
+
+    async def request(priority, tenant, label):
+        async with scheduler.slot(priority, tenant):
+            order.append(label)
+            await asyncio.sleep(0)
+
+    running = asyncio.create_task(first())
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(request(priority, tenant, f"{tenant}{i}"))
+             for i, (priority, tenant) in enumerate(requests)]
+    await asyncio.sleep(0)
+    blocker.set()
+    await asyncio.gather(running, *tasks)
+    return order
+
+
+def test_tenants_take_turns():
+    scheduler = Scheduler(concurrency=1, batch_slots=1, max_queue={"interactive": 10, "batch": 10})
+    requests = [("interactive", "a")] * 4 + [("interactive", "b")] * 2
+    order = asyncio.run(run_all(scheduler, requests))
+    # b's requests do not wait for a's whole backlog
+    assert order == ["a0", "b4", "a1", "b5", "a2", "a3"]
+    assert scheduler._finish == {}
+    assert scheduler.snapshot()["queued"] == {"interactive": 0, "batch": 0}
+
+
+def test_weights_share_slots():
+    scheduler = Scheduler(concurrency=1, batch_slots=1, max_queue={"interactive": 10, "batch": 10},
+                          weights={"a": 2})
+    requests = [("interactive", "a")] * 4 + [("interactive", "b")] * 2
+    order = asyncio.run(run_all(scheduler, requests))
+    assert order == ["a0", "a1", "b4", "a2", "a3", "b5"]
+
+
+def test_interactive_before_batch():
+    scheduler = Scheduler(concurrency=1, batch_slots=1, max_queue={"interactive": 10, "batch": 10})
+    requests = [("batch", "a"), ("batch", "b"), ("interactive", "c")]
+    order = asyncio.run(run_all(scheduler, requests))
+    assert order[0] == "c2"
+
+
+def test_admit_refuses_full_queue():
+    scheduler = Scheduler(concurrency=1, batch_slots=1, max_queue={"interactive": 0, "batch": 5})
+    with pytest.raises(Overloaded) as refused:
+        scheduler.admit("interactive")
+    assert refused.value.retry_after >= 1
+    scheduler.admit("batch")
+    assert scheduler.counts == {"admitted": 1, "shed": 1}
+
+
+def test_cancelled_waiter_frees_its_place():
+    scheduler = Scheduler(concurrency=1, batch_slots=1, max_queue={"interactive": 1, "batch": 1})
+
+    async def scenario():
+        blocker = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("interactive", "a"):
+                await blocker.wait()
+
+        async def wait_turn():
+            async with scheduler.slot("interactive", "b"):
+                pass
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(wait_turn())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            scheduler.admit("interactive")
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        scheduler.admit("interactive")
+
+        blocker.set()
+        await running
+        # The cancelled request never ran and holds no slot
+        assert scheduler.running == {"interactive": 0, "batch": 0}
+        assert scheduler._finish == {}
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_returns_503(client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "scheduler", Scheduler(max_queue={"interactive": 0, "batch": 0}))
+    response = client.post("/api/uploads", data={"restaurant_name": "Test", "commercial_register": "1010000001"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+    response = client.post("/api/uploads", data={"restaurant_name": "Test", "commercial_register": "1010000001",
+                                                  "priority": "urgent"})
+    assert response.status_code == 400
@@ -0,0 +1,66 @@
+"""Tolerant parsing of model answers (fences, prose, truncation, loose types)"""
+from structured_output import JSONObjectStream, coerce, parse_object
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "compliant": {"type": "boolean"},
+        "confidence": {"type": "number"},
+        "score": {"type": "integer"},
+        "status": {"type": "string", "enum": ["compliant", "non_compliant"]},
+        "description": {"type": "string"},
+    },
+    "required": ["compliant"],
+}
+
+
+def test_fenced_answer_with_prose():
+    text = 'Here is the result:\n```json\n{"compliant": true, "confidence": 0.9}\n```\nLet me know {if} needed.'
+    assert parse_object(text) == {"compliant": True, "confidence": 0.9}
+
+
+def test_brace_in_prose_before_object():
+    assert parse_object('Note {not json} then {"score": 80}') == {"score": 80}
+
+
+def test_truncated_answer_keeps_complete_members():
+    text = '{"compliant": false, "description": "سلك ظاهر في الزاوية'
+    assert parse_object(text) == {"compliant": False, "description": "سلك ظاهر في الزاوية"}
+    # A cut-off number could be wrong, so it is dropped
+    assert parse_object('{"compliant": true, "confidence": 0.8') == {"compliant": True}
+    assert parse_object('{"items": [{"a": 1}, {"a": 2') == {"items": [{"a": 1}]}
+
+
+def test_no_object():
+    assert parse_object("The image could not be analyzed.") is None
+    assert parse_object("[1, 2, 3]") is None
+
+
+def test_percent_and_arabic_values():
+    text = '{"compliant": "نعم", "confidence": "85%", "score": "72.6", "status": "Compliant"}'
+    assert parse_object(text, SCHEMA) == {"compliant": True, "confidence": 85.0, "score": 73, "status": "compliant"}
+    assert coerce("لا", {"type": "boolean"}) is False
+    assert coerce(" 40 % ", {"type": "number"}) == 40.0
+
+
+def test_unreadable_fields_are_dropped():
+    text = '{"compliant": "yes", "confidence": "high", "status": "maybe"}'
+    assert parse_object(text, SCHEMA) == {"compliant": True}
+    # A required field that cannot be read invalidates the answer
+    assert parse_object('{"compliant": "perhaps"}', SCHEMA) is None
+
+
+def test_stream_returns_object_once_closed():
+    stream = JSONObjectStream()
+    answer = '```json\n{"compliant": true, "details": {"wires": [1, 2]}, "note": "a } b"}\n```'
+    results = [stream.feed(ch) for ch in answer]
+    end = answer.index("}\n```") + 1
+    assert results[end - 1] == {"compliant": True, "details": {"wires": [1, 2]}, "note": "a } b"}
+    assert all(result is None for result in results[:end - 1])
+
+
+def test_stream_partial_and_close():
+    stream = JSONObjectStream()
+    stream.feed('{"compliant": true, "description": "Exposed')
+    assert stream.partial() == {"compliant": True}
+    assert stream.close() == {"compliant": True, "description": "Exposed"}
@@ -0,0 +1,89 @@
+"""Resumable upload protocol: offsets, checksums and completion"""
+import hashlib
+
+from conftest import jpeg_bytes
+
+KEYS = ["ceiling", "wall", "floor_general", "floor_prep", "lighting"]
+
+
+def start_session(client, **form):
+    response = client.post("/api/uploads", data={"restaurant_name": "Test", "commercial_register": "1010000001",
+                                                 **form})
+    assert response.status_code == 200
+    return response.json()["inspection_id"]
+
+
+def declare(client, inspection_id, key, data, digest=None):
+    return client.post(f"/api/uploads/{inspection_id}/parts/{key}", headers={
+        "Upload-Length": str(len(data)),
+        "Upload-Hash": digest or hashlib.sha256(data).hexdigest(),
+    })
+
+
+def patch(client, inspection_id, key, offset, chunk):
+    return client.patch(f"/api/uploads/{inspection_id}/parts/{key}", content=chunk,
+                        headers={"Upload-Offset": str(offset)})
+
+
+def test_patch_resumes_at_offset(client):
+    inspection_id = start_session(client)
+    data = jpeg_bytes()
+    assert declare(client, inspection_id, "ceiling", data).json()["offset"] == 0
+
+    response = patch(client, inspection_id, "ceiling", 0, data[:100])
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == "100"
+
+    # A client that lost track asks for the offset before resuming
+    head = client.head(f"/api/uploads/{inspection_id}/parts/ceiling")
+    assert head.headers["Upload-Offset"] == "100"
+    assert head.headers["Upload-Length"] == str(len(data))
+
+    # Chunks at any other offset are refused
+    assert patch(client, inspection_id, "ceiling", 0, data[:100]).status_code == 409
+    assert patch(client, inspection_id, "ceiling", 200, data[200:]).status_code == 409
+
+    response = patch(client, inspection_id, "ceiling", 100, data[100:])
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == str(len(data))
+    assert client.get(f"/api/uploads/{inspection_id}").json()["parts"]["ceiling"]["complete"]
+
+
+def test_checksum_mismatch_discards_part(client):
+    inspection_id = start_session(client)
+    data = jpeg_bytes()
+    declare(client, inspection_id, "wall", data, digest=hashlib.sha256(b"other").hexdigest())
+
+    response = patch(client, inspection_id, "wall", 0, data)
+    assert response.status_code == 460
+    head = client.head(f"/api/uploads/{inspection_id}/parts/wall")
+    assert head.headers["Upload-Offset"] == "0"
+
+
+def test_invalid_declarations(client):
+    inspection_id = start_session(client)
+    data = jpeg_bytes()
+    assert declare(client, inspection_id, "roof", data).status_code == 400
+    assert declare(client, inspection_id, "wall", data, digest="abc").status_code == 400
+    assert patch(client, inspection_id, "wall", 0, data).status_code == 404
+
+
+def test_completed_upload_is_analyzed(client):
+    inspection_id = start_session(client)
+    colors = [(200, 200, 200), (150, 120, 90), (90, 90, 90), (120, 90, 60), (240, 240, 230)]
+    for key, color in zip(KEYS, colors):
+        data = jpeg_bytes(color)
+        declare(client, inspection_id, key, data)
+        assert patch(client, inspection_id, key, 0, data).status_code == 204
+
+    # The analysis runs as a background task of the last PATCH
+    status = client.get(f"/api/uploads/{inspection_id}").json()
+    assert status["status"] == "completed"
+    assert status["missing_keys"] == []
+    results = status["results"]
+    assert results["inspection_id"] == inspection_id
+    assert {c["criterion_id"] for c in results["criteria"]} >= {1, 4}
+    assert 0 <= results["overall_score"] <= 100
+
+    # Re-declaring a stored image after completion is refused
+    assert declare(client, inspection_id, "wall", jpeg_bytes(colors[1])).status_code == 409
@@ -0,0 +1,283 @@
+"""
+Resumable Upload Store
+Chunked, resumable image uploads (tus-like) for unreliable mobile connections
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from shared_state import SharedState
+
+
+REQUIRED_KEYS = ["ceiling", "wall", "floor_general", "floor_prep", "lighting"]
+
+SESSION_FILE = "session.json"
+PARTS_DIR = "parts"
+# A part lock older than this is left over by a writer that died
+PART_LOCK_STALE_SECONDS = int(os.getenv("UPLOAD_PART_LOCK_STALE_SECONDS", "120"))
+
+
+class UploadError(Exception):
+    """Upload protocol error, carries the HTTP status to report"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ResumableUploadStore:
+    """
+    Stores image parts under each inspection's upload directory.
+
+    Every image key is declared with its total length and SHA-256 hash.
+    Parts are stored by content hash, so the same photo declared for two
+    keys (or re-declared after a dropped connection) is uploaded only once.
+
+    Session files are replaced atomically, so reads need no lock. Updates
+    are serialized with a thread lock, or with the SharedState lock when
+    several worker processes serve the same upload directory. Chunk data
+    is written and hashed outside that lock, under a lock file of its part.
+    """
+
+    def __init__(self, upload_dir: str, max_chunk_size: int = 1024 * 1024,
+                 state: Optional[SharedState] = None):
+        self.upload_dir = upload_dir
+        self.max_chunk_size = max_chunk_size
+        self.state = state
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        if self.state is not None:
+            with self.state.lock():
+                yield
+        else:
+            with self._lock:
+                yield
+
+    @contextmanager
+    def _part_locked(self, part_path: str):
+        """Exclusive lock file of one part (works across processes and platforms)"""
+        lock_path = f"{part_path}.lock"
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                stale = time.time() - os.path.getmtime(lock_path) > PART_LOCK_STALE_SECONDS
+            except OSError:
+                stale = True
+            if not stale:
+                raise UploadError(409, "Another chunk of this image is being written")
+            try:
+                os.remove(lock_path)
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                raise UploadError(409, "Another chunk of this image is being written")
+        os.close(fd)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    # Session handling
+
+    def _session_path(self, inspection_id: str) -> str:
+        return os.path.join(self.upload_dir, inspection_id, SESSION_FILE)
+
+    def _load(self, inspection_id: str) -> Dict[str, Any]:
+        path = self._session_path(inspection_id)
+        if not os.path.basename(inspection_id) == inspection_id or not os.path.exists(path):
+            raise UploadError(404, "Upload session not found")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, session: Dict[str, Any]):
+        path = self._session_path(session["inspection_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def create_session(self, inspection_id: str, restaurant_name: str, commercial_register: str,
+                       priority: str = "interactive") -> Dict[str, Any]:
+        """Start a new upload session for an inspection directory"""
+        os.makedirs(os.path.join(self.upload_dir, inspection_id, PARTS_DIR), exist_ok=True)
+        session = {
+            "inspection_id": inspection_id,
+            "restaurant_name": restaurant_name,
+            "commercial_register": commercial_register,
+            "priority": priority,
+            "created_at": datetime.now().isoformat(),
+            "status": "uploading",
+            "keys": {},
+            "parts": {},
+        }
+        with self._locked():
+            self._save(session)
+        return session
+
+    def get_session(self, inspection_id: str) -> Dict[str, Any]:
+        return self._load(inspection_id)
+
+    def session_ids(self, status: str) -> List[str]:
+        """Inspection IDs of the sessions currently in a given status"""
+        found = []
+        if not os.path.isdir(self.upload_dir):
+            return found
+        for inspection_id in sorted(os.listdir(self.upload_dir)):
+            try:
+                if self._load(inspection_id)["status"] == status:
+                    found.append(inspection_id)
+            except (UploadError, OSError, ValueError):
+                continue
+        return found
+
+    def set_status(self, inspection_id: str, status: str, error: Optional[str] = None):
+        with self._locked():
+            session = self._load(inspection_id)
+            session["status"] = status
+            if error:
+                session["error"] = error
+            self._save(session)
+
+    # Parts
+
+    def _part_path(self, inspection_id: str, sha256: str, complete: bool) -> str:
+        suffix = ".jpg" if complete else ".part"
+        return os.path.join(self.upload_dir, inspection_id, PARTS_DIR, f"{sha256}{suffix}")
+
+    def _part_status(self, inspection_id: str, session: Dict[str, Any], key: str) -> Dict[str, Any]:
+        sha256 = session["keys"][key]
+        part = session["parts"][sha256]
+        if part["complete"] or os.path.exists(self._part_path(inspection_id, sha256, complete=True)):
+            offset = part["length"]
+        else:
+            path = self._part_path(inspection_id, sha256, complete=False)
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+        return {
+            "key": key,
+            "offset": offset,
+            "length": part["length"],
+            "complete": offset == part["length"],
+        }
+
+    def declare_part(self, inspection_id: str, key: str, length: int, sha256: str) -> Dict[str, Any]:
+        """
+        Declare an image for a key (idempotent).
+        Returns the current offset; already stored content is complete at once.
+        """
+        if key not in REQUIRED_KEYS:
+            raise UploadError(400, f"Unknown image key: {key}")
+        sha256 = sha256.lower()
+        if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+            raise UploadError(400, "Upload-Hash must be a hex SHA-256 digest")
+        if length <= 0:
+            raise UploadError(400, "Upload-Length must be positive")
+
+        with self._locked():
+            session = self._load(inspection_id)
+            if session["status"] != "uploading":
+                raise UploadError(409, "Upload session is closed")
+            part = session["parts"].get(sha256)
+            if part is not None and part["length"] != length:
+                raise UploadError(409, "Upload-Length does not match the stored part")
+            if part is None:
+                session["parts"][sha256] = {"length": length, "complete": False}
+            session["keys"][key] = sha256
+            self._save(session)
+            return self._part_status(inspection_id, session, key)
+
+    def part_status(self, inspection_id: str, key: str) -> Dict[str, Any]:
+        session = self._load(inspection_id)
+        if key not in session["keys"]:
+            raise UploadError(404, f"Image not declared: {key}")
+        return self._part_status(inspection_id, session, key)
+
+    def write_chunk(self, inspection_id: str, key: str, offset: int, data: bytes) -> Dict[str, Any]:
+        """Append a chunk at the given offset; verifies the hash once the part is full"""
+        if len(data) > self.max_chunk_size:
+            raise UploadError(413, f"Chunk larger than {self.max_chunk_size} bytes")
+
+        with self._locked():
+            session = self._load(inspection_id)
+            if key not in session["keys"]:
+                raise UploadError(404, f"Image not declared: {key}")
+            status = self._part_status(inspection_id, session, key)
+            if status["complete"]:
+                return status
+            if offset != status["offset"]:
+                raise UploadError(409, f"Upload-Offset mismatch, expected {status['offset']}")
+            if offset + len(data) > status["length"]:
+                raise UploadError(400, "Chunk exceeds declared Upload-Length")
+
+            sha256 = session["keys"][key]
+            length = status["length"]
+
+        part_path = self._part_path(inspection_id, sha256, complete=False)
+        complete_path = self._part_path(inspection_id, sha256, complete=True)
+        with self._part_locked(part_path):
+            # Another request may have written this offset since the check above
+            if not os.path.exists(complete_path):
+                stored = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                if offset != stored:
+                    raise UploadError(409, f"Upload-Offset mismatch, expected {stored}")
+                with open(part_path, "ab") as f:
+                    f.write(data)
+                if offset + len(data) == length:
+                    if _file_sha256(part_path) != sha256:
+                        os.remove(part_path)
+                        raise UploadError(460, "Checksum mismatch, part discarded")
+                    os.replace(part_path, complete_path)
+
+        with self._locked():
+            session = self._load(inspection_id)
+            part = session["parts"].get(sha256)
+            if part is not None and not part["complete"] and os.path.exists(complete_path):
+                part["complete"] = True
+                self._save(session)
+            return self._part_status(inspection_id, session, key)
+
+    def is_complete(self, session: Dict[str, Any]) -> bool:
+        """True when every required key is declared and its part fully stored"""
+        return all(
+            key in session["keys"] and session["parts"][session["keys"][key]]["complete"]
+            for key in REQUIRED_KEYS
+        )
+
+    def claim_for_analysis(self, inspection_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Move a fully uploaded session to 'processing' exactly once.
+        Returns the session if this caller should start the analysis.
+        """
+        with self._locked():
+            session = self._load(inspection_id)
+            if session["status"] != "uploading" or not self.is_complete(session):
+                return None
+            session["status"] = "processing"
+            self._save(session)
+            return session
+
+    def image_paths(self, session: Dict[str, Any]) -> Dict[str, str]:
+        """Map stored image keys to their parts (duplicates share one file)"""
+        return {
+            key: self._part_path(session["inspection_id"], sha256, complete=True)
+            for key, sha256 in session["keys"].items()
+            if session["parts"][sha256]["complete"]
+        }
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
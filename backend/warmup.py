@@ -0,0 +1,137 @@
+"""
+Startup Warm-up
+Runs a tiny synthetic inspection through the local detectors and the PDF
+generator right after boot, so the first real inspection does not pay for
+lazy setup (image decoders, OpenCV, ReportLab fonts). A full synthetic
+inspection through the configured engine (billed cloud calls, warm gRPC
+channels and HTTP pools) is opt-in and runs once per host.
+"""
+import os
+import time
+import shutil
+import tempfile
+from datetime import datetime
+from PIL import Image, ImageDraw
+from typing import Dict, Any, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from pipeline import IncrementalInspection, summarize_criteria
+from upload_store import REQUIRED_KEYS
+from pdf_generator import generate_inspection_report
+from inspection_image import InspectionImage
+from lighting import check_lighting
+from shared_state import SharedState
+
+
+# local: local detectors and the report only (no external calls);
+# full: the engine's whole inspection, billed, in one worker per server start; 0: skip
+WARMUP_INSPECTION = os.getenv("WARMUP_INSPECTION", "local").lower()
+
+
+def synthetic_image(path: str, size: int = 96):
+    """Small JPEG with some edges and a bright area, enough to exercise every detector"""
+    img = Image.new("RGB", (size, size), (180, 180, 170))
+    draw = ImageDraw.Draw(img)
+    for x in range(0, size, 12):
+        draw.line([(x, 0), (x, size)], fill=(90, 90, 90), width=1)
+    draw.ellipse([size // 4, size // 4, size // 2, size // 2], fill=(250, 250, 240))
+    img.save(path, "JPEG", quality=80)
+
+
+class Warmup:
+    """
+    Readiness of this worker process.
+
+    Liveness only needs the process to answer; readiness means the warm-up
+    inspection has run (or failed, in which case the worker still serves
+    requests, just without a warm path).
+
+    Engines warm their local models with an optional
+      warm_up(image)    run the unbilled detectors on an InspectionImage,
+                        returning their criterion results
+    (without it, only the shared lighting analysis runs).
+    """
+
+    def __init__(self):
+        self.state = "pending"
+        self.started_at: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "failed", "skipped")
+
+    def status(self) -> Dict[str, Any]:
+        status = {"state": self.state, "started_at": self.started_at, "steps_ms": self.steps}
+        if self.error:
+            status["error"] = self.error
+        return status
+
+    def _step(self, name: str, started: float):
+        self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    @staticmethod
+    def _local_analysis(engine, image_path: str) -> Dict[str, Any]:
+        image = InspectionImage(image_path)
+        image.gray, image.array, image.phash
+        if hasattr(engine, "warm_up"):
+            criteria = engine.warm_up(image)
+        else:
+            criteria = [check_lighting(image)]
+        return summarize_criteria(criteria)
+
+    async def run(self, engine, shared: Optional[SharedState] = None):
+        """Synthetic inspection (local detectors or engine criteria, then the PDF report), discarded afterwards"""
+        self.started_at = datetime.now().isoformat()
+        if WARMUP_INSPECTION == "0":
+            self.state = "skipped"
+            return
+
+        self.state = "warming"
+        work_dir = tempfile.mkdtemp(prefix="warmup_")
+        pdf_path = None
+        try:
+            started = time.perf_counter()
+            image_path = os.path.join(work_dir, "warmup.jpg")
+            synthetic_image(image_path)
+            # One worker per server start on this host runs the billed warm-up.
+            # gunicorn.conf.py sets SERVER_START_ID once per start (a container's
+            # master often has the same PID every time); without it, workers
+            # started by the same server share their parent process
+            job_id = f"warmup_{os.getenv('SERVER_START_ID') or os.getppid()}"
+            if WARMUP_INSPECTION == "full" and (shared is None or shared.claim_job(job_id)):
+                try:
+                    # No inspection ID: nothing is indexed or shared with other workers
+                    inspection = IncrementalInspection(engine)
+                    for key in REQUIRED_KEYS:
+                        inspection.add_image(key, image_path)
+                    results = await run_in_threadpool(inspection.results)
+                finally:
+                    if shared is not None:
+                        shared.finish_job(job_id)
+                self._step("analysis", started)
+            else:
+                results = await run_in_threadpool(self._local_analysis, engine, image_path)
+                self._step("local_analysis", started)
+
+            started = time.perf_counter()
+            results.update({
+                "restaurant_name": "warmup",
+                "commercial_register": "0",
+                "timestamp": datetime.now().isoformat(),
+            })
+            pdf_path = await generate_inspection_report(results, "WARMUP")
+            self._step("report", started)
+
+            self.state = "ready"
+            print(f"[OK] Warm-up finished: {self.steps}")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"[WARNING] Warm-up failed: {e}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if pdf_path and os.path.exists(pdf_path):
+                os.remove(pdf_path)
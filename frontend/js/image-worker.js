@@ -0,0 +1,23 @@
+// Image Compression Worker
+// Downsizes and re-encodes camera photos off the main thread
+
+self.onmessage = async (event) => {
+    const { id, file, maxDimension, quality } = event.data;
+
+    try {
+        const bitmap = await createImageBitmap(file);
+        const scale = Math.min(1, maxDimension / Math.max(bitmap.width, bitmap.height));
+        const width = Math.round(bitmap.width * scale);
+        const height = Math.round(bitmap.height * scale);
+
+        const canvas = new OffscreenCanvas(width, height);
+        const ctx = canvas.getContext('2d');
+        ctx.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality: quality });
+        self.postMessage({ id, blob, resized: scale < 1 });
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+};
@@ -1,10 +1,34 @@
 // Inspection Form JavaScript
 
+const API_BASE_URL = 'https://restaurant-inspection-api.onrender.com';
+
+// Fallback compression settings if /api/upload-config is unreachable
+const DEFAULT_UPLOAD_CONFIG = {
+    max_dimension: 1600,
+    jpeg_quality: 0.8
+};
+
+// Keep-alive ping interval while the form is open (the free instance sleeps after ~15 idle minutes)
+const KEEP_ALIVE_INTERVAL = 5 * 60 * 1000;
+
 // Clear old results when starting new inspection
 window.addEventListener('DOMContentLoaded', () => {
     sessionStorage.removeItem('inspectionResults');
+    warmUpBackend();
+    getUploadConfig();
 });
 
+function warmUpBackend() {
+    // Wake the backend while photos are being taken, then keep it awake
+    const ping = () => {
+        if (document.visibilityState === 'visible') {
+            fetch(`${API_BASE_URL}/api/health`, { cache: 'no-store' }).catch(() => {});
+        }
+    };
+    ping();
+    setInterval(ping, KEEP_ALIVE_INTERVAL);
+}
+
 let currentStep = 1;
 const totalSteps = 5;
 
@@ -97,37 +121,29 @@ async function submitInspection() {
     // Simulate progress
     simulateProgress();
 
-    // Prepare form data
-    const formData = new FormData();
-    formData.append('restaurant_name', document.getElementById('restaurantName').value);
-    formData.append('commercial_register', document.getElementById('commercialRegister').value);
-    // Append images (4 images now - no facade)
-    formData.append('ceiling_image', document.getElementById('ceilingImage').files[0]);
-    formData.append('wall_image', document.getElementById('wallImage').files[0]);
-    formData.append('floor_general_image', document.getElementById('floorImage').files[0]);
-    formData.append('floor_prep_image', document.getElementById('floorImage').files[0]); // Same for POC
-    formData.append('lighting_image', document.getElementById('lightingImage').files[0]);
-
+    // Images per API field (4 photos now - no facade; floor photo is used for both floor checks)
+    const imageFields = {
+        ceiling: document.getElementById('ceilingImage').files[0],
+        wall: document.getElementById('wallImage').files[0],
+        floor_general: document.getElementById('floorImage').files[0],
+        floor_prep: document.getElementById('floorImage').files[0],
+        lighting: document.getElementById('lightingImage').files[0]
+    };
 
     try {
         // Add timeout to prevent infinite loading (3 minutes for AI processing)
         const controller = new AbortController();
         const timeoutId = setTimeout(() => controller.abort(), 300000); // 300 seconds (5 minutes) timeout
 
-        const response = await fetch('https://restaurant-inspection-api.onrender.com/api/analyze', {
-            method: 'POST',
-            body: formData,
-            signal: controller.signal
-        });
+        const results = await uploadInspection(
+            document.getElementById('restaurantName').value,
+            document.getElementById('commercialRegister').value,
+            imageFields,
+            controller.signal
+        );
 
         clearTimeout(timeoutId);
 
-        if (!response.ok) {
-            throw new Error('فشل الفحص');
-        }
-
-        const results = await response.json();
-
         // Store results in sessionStorage
         sessionStorage.setItem('inspectionResults', JSON.stringify(results));
 
@@ -151,6 +167,253 @@ async function submitInspection() {
     }
 }
 
+// Resumable upload: each photo is sent in chunks and resumed after a dropped connection
+
+const UPLOAD_RETRIES = 8;
+const RESULT_POLL_INTERVAL = 2000;
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function sha256Hex(blob) {
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function fetchWithRetry(url, options, onRetry) {
+    // Retry network errors and 5xx responses with exponential backoff
+    for (let attempt = 0; ; attempt++) {
+        try {
+            const response = await fetch(url, options);
+            if (response.status < 500 || attempt >= UPLOAD_RETRIES) {
+                return response;
+            }
+        } catch (error) {
+            if (error.name === 'AbortError' || attempt >= UPLOAD_RETRIES) {
+                throw error;
+            }
+        }
+        await sleep(Math.min(1000 * 2 ** attempt, 15000));
+        if (onRetry) {
+            await onRetry();
+        }
+    }
+}
+
+async function uploadInspection(restaurantName, commercialRegister, imageFields, signal) {
+    const uploadConfig = await getUploadConfig();
+
+    // Start an upload session
+    const sessionForm = new FormData();
+    sessionForm.append('restaurant_name', restaurantName);
+    sessionForm.append('commercial_register', commercialRegister);
+    const sessionResponse = await fetchWithRetry(`${API_BASE_URL}/api/uploads`, {
+        method: 'POST',
+        body: sessionForm,
+        signal
+    });
+    if (!sessionResponse.ok) {
+        throw new Error('فشل الفحص');
+    }
+    const session = await sessionResponse.json();
+    const partsUrl = `${API_BASE_URL}/api/uploads/${session.inspection_id}/parts`;
+
+    // Compress and hash each distinct photo once
+    const prepared = new Map();
+    for (const file of new Set(Object.values(imageFields))) {
+        const blob = await compressImage(file, uploadConfig);
+        prepared.set(file, { blob, hash: await sha256Hex(blob) });
+    }
+
+    // Declare every key; identical photos are stored once by the server
+    for (const [key, file] of Object.entries(imageFields)) {
+        const { blob, hash } = prepared.get(file);
+        const declareResponse = await fetchWithRetry(`${partsUrl}/${key}`, {
+            method: 'POST',
+            headers: { 'Upload-Length': String(blob.size), 'Upload-Hash': hash },
+            signal
+        });
+        if (!declareResponse.ok) {
+            throw new Error('فشل الفحص');
+        }
+        const part = await declareResponse.json();
+        if (!part.complete) {
+            await uploadPart(`${partsUrl}/${key}`, blob, part.offset, session.chunk_size, signal);
+        }
+    }
+
+    return waitForResults(session.inspection_id, signal);
+}
+
+async function uploadPart(partUrl, blob, offset, chunkSize, signal) {
+    const resumeOffset = async () => {
+        // Ask the server where to continue after a failed chunk
+        try {
+            const response = await fetch(partUrl, { method: 'HEAD', signal });
+            if (response.ok) {
+                offset = parseInt(response.headers.get('Upload-Offset'), 10);
+            }
+        } catch (error) {
+            // Still offline - keep the last known offset
+        }
+    };
+
+    while (offset < blob.size) {
+        const response = await fetchWithRetry(partUrl, {
+            method: 'PATCH',
+            headers: { 'Upload-Offset': String(offset) },
+            body: blob.slice(offset, offset + chunkSize),
+            signal
+        }, resumeOffset);
+
+        if (response.status === 409) {
+            await resumeOffset();
+        } else if (!response.ok) {
+            throw new Error('فشل رفع الصورة');
+        } else {
+            offset = parseInt(response.headers.get('Upload-Offset'), 10);
+        }
+    }
+}
+
+async function waitForResults(inspectionId, signal) {
+    // Analysis starts on the server once all photos are stored
+    for (;;) {
+        const response = await fetchWithRetry(`${API_BASE_URL}/api/uploads/${inspectionId}`, { signal });
+        if (!response.ok) {
+            throw new Error('فشل الفحص');
+        }
+        const status = await response.json();
+        if (status.status === 'completed') {
+            return status.results;
+        }
+        if (status.status === 'failed') {
+            throw new Error('فشل الفحص');
+        }
+        await sleep(RESULT_POLL_INTERVAL);
+    }
+}
+
+let uploadConfigPromise = null;
+
+function getUploadConfig() {
+    // Ask the server once for its preferred image size/quality
+    if (!uploadConfigPromise) {
+        uploadConfigPromise = fetch(`${API_BASE_URL}/api/upload-config`)
+            .then(response => response.ok ? response.json() : DEFAULT_UPLOAD_CONFIG)
+            .catch(() => DEFAULT_UPLOAD_CONFIG);
+    }
+    return uploadConfigPromise;
+}
+
+let imageWorker = null;
+let imageWorkerJobs = 0;
+const imageWorkerCallbacks = {};
+// A job the worker has not answered by then is compressed on the main thread
+const IMAGE_WORKER_TIMEOUT_MS = 15000;
+
+function disableImageWorker() {
+    // Worker failed to load or crashed: settle every pending job so it falls back
+    if (imageWorker) {
+        imageWorker.terminate();
+    }
+    imageWorker = false;
+    for (const id of Object.keys(imageWorkerCallbacks)) {
+        const callback = imageWorkerCallbacks[id];
+        delete imageWorkerCallbacks[id];
+        callback({ workerFailed: true });
+    }
+}
+
+function getImageWorker() {
+    if (imageWorker === null) {
+        try {
+            imageWorker = new Worker('js/image-worker.js');
+            imageWorker.onmessage = (event) => {
+                const callback = imageWorkerCallbacks[event.data.id];
+                delete imageWorkerCallbacks[event.data.id];
+                if (callback) {
+                    callback(event.data);
+                }
+            };
+            imageWorker.onerror = (event) => {
+                console.warn('Image worker failed:', event.message || event);
+                disableImageWorker();
+            };
+            imageWorker.onmessageerror = disableImageWorker;
+        } catch (error) {
+            imageWorker = false;
+        }
+    }
+    return imageWorker;
+}
+
+function compressInWorker(worker, file, maxDimension, quality) {
+    return new Promise((resolve) => {
+        const id = ++imageWorkerJobs;
+        const timer = setTimeout(() => {
+            console.warn('Image worker timed out');
+            disableImageWorker();
+        }, IMAGE_WORKER_TIMEOUT_MS);
+        imageWorkerCallbacks[id] = (result) => {
+            clearTimeout(timer);
+            resolve(result);
+        };
+        worker.postMessage({ id, file, maxDimension, quality });
+    });
+}
+
+async function compressImage(file, config) {
+    // Downsize and re-encode a photo; falls back to the original on any failure
+    const maxDimension = config.max_dimension || DEFAULT_UPLOAD_CONFIG.max_dimension;
+    const quality = config.jpeg_quality || DEFAULT_UPLOAD_CONFIG.jpeg_quality;
+
+    try {
+        let result = null;
+        const worker = typeof OffscreenCanvas !== 'undefined' ? getImageWorker() : false;
+        if (worker) {
+            result = await compressInWorker(worker, file, maxDimension, quality);
+        }
+        if (!result || result.workerFailed) {
+            result = await compressOnMainThread(file, maxDimension, quality);
+        }
+
+        if (result.error || !result.blob) {
+            throw new Error(result.error || 'compression failed');
+        }
+        // Keep the original if re-encoding did not make it smaller
+        if (!result.resized && result.blob.size >= file.size) {
+            return file;
+        }
+        return result.blob;
+    } catch (error) {
+        console.warn('Image compression skipped:', error);
+        return file;
+    }
+}
+
+function compressOnMainThread(file, maxDimension, quality) {
+    return new Promise((resolve) => {
+        const url = URL.createObjectURL(file);
+        const img = new Image();
+        img.onload = () => {
+            const scale = Math.min(1, maxDimension / Math.max(img.naturalWidth, img.naturalHeight));
+            const canvas = document.createElement('canvas');
+            canvas.width = Math.round(img.naturalWidth * scale);
+            canvas.height = Math.round(img.naturalHeight * scale);
+            canvas.getContext('2d').drawImage(img, 0, 0, canvas.width, canvas.height);
+            URL.revokeObjectURL(url);
+            canvas.toBlob(blob => resolve({ blob, resized: scale < 1 }), 'image/jpeg', quality);
+        };
+        img.onerror = () => {
+            URL.revokeObjectURL(url);
+            resolve({ error: 'image decode failed' });
+        };
+        img.src = url;
+    });
+}
+
 function simulateProgress() {
     const progressBar = document.getElementById('progressBar');
     let progress = 0;
@@ -1,5 +1,18 @@
 // Results Page JavaScript
 
+const API_BASE_URL = 'https://restaurant-inspection-api.onrender.com';
+
+// Photo previews: small annotated thumbnails, larger version on click
+const PREVIEW_SIZE = 320;
+const PREVIEW_FULL_SIZE = 1280;
+const IMAGE_LABELS = {
+    ceiling: 'السقف',
+    wall: 'الجدار',
+    floor_general: 'الأرضية',
+    floor_prep: 'أرضية منطقة التحضير',
+    lighting: 'الإضاءة'
+};
+
 // Load results from sessionStorage
 let results = null;
 
@@ -51,6 +64,26 @@ function displayResults() {
         const criterionCard = createCriterionCard(criterion);
         criteriaContainer.appendChild(criterionCard);
     });
+
+    displayImagePreviews();
+}
+
+function displayImagePreviews() {
+    // Server-rendered previews (kilobytes) instead of the original photos
+    const container = document.getElementById('imagePreviews');
+    if (!container || !results.images) {
+        return;
+    }
+    const base = `${API_BASE_URL}/api/inspection/${encodeURIComponent(results.inspection_id)}/images`;
+    container.innerHTML = Object.keys(results.images).map(key => `
+        <div class="col-6 col-md-4">
+            <a href="${base}/${key}?size=${PREVIEW_FULL_SIZE}&boxes=true" target="_blank">
+                <img src="${base}/${key}?size=${PREVIEW_SIZE}&boxes=true" loading="lazy"
+                     class="img-fluid rounded" alt="${IMAGE_LABELS[key] || key}">
+            </a>
+            <div class="text-secondary small mt-1">${IMAGE_LABELS[key] || key}</div>
+        </div>
+    `).join('');
 }
 
 function createCriterionCard(criterion) {
@@ -91,6 +124,7 @@ function createCriterionCard(criterion) {
             <div class="status-text" style="color: ${status.color};">${status.text}</div>
         </div>
         ${createDetailsSection(criterion.details)}
+        ${criterion.reused_analysis ? `<div class="text-secondary small mt-2">♻️ نتيجة معاد استخدامها من فحص سابق (${criterion.reused_analysis.inspection_id})</div>` : ''}
     `;
 
     return card;
@@ -131,7 +165,7 @@ function setupEventListeners() {
     // Download PDF
     document.getElementById('downloadPDFBtn').addEventListener('click', () => {
         if (results && results.pdf_report) {
-            window.open(`https://restaurant-inspection-api.onrender.com${results.pdf_report}`, '_blank');
+            window.open(`${API_BASE_URL}${results.pdf_report}`, '_blank');
         } else {
             alert('التقرير غير متوفر حالياً');
         }